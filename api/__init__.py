@@ -1,19 +1,34 @@
 import azure.functions as func
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 
 from api.v1 import main
+from api.v1.compression import CompressionMiddleware
+from api.v1.instrumentation import QueryStatisticsMiddleware
+from api.v1.metrics import MetricsMiddleware
+from api.v1.exports import EXPORT_NEXT_AFTER_HEADER
+from api.v1.read_your_writes import READ_YOUR_WRITES_HEADER, ReadYourWritesMiddleware
+from api.v1.tracing import TracingMiddleware
 
 
-app = FastAPI()
+app = FastAPI(default_response_class=ORJSONResponse)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_credentials=True,
     allow_methods=["*"],
-    allow_headers=["*"]
+    allow_headers=["*"],
+    expose_headers=[READ_YOUR_WRITES_HEADER, EXPORT_NEXT_AFTER_HEADER]
 )
+app.add_middleware(ReadYourWritesMiddleware)
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(QueryStatisticsMiddleware)
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(TracingMiddleware)
 app.include_router(main.api_router, prefix="/api/v1")
 
-def main(req: func.HttpRequest, context: func.Context) -> func.HttpResponse:
-    return func.AsgiMiddleware(app).handle(req, context)
+asgi_middleware = func.AsgiMiddleware(app)
+
+async def main(req: func.HttpRequest, context: func.Context) -> func.HttpResponse:
+    return await asgi_middleware.handle_async(req, context)
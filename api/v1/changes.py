@@ -0,0 +1,74 @@
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import BigInteger, cast, event, func, inspect, insert, select, update
+from sqlalchemy.orm import Session
+
+from api.v1 import models
+
+
+SEQUENCED_MODELS = (models.Subboard, models.Message, models.DirectMessage, models.Form)
+
+
+def uses_rowversion(database: Session) -> bool:
+    # On SQL Server the change_sequence columns are rowversions, which the server stamps on every insert and update
+    # without a shared counter. SQLite runs one writer at a time anyway, so it keeps the counter row.
+    return database.get_bind().dialect.name == "mssql"
+
+def next_sequence_value(database: Session, name: str) -> int:
+    # The counter row stays locked until commit, so values become visible to readers in the order they were handed out.
+    result = database.execute(update(models.ChangeSequence).where(models.ChangeSequence.name == name).values(value=models.ChangeSequence.value + 1))
+    if not result.rowcount:
+        database.execute(insert(models.ChangeSequence).values(name=name, value=1))
+        return 1
+
+    return database.execute(select(models.ChangeSequence.value).where(models.ChangeSequence.name == name)).scalar_one()
+
+def next_change_sequence(database: Session) -> int:
+    return next_sequence_value(database, "default")
+
+def read_change_sequence(database: Session) -> int:
+    if uses_rowversion(database):
+        # Rowversions below MIN_ACTIVE_ROWVERSION() belong to committed transactions only, so no later commit can land
+        # below the cursor.
+        return database.execute(select(cast(func.min_active_rowversion(), BigInteger) - 1)).scalar_one()
+
+    return database.execute(select(models.ChangeSequence.value).where(models.ChangeSequence.name == "default")).scalar() or 0
+
+def changed_since(database: Session, column, since: int):
+    # Rowversions compare as big-endian binary, so the cursor is bound the same way to keep index seeks.
+    if uses_rowversion(database):
+        return column > since.to_bytes(8, "big")
+
+    return column > since
+
+def next_bulk_change_sequence(database: Session) -> Optional[int]:
+    # Bulk updates skip the flush that stamps change sequences. A rowversion moves by itself, so only the counter is stamped.
+    return None if uses_rowversion(database) else next_change_sequence(database)
+
+def bulk_change_sequence_values(column, change_sequence: Optional[int]) -> dict:
+    return {} if change_sequence is None else {column: change_sequence}
+
+def _has_membership_changes(user: models.User) -> bool:
+    attributes = inspect(user).attrs
+
+    return attributes.my_boards.history.has_changes() or attributes.my_subboards.history.has_changes()
+
+@event.listens_for(Session, "before_flush")
+def _stamp_change_sequences(database: Session, flush_context, instances) -> None:
+    changed = [instance for instance in database.new if isinstance(instance, SEQUENCED_MODELS)]
+    changed += [instance for instance in database.dirty if isinstance(instance, SEQUENCED_MODELS) and database.is_modified(instance)]
+    # A user who joins or leaves a board or subboard has to resynchronize, since older rows come into or go out of view.
+    users = [user for user in database.dirty if isinstance(user, models.User) and _has_membership_changes(user)]
+    if not changed and not users:
+        return
+    if uses_rowversion(database):
+        # Membership lives in other tables, so the user row is touched to move its rowversion.
+        for user in users:
+            user.updated_at = datetime.now()
+        return
+    change_sequence = next_change_sequence(database)
+    for instance in changed:
+        instance.change_sequence = change_sequence
+    for user in users:
+        user.membership_change_sequence = change_sequence
@@ -0,0 +1,122 @@
+import os
+from typing import Dict, Optional
+import zlib
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+COMPRESSION_MINIMUM_SIZE = int(os.getenv("COMPRESSION_MINIMUM_SIZE", "1024"))
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))
+
+# Server-sent events are left out on purpose: buffering up to the threshold would hold events back.
+COMPRESSIBLE_CONTENT_TYPES = ("application/json", "text/plain", "text/html", "text/csv", "application/x-ndjson")
+
+
+def select_encoding(accept_encoding: str) -> Optional[str]:
+    qualities: Dict[str, float] = {}
+    for coding in accept_encoding.split(","):
+        name, _, parameters = coding.strip().partition(";")
+        quality = 1.0
+        parameter_name, _, value = parameters.strip().partition("=")
+        if parameter_name.strip() == "q":
+            try:
+                quality = float(value)
+            except ValueError:
+                quality = 0.0
+        if name:
+            qualities[name.strip().lower()] = quality
+    best_encoding = None
+    best_quality = 0.0
+    # Listed in order of preference; an equal quality keeps the earlier one.
+    for encoding in ["br", "gzip"] if brotli else ["gzip"]:
+        quality = qualities.get(encoding, qualities.get("*", 0.0))
+        if quality > best_quality:
+            best_encoding = encoding
+            best_quality = quality
+
+    return best_encoding
+
+
+class _Compressor:
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "br":
+            self._compressor = brotli.Compressor(quality=COMPRESSION_BROTLI_QUALITY)
+        else:
+            self._compressor = zlib.compressobj(COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+
+    def compress(self, data: bytes, more_body: bool) -> bytes:
+        if self.encoding == "br":
+            if more_body:
+                return self._compressor.process(data) + self._compressor.flush()
+            return self._compressor.process(data) + self._compressor.finish()
+        # A sync flush hands every streamed chunk to the client as soon as it is produced.
+        if more_body:
+            return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_FINISH)
+
+
+class CompressionMiddleware:
+    def __init__(self, app: ASGIApp, minimum_size: int=COMPRESSION_MINIMUM_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = select_encoding(Headers(scope=scope).get("Accept-Encoding", ""))
+        if not encoding:
+            await self.app(scope, receive, send)
+            return
+        start_message: Optional[Message] = None
+        buffer = b""
+        compressor: Optional[_Compressor] = None
+        passthrough = False
+
+        async def send_with_compression(message: Message) -> None:
+            nonlocal start_message, buffer, compressor, passthrough
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                content_type = headers.get("Content-Type", "").split(";")[0].strip()
+                if "Content-Encoding" in headers or content_type not in COMPRESSIBLE_CONTENT_TYPES:
+                    passthrough = True
+                    await send(message)
+                else:
+                    MutableHeaders(raw=message["headers"]).add_vary_header("Accept-Encoding")
+                    start_message = message
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if compressor:
+                await send({"type": "http.response.body", "body": compressor.compress(body, more_body), "more_body": more_body})
+                return
+            buffer += body
+            if more_body and len(buffer) < self.minimum_size:
+                return
+            headers = MutableHeaders(raw=start_message["headers"])
+            if len(buffer) < self.minimum_size:
+                await send(start_message)
+                await send({"type": "http.response.body", "body": buffer, "more_body": False})
+                return
+            compressor = _Compressor(encoding)
+            compressed = compressor.compress(buffer, more_body)
+            headers["Content-Encoding"] = encoding
+            if more_body:
+                del headers["Content-Length"]
+            else:
+                headers["Content-Length"] = str(len(compressed))
+            await send(start_message)
+            await send({"type": "http.response.body", "body": compressed, "more_body": more_body})
+
+        await self.app(scope, receive, send_with_compression)
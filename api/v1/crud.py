@@ -1,36 +1,73 @@
-from datetime import datetime
-from typing import List, Optional
-from uuid import uuid4
+from datetime import datetime, timedelta
+import json
+from typing import List, Optional, Tuple
 
 from passlib.context import CryptContext
-from sqlalchemy import and_, or_
-from sqlalchemy.orm import Session
-
-from api.v1 import models, schemas
-
-
-def read_line_user(database: Session, user_id: str) -> Optional[models.LINEUser]:
-    return database.query(models.LINEUser).filter(and_(models.LINEUser.user_id == user_id, models.LINEUser.deleted == False)).first()
-
-def create_line_user(database: Session, user_id: str) -> Optional[models.LINEUser]:
-    line_user_uuid = str(uuid4())
+from sqlalchemy import and_, case, exists, func, or_, select, text, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session, joinedload, selectinload
+
+from api.v1 import changes, feeds, ids, models, schemas, unreads
+from api.v1.tracing import traced
+
+
+# Everything schemas.Message and schemas.MyForm read from a listed item, loaded a relationship at a time rather than an item at a time.
+_MESSAGE_LOAD_OPTIONS = (
+    selectinload(models.Message.board).selectinload(models.Board.members).joinedload(models.User.line_user),
+    selectinload(models.Message.subboards).selectinload(models.Subboard.members).joinedload(models.User.line_user)
+)
+_MY_FORM_LOAD_OPTIONS = (
+    selectinload(models.Form.board).joinedload(models.Board.administrator).joinedload(models.User.line_user),
+    selectinload(models.Form.board).selectinload(models.Board.subboards),
+    selectinload(models.Form.subboards),
+    selectinload(models.Form.form_questions)
+)
+
+_UPSERT_LINE_USER_STATEMENT = text("""
+MERGE LINEUsers WITH (HOLDLOCK) AS target
+USING (
+    SELECT linked_user.user_uuid, linked_user.user_key, linked_user.username, linked_user.display_name, line_message_context.line_message_context_uuid, line_message_context.message_context
+    FROM (VALUES (:user_id)) AS line_user_id (user_id)
+    OUTER APPLY (SELECT TOP 1 LINEUsers.line_user_uuid FROM LINEUsers WHERE LINEUsers.user_id = line_user_id.user_id AND LINEUsers.deleted = 0) AS line_user
+    OUTER APPLY (SELECT TOP 1 Users.user_uuid, Users.user_key, Users.username, Users.display_name FROM Users WHERE Users.line_user_uuid = line_user.line_user_uuid AND Users.deleted = 0) AS linked_user
+    OUTER APPLY (SELECT TOP 1 LINEMessageContexts.line_message_context_uuid, LINEMessageContexts.message_context FROM LINEMessageContexts WHERE LINEMessageContexts.line_user_uuid = line_user.line_user_uuid AND LINEMessageContexts.deleted = 0) AS line_message_context
+) AS source
+ON target.user_id = :user_id
+-- A soft-deleted LINE user still holds the unique user_id, so it is matched but left alone and no session is returned.
+WHEN MATCHED AND target.deleted = 0 THEN
+    UPDATE SET target.user_id = target.user_id
+WHEN NOT MATCHED THEN
+    INSERT (line_user_uuid, user_id, created_at, deleted) VALUES (:line_user_uuid, :user_id, :created_at, 0)
+OUTPUT inserted.line_user_uuid, source.user_uuid, source.user_key, source.username, source.display_name, source.line_message_context_uuid, source.message_context;
+""")
+
+@traced
+def upsert_line_user(database: Session, user_id: str) -> Optional[schemas.LINESession]:
+    line_user_uuid = ids.uuid7()
     created_at = datetime.now()
-    line_user = models.LINEUser(
-        line_user_uuid=line_user_uuid,
-        user_id=user_id,
-        created_at=created_at
+    if database.get_bind().dialect.name == "sqlite":
+        statement = sqlite_insert(models.LINEUser).values(line_user_uuid=line_user_uuid, user_id=user_id, created_at=created_at, deleted=False).on_conflict_do_nothing(index_elements=[models.LINEUser.user_id])
+        database.execute(statement)
+        return read_line_session(database, user_id)
+    row = database.execute(_UPSERT_LINE_USER_STATEMENT, {"user_id": user_id, "line_user_uuid": line_user_uuid, "created_at": created_at}).first()
+    if not row:
+        return None
+    line_session = schemas.LINESession(
+        line_user_id=user_id,
+        line_user_uuid=row.line_user_uuid,
+        user_uuid=row.user_uuid,
+        user_key=row.user_key,
+        username=row.username,
+        display_name=row.display_name,
+        message_context=row.message_context,
+        has_message_context=row.line_message_context_uuid is not None
     )
-    database.add(line_user)
-    database.commit()
-    database.refresh(line_user)
-
-    return line_user
 
-def read_line_message_context(database: Session, line_user_uuid: str) -> Optional[models.LINEMessageContext]:
-    return database.query(models.LINEMessageContext).filter(and_(models.LINEMessageContext.line_user_uuid == line_user_uuid, models.LINEMessageContext.deleted == False)).first()
+    return line_session
 
+@traced
 def create_line_message_context(database: Session, line_user_uuid: str, message_context: str) -> Optional[models.LINEMessageContext]:
-    line_message_context_uuid = str(uuid4())
+    line_message_context_uuid = ids.uuid7()
     created_at = datetime.now()
     line_message_context = models.LINEMessageContext(
         line_message_context_uuid=line_message_context_uuid,
@@ -39,22 +76,44 @@ def create_line_message_context(database: Session, line_user_uuid: str, message_
         created_at=created_at
     )
     database.add(line_message_context)
-    database.commit()
-    database.refresh(line_message_context)
 
     return line_message_context
 
-def update_line_message_context(database: Session, line_user_uuid: str, message_context: str) -> Optional[models.LINEMessageContext]:
-    line_message_context = read_line_message_context(database, line_user_uuid)
-    if line_message_context:
-        updated_at = datetime.now()
-        line_message_context.message_context = message_context
-        line_message_context.updated_at = updated_at
-        database.commit()
-        database.refresh(line_message_context)
+@traced
+def update_line_message_context(database: Session, line_user_uuid: str, previous_message_context: Optional[str], message_context: Optional[str]) -> bool:
+    updated_at = datetime.now()
+    updated = database.query(models.LINEMessageContext).filter(and_(models.LINEMessageContext.line_user_uuid == line_user_uuid, models.LINEMessageContext.message_context == previous_message_context, models.LINEMessageContext.deleted == False)).update(
+        {
+            models.LINEMessageContext.message_context: message_context,
+            models.LINEMessageContext.updated_at: updated_at
+        },
+        synchronize_session=False
+    )
 
-    return line_message_context
+    return updated > 0
+
+@traced
+def read_line_session(database: Session, line_user_id: str) -> Optional[schemas.LINESession]:
+    query = database.query(models.LINEUser.line_user_uuid, models.User.user_uuid, models.User.user_key, models.User.username, models.User.display_name, models.LINEMessageContext.line_message_context_uuid, models.LINEMessageContext.message_context)
+    query = query.outerjoin(models.User, and_(models.User.line_user_uuid == models.LINEUser.line_user_uuid, models.User.deleted == False))
+    query = query.outerjoin(models.LINEMessageContext, and_(models.LINEMessageContext.line_user_uuid == models.LINEUser.line_user_uuid, models.LINEMessageContext.deleted == False))
+    row = query.filter(and_(models.LINEUser.user_id == line_user_id, models.LINEUser.deleted == False)).first()
+    if not row:
+        return None
+    line_session = schemas.LINESession(
+        line_user_id=line_user_id,
+        line_user_uuid=row.line_user_uuid,
+        user_uuid=row.user_uuid,
+        user_key=row.user_key,
+        username=row.username,
+        display_name=row.display_name,
+        message_context=row.message_context,
+        has_message_context=row.line_message_context_uuid is not None
+    )
+
+    return line_session
 
+@traced
 def read_user(database: Session, user_uuid: Optional[str]=None, user_id: Optional[str]=None, username: Optional[str]=None, line_user_id: Optional[str]=None) -> Optional[models.User]:
     user = None
     if user_uuid:
@@ -68,20 +127,29 @@ def read_user(database: Session, user_uuid: Optional[str]=None, user_id: Optiona
 
     return user
 
+@traced
 def read_user_by_uuid(database: Session, user_uuid: str) -> Optional[models.User]:
     return database.query(models.User).filter(and_(models.User.user_uuid == user_uuid, models.User.deleted == False)).first()
 
+@traced
 def read_user_by_id(database: Session, user_id: str) -> Optional[models.User]:
     return database.query(models.User).filter(and_(models.User.user_id == user_id, models.User.deleted == False)).first()
 
+@traced
 def read_user_by_name(database: Session, username: str) -> Optional[models.User]:
     return database.query(models.User).filter(and_(models.User.username == username, models.User.deleted == False)).first()
 
+@traced
+def read_users_by_name(database: Session, usernames: List[str]) -> List[models.User]:
+    return database.query(models.User).filter(and_(models.User.username.in_(usernames), models.User.deleted == False)).all() if usernames else []
+
+@traced
 def read_user_by_line_user_id(database: Session, line_user_id: str) -> Optional[models.User]:
     return database.query(models.User).filter(and_(models.User.line_user.has(user_id=line_user_id), models.User.deleted == False)).first()
 
+@traced
 def create_user(database: Session, signup: schemas.Signup) -> Optional[models.User]:
-    user_uuid = str(uuid4())
+    user_uuid = ids.uuid7()
     hashed_password = CryptContext(["bcrypt"]).hash(signup.password)
     created_at = datetime.now()
     user = models.User(
@@ -93,49 +161,80 @@ def create_user(database: Session, signup: schemas.Signup) -> Optional[models.Us
     )
     if signup.line_user_uuid:
         user.line_user_uuid = signup.line_user_uuid
+    ids.assign_user_key(database, user)
     database.add(user)
-    database.commit()
-    database.refresh(user)
 
     return user
 
-def update_password(database: Session, username: str, password: schemas.Password) -> Optional[models.User]:
-    user = read_user(database, username=username)
-    if user:
-        hashed_password = CryptContext(["bcrypt"]).hash(password.new_password)
-        updated_at = datetime.now()
-        user.hashed_password = hashed_password
-        user.updated_at = updated_at
-        database.commit()
-        database.refresh(user)
+@traced
+def update_password(database: Session, user: models.User, password: schemas.Password) -> models.User:
+    hashed_password = CryptContext(["bcrypt"]).hash(password.new_password)
+    updated_at = datetime.now()
+    user.hashed_password = hashed_password
+    user.updated_at = updated_at
 
     return user
 
-def update_display_name(database: Session, username: str, display_name: schemas.DisplayName) -> Optional[models.User]:
-    user = read_user(database, username=username)
-    if user:
-        updated_at = datetime.now()
-        user.display_name = display_name.new_display_name
-        user.updated_at = updated_at
-        database.commit()
-        database.refresh(user)
+@traced
+def update_display_name(database: Session, user: models.User, display_name: schemas.DisplayName) -> models.User:
+    updated_at = datetime.now()
+    user.display_name = display_name.new_display_name
+    user.updated_at = updated_at
+    _update_user_board_versions(database, user.user_key)
 
     return user
 
-def delete_user(database: Session, username: str) -> Optional[models.User]:
-    user = read_user(database, username=username)
-    if user:
-        updated_at = datetime.now()
-        user.updated_at = updated_at
-        user.deleted = True
-        database.commit()
-        database.refresh(user)
+@traced
+def delete_user(database: Session, user: models.User) -> models.User:
+    updated_at = datetime.now()
+    user.updated_at = updated_at
+    user.deleted = True
+    _update_user_board_versions(database, user.user_key)
 
     return user
 
-def read_boards(database: Session, username: str) -> List[models.Board]:
-    return database.query(models.Board).filter(and_(models.Board.administrator_name == username, models.Board.deleted == False)).all()
+def _update_board_versions(database: Session, board_uuids: List[str]) -> None:
+    # Board versions stamp the ETags of board, subboard and form listings, so every write that changes one bumps it.
+    if board_uuids:
+        database.query(models.Board).filter(models.Board.board_uuid.in_(board_uuids)).update({models.Board.version: models.Board.version + 1}, synchronize_session=False)
+
+def _update_user_board_versions(database: Session, user_key: int) -> None:
+    # Member and administrator display names are embedded in the listings of every board the user belongs to.
+    my_board_uuids = database.query(models.BoardMember.board_uuid).filter(models.BoardMember.user_key == user_key)
+    database.query(models.Board).filter(or_(models.Board.administrator_key == user_key, models.Board.board_uuid.in_(my_board_uuids))).update({models.Board.version: models.Board.version + 1}, synchronize_session=False)
+
+def _delete_form_children(database: Session, form_uuids, updated_at: datetime) -> None:
+    # form_uuids may be a subquery, so that a whole board cascades with one UPDATE per table.
+    form_response_uuids = select(models.FormResponse.form_response_uuid).where(models.FormResponse.form_uuid.in_(form_uuids))
+    database.query(models.FormYesNoQuestionResponse).filter(and_(models.FormYesNoQuestionResponse.form_response_uuid.in_(form_response_uuids), models.FormYesNoQuestionResponse.deleted == False)).update({models.FormYesNoQuestionResponse.updated_at: updated_at, models.FormYesNoQuestionResponse.deleted: True}, synchronize_session=False)
+    for model in [models.FormResponse, models.FormYesNoQuestion]:
+        database.query(model).filter(and_(model.form_uuid.in_(form_uuids), model.deleted == False)).update({model.updated_at: updated_at, model.deleted: True}, synchronize_session=False)
+
+def _read_changes(database: Session, query, model, since: Optional[int], reset_before: int=0) -> Tuple[int, bool, list]:
+    # The cursor is read before the rows, so anything committed in between is sent again next time rather than skipped.
+    change_sequence = changes.read_change_sequence(database)
+    reset = since is None or since < reset_before or since > change_sequence
+    if reset:
+        query = query.filter(model.deleted == False)
+    else:
+        query = query.filter(changes.changed_since(database, model.change_sequence, since))
+
+    return change_sequence, reset, query.order_by(model.change_sequence).all()
 
+def _read_membership_change_sequence(database: Session, user_key: int) -> int:
+    return database.query(models.User.membership_change_sequence).filter(models.User.user_key == user_key).scalar() or 0
+
+def _my_board_uuids(user_key: int):
+    return select(models.BoardMember.board_uuid).where(models.BoardMember.user_key == user_key)
+
+def _my_subboard_uuids(user_key: int):
+    return select(models.SubboardMember.subboard_uuid).where(models.SubboardMember.user_key == user_key)
+
+@traced
+def read_board_versions(database: Session, user_key: int) -> List[Tuple[str, int]]:
+    return database.query(models.Board.board_uuid, models.Board.version).filter(and_(models.Board.administrator_key == user_key, models.Board.deleted == False)).all()
+
+@traced
 def read_board(database: Session, board_uuid: Optional[str]=None, board_id: Optional[str]=None) -> Optional[models.Board]:
     board = None
     if board_uuid:
@@ -145,66 +244,84 @@ def read_board(database: Session, board_uuid: Optional[str]=None, board_id: Opti
 
     return board
 
+@traced
 def read_board_by_uuid(database: Session, board_uuid: str) -> Optional[models.Board]:
     return database.query(models.Board).filter(and_(models.Board.board_uuid == board_uuid, models.Board.deleted == False)).first()
 
+@traced
 def read_board_by_id(database: Session, board_id: str) -> Optional[models.Board]:
     return database.query(models.Board).filter(and_(models.Board.board_id == board_id, models.Board.deleted == False)).first()
 
-def create_board(database: Session, username: str, new_board: schemas.NewBoard) -> Optional[models.Board]:
-    board_uuid = str(uuid4())
+@traced
+def read_boards_by_id(database: Session, board_ids: List[str]) -> List[models.Board]:
+    return database.query(models.Board).filter(and_(models.Board.board_id.in_(board_ids), models.Board.deleted == False)).all() if board_ids else []
+
+@traced
+def create_board(database: Session, user_key: int, new_board: schemas.NewBoard) -> Optional[models.Board]:
+    board_uuid = ids.uuid7()
     created_at = datetime.now()
     board = models.Board(
         board_uuid=board_uuid,
         board_id=new_board.board_id,
         board_name=new_board.board_name,
-        administrator_name=username,
+        administrator_key=user_key,
         created_at=created_at
     )
     database.add(board)
-    database.commit()
-    database.refresh(board)
 
     return board
 
-def delete_board(database: Session, board_uuid: str) -> Optional[models.Board]:
-    board = read_board(database, board_uuid=board_uuid)
-    if board:
-        updated_at = datetime.now()
-        board.updated_at = updated_at
-        board.deleted = True
-        for subboard in board.subboards:
-            subboard.updated_at = updated_at
-            subboard.deleted = True
-        database.commit()
-        database.refresh(board)
+@traced
+def delete_board(database: Session, board: models.Board) -> models.Board:
+    updated_at = datetime.now()
+    board.updated_at = updated_at
+    board.deleted = True
+    board.version += 1
+    change_sequence = changes.next_bulk_change_sequence(database)
+    for model in [models.Subboard, models.Message, models.Form]:
+        database.query(model).filter(and_(model.board_uuid == board.board_uuid, model.deleted == False)).update({model.updated_at: updated_at, model.deleted: True, **changes.bulk_change_sequence_values(model.change_sequence, change_sequence)}, synchronize_session=False)
+    _delete_form_children(database, select(models.Form.form_uuid).where(models.Form.board_uuid == board.board_uuid), updated_at)
 
     return board
 
-def read_my_boards(database: Session, username: str) -> List[models.Board]:
-    return database.query(models.Board).filter(and_(models.Board.members.any(username=username), models.Board.deleted == False)).all()
-
-def update_my_boards(database: Session, username: str, new_my_boards: schemas.NewMyBoards) -> Optional[schemas.User]:
-    user = read_user(database, username=username)
-    if user:
-        user.my_boards.clear()
-        for new_my_board_id in new_my_boards.new_my_board_ids:
-            board = read_board_by_id(database, board_id=new_my_board_id)
-            if board:
-                user.my_boards.append(board)
-        database.commit()
-        database.refresh(user)
+@traced
+def read_my_boards(database: Session, user_key: int) -> List[models.Board]:
+    return database.query(models.Board).filter(and_(models.Board.board_uuid.in_(_my_board_uuids(user_key)), models.Board.deleted == False)).all()
+
+@traced
+def read_my_board_versions(database: Session, user_key: int) -> List[Tuple[str, int]]:
+    return database.query(models.Board.board_uuid, models.Board.version).filter(and_(models.Board.board_uuid.in_(_my_board_uuids(user_key)), models.Board.deleted == False)).all()
+
+@traced
+def read_board_membership(database: Session, board_uuid: str, user_key: int) -> bool:
+    # A primary key lookup on BoardMembers, instead of loading every member of the board.
+    return database.query(exists().where(and_(models.BoardMember.user_key == user_key, models.BoardMember.board_uuid == board_uuid))).scalar()
+
+@traced
+def update_my_boards(database: Session, user: models.User, new_my_boards: schemas.NewMyBoards) -> models.User:
+    old_my_board_uuids = {my_board.board_uuid for my_board in user.my_boards}
+    user.my_boards = read_boards_by_id(database, new_my_boards.new_my_board_ids)
+    _update_board_versions(database, old_my_board_uuids ^ {my_board.board_uuid for my_board in user.my_boards})
+    unreads.create_board_read_cursors(database, user.user_key, [my_board.board_uuid for my_board in user.my_boards if my_board.board_uuid not in old_my_board_uuids])
+    unreads.delete_board_read_cursors(database, user.user_key, list(old_my_board_uuids - {my_board.board_uuid for my_board in user.my_boards}))
 
     return user
 
+@traced
 def read_subboards(database: Session, board_uuid: str) -> List[models.Subboard]:
     return database.query(models.Subboard).filter(and_(models.Subboard.board_uuid == board_uuid, models.Subboard.deleted == False)).all()
 
+@traced
 def read_subboard(database: Session, board_uuid: str, subboard_uuid: str) -> Optional[models.Subboard]:
     return database.query(models.Subboard).filter(and_(models.Subboard.board_uuid == board_uuid, models.Subboard.subboard_uuid == subboard_uuid, models.Subboard.deleted == False)).first()
 
+@traced
+def read_subboards_by_uuid(database: Session, board_uuid: str, subboard_uuids: List[str]) -> List[models.Subboard]:
+    return database.query(models.Subboard).filter(and_(models.Subboard.board_uuid == board_uuid, models.Subboard.subboard_uuid.in_(subboard_uuids), models.Subboard.deleted == False)).all() if subboard_uuids else []
+
+@traced
 def create_subboard(database: Session, board_uuid: str, new_subboard: schemas.NewSubboard) -> Optional[models.Subboard]:
-    subboard_uuid = str(uuid4())
+    subboard_uuid = ids.uuid7()
     created_at = datetime.now()
     subboard = models.Subboard(
         subboard_uuid=subboard_uuid,
@@ -213,46 +330,55 @@ def create_subboard(database: Session, board_uuid: str, new_subboard: schemas.Ne
         created_at=created_at
     )
     database.add(subboard)
-    database.commit()
-    database.refresh(subboard)
+    _update_board_versions(database, [board_uuid])
 
     return subboard
 
-def delete_subboard(database: Session, board_uuid: str, subboard_uuid: str) -> Optional[models.Subboard]:
-    subboard = read_subboard(database, board_uuid, subboard_uuid)
-    if subboard:
-        updated_at = datetime.now()
-        subboard.updated_at = updated_at
-        subboard.deleted = True
-        database.commit()
-        database.refresh(subboard)
+@traced
+def delete_subboard(database: Session, subboard: models.Subboard) -> models.Subboard:
+    updated_at = datetime.now()
+    subboard.updated_at = updated_at
+    subboard.deleted = True
+    _update_board_versions(database, [subboard.board_uuid])
+    # Messages and forms of a deleted subboard drop out of view, which incremental syncs cannot express.
+    database.query(models.User).filter(models.User.user_key.in_(select(models.SubboardMember.user_key).where(models.SubboardMember.subboard_uuid == subboard.subboard_uuid))).update({models.User.updated_at: updated_at, **changes.bulk_change_sequence_values(models.User.membership_change_sequence, changes.next_bulk_change_sequence(database))}, synchronize_session=False)
+    if feeds.FEED_ENABLED:
+        feeds.enqueue_feed_repairs(database, select(models.SubboardMember.user_key).where(models.SubboardMember.subboard_uuid == subboard.subboard_uuid), subboard.board_uuid)
 
     return subboard
 
-def read_my_subboards(database: Session, username: str, board_uuid: str) -> List[models.Subboard]:
-    return database.query(models.Subboard).filter(and_(models.Subboard.board_uuid == board_uuid, models.Subboard.members.any(username=username), models.Subboard.deleted == False)).all()
-
-def update_my_subboards(database: Session, username: str, board_uuid: str, new_my_subboards: schemas.NewMySubboards) -> Optional[schemas.User]:
-    user = read_user(database, username=username)
-    if user:
-        user.my_subboards = [my_subboard for my_subboard in user.my_subboards if my_subboard.board_uuid != board_uuid]
-        for new_my_subboard_uuid in new_my_subboards.new_my_subboard_uuids:
-            subboard = read_subboard(database, board_uuid, new_my_subboard_uuid)
-            if subboard:
-                user.my_subboards.append(subboard)
-        database.commit()
-        database.refresh(user)
+@traced
+def read_my_subboards(database: Session, user_key: int, board_uuid: str) -> List[models.Subboard]:
+    return database.query(models.Subboard).filter(and_(models.Subboard.board_uuid == board_uuid, models.Subboard.subboard_uuid.in_(_my_subboard_uuids(user_key)), models.Subboard.deleted == False)).all()
+
+@traced
+def read_my_subboard_changes(database: Session, user_key: int, board_uuid: str, since: Optional[int]) -> Tuple[int, bool, List[models.Subboard]]:
+    query = database.query(models.Subboard).filter(and_(models.Subboard.board_uuid == board_uuid, models.Subboard.subboard_uuid.in_(_my_subboard_uuids(user_key))))
+
+    return _read_changes(database, query, models.Subboard, since, _read_membership_change_sequence(database, user_key))
+
+@traced
+def update_my_subboards(database: Session, user: models.User, board_uuid: str, new_my_subboards: schemas.NewMySubboards) -> models.User:
+    user.my_subboards = [my_subboard for my_subboard in user.my_subboards if my_subboard.board_uuid != board_uuid] + read_subboards_by_uuid(database, board_uuid, new_my_subboards.new_my_subboard_uuids)
+    _update_board_versions(database, [board_uuid])
+    database.flush()
+    unreads.recount_board_read_cursor(database, user.user_key, board_uuid)
+    if feeds.FEED_ENABLED:
+        feeds.enqueue_feed_repairs(database, [user.user_key], board_uuid)
 
     return user
 
+@traced
 def read_messages(database: Session, board_uuid: str) -> List[models.Message]:
     return database.query(models.Message).filter(and_(models.Message.board_uuid == board_uuid, models.Message.deleted == False)).all()
 
+@traced
 def read_message(database: Session, board_uuid: str, message_uuid: str) -> Optional[models.Message]:
     return database.query(models.Message).filter(and_(models.Message.message_uuid == message_uuid, models.Message.board_uuid == board_uuid, models.Message.deleted == False)).first()
 
+@traced
 def create_message(database: Session, board_uuid: str, new_message: schemas.NewMessage) -> Optional[models.Message]:
-    message_uuid = str(uuid4())
+    message_uuid = ids.uuid7()
     created_at = datetime.now()
     message = models.Message(
         message_uuid=message_uuid,
@@ -261,105 +387,337 @@ def create_message(database: Session, board_uuid: str, new_message: schemas.NewM
         scheduled_send_time=new_message.scheduled_send_time,
         created_at=created_at
     )
-    for subboard_uuid in new_message.subboard_uuids:
-        subboard = read_subboard(database, board_uuid, subboard_uuid)
-        message.subboards.append(subboard)
+    message.subboards = read_subboards_by_uuid(database, board_uuid, new_message.subboard_uuids)
     database.add(message)
-    database.commit()
-    database.refresh(message)
+    unreads.count_message(database, board_uuid, [subboard.subboard_uuid for subboard in message.subboards])
+    if feeds.FEED_ENABLED:
+        feeds.fan_out(database, "message", message_uuid, board_uuid, created_at)
 
     return message
 
-def update_message_send_time(database: Session, board_uuid: str, message_uuid: str) -> Optional[models.Message]:
-    message = read_message(database, board_uuid, message_uuid)
-    if message:
-        send_time = datetime.now()
-        updated_at = datetime.now()
-        message.send_time = send_time
-        message.updated_at = updated_at
-        database.commit()
-        database.refresh(message)
+@traced
+def update_message_send_time(database: Session, message: models.Message) -> models.Message:
+    send_time = datetime.now()
+    updated_at = datetime.now()
+    message.send_time = send_time
+    message.updated_at = updated_at
 
     return message
 
-def delete_message(database: Session, board_uuid: str, message_uuid: str) -> Optional[models.Message]:
-    message = read_message(database, board_uuid, message_uuid)
-    if message:
-        updated_at = datetime.now()
-        message.updated_at = updated_at
-        message.deleted = True
-        database.commit()
-        database.refresh(message)
+@traced
+def delete_message(database: Session, message: models.Message) -> models.Message:
+    updated_at = datetime.now()
+    message.updated_at = updated_at
+    message.deleted = True
+    unreads.uncount_message(database, message)
 
     return message
 
-def read_my_messages(database: Session, username: str, board_uuid: str) -> List[models.Message]:
-    query = database.query(models.Message).filter(and_(models.Message.board_uuid == board_uuid, models.Message.deleted == False))
-    my_subboards = read_my_subboards(database, username, board_uuid)
+@traced
+def update_board_read_cursor(database: Session, user_key: int, board_uuid: str, message: Optional[models.Message]) -> None:
+    # Memberships that predate read cursors get theirs on first use.
+    unreads.create_board_read_cursors(database, user_key, [board_uuid])
+    unreads.advance_board_read_cursor(database, user_key, board_uuid, message)
+
+@traced
+def read_message_deliveries(database: Session, message_uuid: str) -> List[models.MessageDelivery]:
+    return database.query(models.MessageDelivery).filter(and_(models.MessageDelivery.message_uuid == message_uuid, models.MessageDelivery.deleted == False)).order_by(models.MessageDelivery.chunk_index).all()
+
+@traced
+def read_dead_letter_message_deliveries(database: Session, board_uuid: str) -> List[models.MessageDelivery]:
+    return database.query(models.MessageDelivery).join(models.Message).filter(and_(models.Message.board_uuid == board_uuid, models.MessageDelivery.status == "dead_letter", models.MessageDelivery.deleted == False)).order_by(models.MessageDelivery.created_at).all()
+
+def _update_message_deliveries_sending(database: Session, claimable, candidates, lease: float, values: dict) -> List[models.MessageDelivery]:
+    claimed_at = datetime.now()
+    # The claimable condition is checked again by the UPDATE itself, so of two concurrent claims only one gets each row.
+    statement = update(models.MessageDelivery).where(and_(models.MessageDelivery.message_delivery_uuid.in_(candidates), claimable)).values(status="sending", next_attempt_at=claimed_at + timedelta(seconds=lease), updated_at=claimed_at, **values).returning(models.MessageDelivery)
+    message_deliveries = database.scalars(statement, execution_options={"synchronize_session": False, "populate_existing": True}).all()
+
+    return sorted(message_deliveries, key=lambda message_delivery: (message_delivery.message_uuid, message_delivery.chunk_index))
+
+@traced
+def update_retryable_message_deliveries_sending(database: Session, limit: int, lease: float) -> List[models.MessageDelivery]:
+    now = datetime.now()
+    # A "sending" row whose lease has run out belongs to a send that crashed or timed out, and is retried like a failed one.
+    retryable = and_(models.MessageDelivery.status.in_(["failed", "sending"]), models.MessageDelivery.next_attempt_at <= now, models.MessageDelivery.deleted == False)
+    candidates = select(models.MessageDelivery.message_delivery_uuid).where(retryable).order_by(models.MessageDelivery.next_attempt_at).limit(limit)
+
+    return _update_message_deliveries_sending(database, retryable, candidates, lease, {})
+
+@traced
+def create_message_deliveries(database: Session, message_uuid: str, line_user_ids: List[str], chunk_size: int, lease: float) -> List[models.MessageDelivery]:
+    created_at = datetime.now()
+    message_deliveries = []
+    for chunk_index, i in enumerate(range(0, len(line_user_ids), chunk_size)):
+        chunk = line_user_ids[i:i + chunk_size]
+        message_delivery = models.MessageDelivery(
+            message_delivery_uuid=ids.uuid7(),
+            message_uuid=message_uuid,
+            chunk_index=chunk_index,
+            line_user_ids=json.dumps(chunk),
+            recipient_count=len(chunk),
+            status="sending",
+            attempts=0,
+            next_attempt_at=created_at + timedelta(seconds=lease),
+            created_at=created_at
+        )
+        database.add(message_delivery)
+        message_deliveries.append(message_delivery)
+
+    return message_deliveries
+
+def _update_delivery_result(delivery, error: Optional[str], updated_at: datetime, max_attempts: int, retry_backoff: float) -> None:
+    delivery.attempts += 1
+    delivery.last_error = error
+    delivery.updated_at = updated_at
+    if not error:
+        delivery.status = "sent"
+        delivery.sent_at = updated_at
+        delivery.next_attempt_at = None
+    elif delivery.attempts >= max_attempts:
+        delivery.status = "dead_letter"
+        delivery.next_attempt_at = None
+    else:
+        delivery.status = "failed"
+        delivery.next_attempt_at = updated_at + timedelta(seconds=retry_backoff * 2 ** (delivery.attempts - 1))
+
+@traced
+def update_message_delivery_results(database: Session, results: List[Tuple[models.MessageDelivery, Optional[str]]], max_attempts: int, retry_backoff: float) -> List[models.MessageDelivery]:
+    updated_at = datetime.now()
+    for message_delivery, error in results:
+        _update_delivery_result(message_delivery, error, updated_at, max_attempts, retry_backoff)
+
+    return [message_delivery for message_delivery, _ in results]
+
+@traced
+def update_replayable_message_deliveries_sending(database: Session, message_uuid: str, lease: float) -> List[models.MessageDelivery]:
+    replayable = and_(models.MessageDelivery.message_uuid == message_uuid, models.MessageDelivery.status.in_(["failed", "dead_letter"]), models.MessageDelivery.deleted == False)
+    candidates = select(models.MessageDelivery.message_delivery_uuid).where(replayable)
+
+    return _update_message_deliveries_sending(database, replayable, candidates, lease, {"attempts": 0})
+
+@traced
+def update_feed_fan_outs(database: Session, limit: int) -> int:
+    feed_fan_outs = database.query(models.FeedFanOut).order_by(models.FeedFanOut.created_at).limit(limit).all()
+    for feed_fan_out in feed_fan_outs:
+        feeds.create_feed_items(database, feed_fan_out.item_type, feed_fan_out.item_uuid, feed_fan_out.board_uuid, feed_fan_out.created_at)
+        database.delete(feed_fan_out)
+        database.commit()
+
+    return len(feed_fan_outs)
+
+@traced
+def update_feed_repairs(database: Session, limit: int) -> int:
+    feed_repairs = database.query(models.FeedRepair).order_by(models.FeedRepair.created_at).limit(limit).all()
+    for feed_repair in feed_repairs:
+        user_key, board_uuid, created_at = feed_repair.user_key, feed_repair.board_uuid, feed_repair.created_at
+        feeds.rebuild_feed(database, user_key, board_uuid)
+        # A membership change made during the rebuild re-stamps the repair, which then stays queued for the next run.
+        database.query(models.FeedRepair).filter(and_(models.FeedRepair.user_key == user_key, models.FeedRepair.board_uuid == board_uuid, models.FeedRepair.created_at == created_at)).delete(synchronize_session=False)
+        database.commit()
+
+    return len(feed_repairs)
+
+@traced
+def read_my_messages(database: Session, user_key: int, board_uuid: str) -> List[models.Message]:
+    if feeds.FEED_ENABLED and not feeds.has_feed_repair(database, user_key, board_uuid):
+        return feeds.read_feed(database, "message", user_key, board_uuid, _MESSAGE_LOAD_OPTIONS)
+    query = database.query(models.Message).options(*_MESSAGE_LOAD_OPTIONS).filter(and_(models.Message.board_uuid == board_uuid, models.Message.deleted == False))
+    my_subboards = read_my_subboards(database, user_key, board_uuid)
     messages = query.filter(models.Message.subboards.any(models.Subboard.subboard_uuid.in_([my_subboard.subboard_uuid for my_subboard in my_subboards]))).all()
 
     return messages
 
-def read_direct_messages(database: Session, username: str) -> List[models.DirectMessage]:
-    return database.query(models.DirectMessage).filter(and_(or_(models.DirectMessage.send_from.has(username=username), models.DirectMessage.send_to.has(username=username)), models.DirectMessage.deleted == False)).all()
+@traced
+def read_my_message_changes(database: Session, user_key: int, board_uuid: str, since: Optional[int]) -> Tuple[int, bool, List[models.Message]]:
+    query = database.query(models.Message).filter(and_(models.Message.board_uuid == board_uuid, models.Message.subboards.any(and_(models.Subboard.subboard_uuid.in_(_my_subboard_uuids(user_key)), models.Subboard.deleted == False))))
+
+    return _read_changes(database, query, models.Message, since, _read_membership_change_sequence(database, user_key))
+
+_UPSERT_CONVERSATION_STATEMENT = text("""
+MERGE Conversations WITH (HOLDLOCK) AS target
+USING (VALUES (:user_key_low, :user_key_high)) AS source (user_key_low, user_key_high)
+ON target.user_key_low = source.user_key_low AND target.user_key_high = source.user_key_high
+WHEN NOT MATCHED THEN
+    INSERT (conversation_uuid, user_key_low, user_key_high, created_at) VALUES (:conversation_uuid, :user_key_low, :user_key_high, :created_at)
+OUTPUT inserted.conversation_uuid;
+""")
+
+def _upsert_conversation(database: Session, user_key: int, with_user_key: int, created_at: datetime) -> str:
+    # A pair of users shares one conversation, so both orders of the pair map to the same row.
+    user_key_low, user_key_high = min(user_key, with_user_key), max(user_key, with_user_key)
+    conversation_uuid = ids.uuid7()
+    if database.get_bind().dialect.name == "sqlite":
+        statement = sqlite_insert(models.Conversation).values(conversation_uuid=conversation_uuid, user_key_low=user_key_low, user_key_high=user_key_high, created_at=created_at).on_conflict_do_nothing(index_elements=[models.Conversation.user_key_low, models.Conversation.user_key_high])
+        inserted = database.execute(statement).rowcount > 0
+    else:
+        inserted = database.execute(_UPSERT_CONVERSATION_STATEMENT, {"conversation_uuid": conversation_uuid, "user_key_low": user_key_low, "user_key_high": user_key_high, "created_at": created_at}).first() is not None
+    if not inserted:
+        return database.query(models.Conversation.conversation_uuid).filter(and_(models.Conversation.user_key_low == user_key_low, models.Conversation.user_key_high == user_key_high)).scalar()
+    for member_key, member_with_key in {(user_key_low, user_key_high), (user_key_high, user_key_low)}:
+        database.add(models.ConversationMember(conversation_uuid=conversation_uuid, user_key=member_key, with_user_key=member_with_key, last_message_at=created_at, created_at=created_at))
+
+    return conversation_uuid
+
+@traced
+def read_conversations(database: Session, user_key: int) -> List[models.ConversationMember]:
+    # Everything schemas.Conversation reads is loaded here, so the inbox costs the same number of statements however long it is.
+    query = database.query(models.ConversationMember).options(
+        joinedload(models.ConversationMember.with_user).joinedload(models.User.line_user),
+        selectinload(models.ConversationMember.with_member),
+        selectinload(models.ConversationMember.last_direct_message).joinedload(models.DirectMessage.send_from).joinedload(models.User.line_user),
+        selectinload(models.ConversationMember.last_direct_message).joinedload(models.DirectMessage.send_to).joinedload(models.User.line_user)
+    )
+
+    return query.filter(models.ConversationMember.user_key == user_key).order_by(models.ConversationMember.last_message_at.desc()).all()
+
+@traced
+def read_conversation(database: Session, user_key: int, conversation_uuid: str) -> Optional[models.ConversationMember]:
+    return database.get(models.ConversationMember, (conversation_uuid, user_key))
+
+@traced
+def read_conversation_direct_messages(database: Session, conversation_uuid: str) -> List[models.DirectMessage]:
+    return database.query(models.DirectMessage).filter(and_(models.DirectMessage.conversation_uuid == conversation_uuid, models.DirectMessage.deleted == False)).order_by(models.DirectMessage.created_at).all()
+
+@traced
+def update_conversation_read_cursor(database: Session, conversation_member: models.ConversationMember, direct_message: Optional[models.DirectMessage]) -> models.ConversationMember:
+    unreads.advance_conversation_read_cursor(database, conversation_member, direct_message)
+
+    return conversation_member
 
+@traced
+def read_unread_counts(database: Session, user_key: int) -> Tuple[List[models.BoardReadCursor], List[models.ConversationMember]]:
+    # The membership join hides cursors left behind by boards that were left before their cursors were deleted.
+    board_read_cursors = database.query(models.BoardReadCursor).join(models.Board, models.Board.board_uuid == models.BoardReadCursor.board_uuid).join(models.BoardMember, and_(models.BoardMember.board_uuid == models.BoardReadCursor.board_uuid, models.BoardMember.user_key == models.BoardReadCursor.user_key)).filter(and_(models.BoardReadCursor.user_key == user_key, models.BoardReadCursor.unread_count > 0, models.Board.deleted == False)).all()
+    conversation_members = database.query(models.ConversationMember).filter(and_(models.ConversationMember.user_key == user_key, models.ConversationMember.unread_count > 0)).all()
+
+    return board_read_cursors, conversation_members
+
+@traced
+def read_direct_messages(database: Session, user_key: int) -> List[models.DirectMessage]:
+    return database.query(models.DirectMessage).join(models.ConversationMember, models.ConversationMember.conversation_uuid == models.DirectMessage.conversation_uuid).filter(and_(models.ConversationMember.user_key == user_key, models.DirectMessage.deleted == False)).all()
+
+@traced
 def read_direct_message(database: Session, direct_message_uuid: str) -> Optional[models.DirectMessage]:
-    return database.query(models.DirectMessage).filter(and_(models.DirectMessage.direct_message_uuid == direct_message_uuid, models.Message.deleted == False)).first()
+    return database.query(models.DirectMessage).filter(and_(models.DirectMessage.direct_message_uuid == direct_message_uuid, models.DirectMessage.deleted == False)).first()
 
-def create_direct_message(database: Session, username: str, new_direct_message: schemas.NewDirectMessage) -> Optional[models.DirectMessage]:
+@traced
+def create_direct_message(database: Session, user: models.User, new_direct_message: schemas.NewDirectMessage) -> Optional[models.DirectMessage]:
     direct_messages = []
-    for send_to_name in new_direct_message.send_to_names:
-        direct_message_uuid = str(uuid4())
+    for send_to in read_users_by_name(database, new_direct_message.send_to_names):
+        direct_message_uuid = ids.uuid7()
         created_at = datetime.now()
+        conversation_uuid = _upsert_conversation(database, user.user_key, send_to.user_key, created_at)
         direct_message = models.DirectMessage(
             direct_message_uuid=direct_message_uuid,
-            send_from_name=username,
-            send_to_name=send_to_name,
+            send_from=user,
+            send_to=send_to,
+            conversation_uuid=conversation_uuid,
             body=new_direct_message.body,
             scheduled_send_time=new_direct_message.scheduled_send_time,
             created_at=created_at
         )
         database.add(direct_message)
-        database.commit()
-        database.refresh(direct_message)
+        database.flush()
+        # Counters are bumped in place, so concurrent messages to the same conversation do not lose increments.
+        database.query(models.ConversationMember).filter(models.ConversationMember.conversation_uuid == conversation_uuid).update(
+            {
+                models.ConversationMember.last_direct_message_uuid: direct_message_uuid,
+                models.ConversationMember.last_message_at: created_at,
+                models.ConversationMember.unread_count: case((models.ConversationMember.user_key != user.user_key, models.ConversationMember.unread_count + 1), else_=models.ConversationMember.unread_count)
+            },
+            synchronize_session=False
+        )
         direct_messages.append(direct_message)
 
     return direct_messages
 
-def update_direct_message_send_time(database: Session, direct_message_uuid: str) -> Optional[models.DirectMessage]:
-    direct_message = read_direct_message(database, direct_message_uuid)
-    if direct_message:
-        send_time = datetime.now()
-        updated_at = datetime.now()
-        direct_message.send_time = send_time
-        direct_message.updated_at = updated_at
-        database.commit()
-        database.refresh(direct_message)
+@traced
+def read_direct_message_changes(database: Session, user_key: int, since: Optional[int]) -> Tuple[int, bool, List[models.DirectMessage]]:
+    query = database.query(models.DirectMessage).filter(or_(models.DirectMessage.send_from_key == user_key, models.DirectMessage.send_to_key == user_key))
+
+    return _read_changes(database, query, models.DirectMessage, since)
+
+@traced
+def update_direct_message_send_time(database: Session, direct_message: models.DirectMessage) -> models.DirectMessage:
+    send_time = datetime.now()
+    updated_at = datetime.now()
+    direct_message.send_time = send_time
+    direct_message.updated_at = updated_at
 
     return direct_message
 
-def delete_direct_message(database: Session, message_uuid: str) -> Optional[models.DirectMessage]:
-    direct_message = read_direct_message(database, message_uuid)
-    if direct_message:
-        updated_at = datetime.now()
-        direct_message.updated_at = updated_at
-        direct_message.deleted = True
-        database.commit()
-        database.refresh(direct_message)
+@traced
+def create_direct_message_deliveries(database: Session, direct_messages: List[models.DirectMessage], lease: float) -> List[models.DirectMessageDelivery]:
+    created_at = datetime.now()
+    direct_message_deliveries = []
+    for direct_message in direct_messages:
+        if not direct_message.send_to.line_user:
+            continue
+        direct_message_delivery = models.DirectMessageDelivery(
+            direct_message=direct_message,
+            line_user_id=direct_message.send_to.line_user.user_id,
+            status="sending",
+            attempts=0,
+            next_attempt_at=created_at + timedelta(seconds=lease),
+            created_at=created_at
+        )
+        database.add(direct_message_delivery)
+        direct_message_deliveries.append(direct_message_delivery)
+
+    return direct_message_deliveries
+
+@traced
+def update_retryable_direct_message_deliveries_sending(database: Session, limit: int, lease: float) -> List[models.DirectMessageDelivery]:
+    claimed_at = datetime.now()
+    # Claimed like message deliveries: the UPDATE checks the condition again, so a concurrent run never gets the same row.
+    retryable = and_(models.DirectMessageDelivery.status.in_(["failed", "sending"]), models.DirectMessageDelivery.next_attempt_at <= claimed_at, models.DirectMessageDelivery.deleted == False)
+    candidates = select(models.DirectMessageDelivery.direct_message_uuid).where(retryable).order_by(models.DirectMessageDelivery.next_attempt_at).limit(limit)
+    statement = update(models.DirectMessageDelivery).where(and_(models.DirectMessageDelivery.direct_message_uuid.in_(candidates), retryable)).values(status="sending", next_attempt_at=claimed_at + timedelta(seconds=lease), updated_at=claimed_at).returning(models.DirectMessageDelivery)
+
+    return database.scalars(statement, execution_options={"synchronize_session": False, "populate_existing": True}).all()
+
+@traced
+def update_direct_message_delivery_results(database: Session, results: List[Tuple[models.DirectMessageDelivery, Optional[str]]], max_attempts: int, retry_backoff: float) -> List[models.DirectMessageDelivery]:
+    updated_at = datetime.now()
+    for direct_message_delivery, error in results:
+        _update_delivery_result(direct_message_delivery, error, updated_at, max_attempts, retry_backoff)
+
+    return [direct_message_delivery for direct_message_delivery, _ in results]
+
+@traced
+def delete_direct_message(database: Session, direct_message: models.DirectMessage) -> models.DirectMessage:
+    updated_at = datetime.now()
+    direct_message.updated_at = updated_at
+    direct_message.deleted = True
+    unreads.uncount_direct_message(database, direct_message)
+    latest_direct_messages = select(models.DirectMessage).where(and_(models.DirectMessage.conversation_uuid == direct_message.conversation_uuid, models.DirectMessage.direct_message_uuid != direct_message.direct_message_uuid, models.DirectMessage.deleted == False)).order_by(models.DirectMessage.created_at.desc()).limit(1)
+    # The inbox is ordered by last_message_at, so it moves back with the pointer; an emptied conversation falls back to when it was started.
+    database.query(models.ConversationMember).filter(and_(models.ConversationMember.conversation_uuid == direct_message.conversation_uuid, models.ConversationMember.last_direct_message_uuid == direct_message.direct_message_uuid)).update(
+        {
+            models.ConversationMember.last_direct_message_uuid: latest_direct_messages.with_only_columns(models.DirectMessage.direct_message_uuid).scalar_subquery(),
+            models.ConversationMember.last_message_at: func.coalesce(latest_direct_messages.with_only_columns(models.DirectMessage.created_at).scalar_subquery(), models.ConversationMember.created_at)
+        },
+        synchronize_session=False
+    )
 
     return direct_message
 
-def read_my_direct_messages(database: Session, username: str) -> List[models.DirectMessage]:
-    return database.query(models.DirectMessage).filter(and_(models.DirectMessage.send_from.has(username=username), models.DirectMessage.deleted == False)).all()
+@traced
+def read_my_direct_messages(database: Session, user_key: int) -> List[models.DirectMessage]:
+    return database.query(models.DirectMessage).filter(and_(models.DirectMessage.send_from_key == user_key, models.DirectMessage.deleted == False)).all()
 
+@traced
 def read_forms(database: Session, board_uuid: str) -> List[models.Form]:
     return database.query(models.Form).filter(and_(models.Form.board_uuid == board_uuid, models.Form.deleted == False)).all()
 
+@traced
 def read_form(database: Session, board_uuid: str, form_uuid: str) -> Optional[models.Form]:
     return database.query(models.Form).filter(and_(models.Form.form_uuid == form_uuid, models.Form.board_uuid == board_uuid, models.Form.deleted == False)).first()
 
+@traced
 def create_form(database: Session, board_uuid: str, new_form: schemas.NewForm) -> Optional[models.Form]:
-    form_uuid = str(uuid4())
+    form_uuid = ids.uuid7()
     created_at = datetime.now()
     form = models.Form(
         form_uuid=form_uuid,
@@ -368,38 +726,29 @@ def create_form(database: Session, board_uuid: str, new_form: schemas.NewForm) -
         scheduled_send_time=new_form.scheduled_send_time,
         created_at=created_at
     )
-    for subboard_uuid in new_form.subboard_uuids:
-        subboard = read_subboard(database, board_uuid, subboard_uuid)
-        form.subboards.append(subboard)
+    form.subboards = read_subboards_by_uuid(database, board_uuid, new_form.subboard_uuids)
+    for new_form_question in new_form.new_form_questions:
+        form.form_questions.append(create_form_question(database, form_uuid, new_form_question))
     database.add(form)
-    database.commit()
-    database.refresh(form)
-    if form:
-        for new_form_question in new_form.new_form_questions:
-            form_question = create_form_question(database, form.form_uuid, new_form_question)
-            if form_question:
-                form.form_questions.append(form_question)
-        database.commit()
-        database.refresh(form)
+    if feeds.FEED_ENABLED:
+        feeds.fan_out(database, "form", form_uuid, board_uuid, created_at)
+    _update_board_versions(database, [board_uuid])
 
     return form
 
-def delete_form(database: Session, board_uuid: str, form_uuid: str) -> Optional[models.Form]:
-    form = read_form(database, board_uuid, form_uuid)
-    if form:
-        updated_at = datetime.now()
-        form.updated_at = updated_at
-        form.deleted = True
-        for form_question in form.form_questions:
-            form_question.updated_at = updated_at
-            form_question.deleted = True
-        database.commit()
-        database.refresh(form)
+@traced
+def delete_form(database: Session, form: models.Form) -> models.Form:
+    updated_at = datetime.now()
+    form.updated_at = updated_at
+    form.deleted = True
+    _delete_form_children(database, [form.form_uuid], updated_at)
+    _update_board_versions(database, [form.board_uuid])
 
     return form
 
+@traced
 def create_form_question(database: Session, form_uuid: str, new_form_question: schemas.FormYesNoQuestion) -> Optional[models.FormYesNoQuestion]:
-    form_question_uuid = str(uuid4())
+    form_question_uuid = ids.uuid7()
     created_at = datetime.now()
     form_question = models.FormYesNoQuestion(
         form_question_uuid=form_question_uuid,
@@ -410,45 +759,58 @@ def create_form_question(database: Session, form_uuid: str, new_form_question: s
         created_at=created_at
     )
     database.add(form_question)
-    database.commit()
-    database.refresh(form_question)
 
     return form_question
 
-def read_my_forms(database: Session, username: str, board_uuid: str) -> Optional[models.Form]:
-    query = database.query(models.Form).filter(and_(models.Form.board_uuid == board_uuid, models.Form.deleted == False))
-    my_subboards = read_my_subboards(database, username, board_uuid)
+@traced
+def read_my_forms(database: Session, user_key: int, board_uuid: str) -> Optional[models.Form]:
+    if feeds.FEED_ENABLED and not feeds.has_feed_repair(database, user_key, board_uuid):
+        return feeds.read_feed(database, "form", user_key, board_uuid, _MY_FORM_LOAD_OPTIONS)
+    query = database.query(models.Form).options(*_MY_FORM_LOAD_OPTIONS).filter(and_(models.Form.board_uuid == board_uuid, models.Form.deleted == False))
+    my_subboards = read_my_subboards(database, user_key, board_uuid)
     forms = query.filter(models.Form.subboards.any(models.Subboard.subboard_uuid.in_([my_subboard.subboard_uuid for my_subboard in my_subboards]))).all()
 
     return forms
 
-def read_my_form_responses(database: Session, username: str, form_uuid: str) -> List[models.FormResponse]:
-    return database.query(models.FormResponse).filter(and_(models.FormResponse.form_uuid == form_uuid, models.FormResponse.respondent_name == username, models.FormResponse.deleted == False)).all()
+@traced
+def read_my_form_changes(database: Session, user_key: int, board_uuid: str, since: Optional[int]) -> Tuple[int, bool, List[models.Form]]:
+    query = database.query(models.Form).filter(and_(models.Form.board_uuid == board_uuid, models.Form.subboards.any(and_(models.Subboard.subboard_uuid.in_(_my_subboard_uuids(user_key)), models.Subboard.deleted == False))))
 
-def create_my_form_response(database: Session, username: str, form_uuid: str, new_my_form_response: schemas.NewMyFormResponse) -> Optional[models.FormResponse]:
-    form_response_uuid = str(uuid4())
+    return _read_changes(database, query, models.Form, since, _read_membership_change_sequence(database, user_key))
+
+@traced
+def read_form_response_page_end(database: Session, form_uuid: str, after: Optional[str], limit: int) -> Optional[str]:
+    # The last response of a page of limit responses, or None when no response follows the page.
+    query = database.query(models.FormResponse.form_response_uuid).filter(and_(models.FormResponse.form_uuid == form_uuid, models.FormResponse.deleted == False))
+    if after:
+        query = query.filter(models.FormResponse.form_response_uuid > after)
+    form_response_uuids = [form_response_uuid for form_response_uuid, in query.order_by(models.FormResponse.form_response_uuid).offset(limit - 1).limit(2)]
+
+    return form_response_uuids[0] if len(form_response_uuids) == 2 else None
+
+@traced
+def read_my_form_responses(database: Session, user_key: int, form_uuid: str) -> List[models.FormResponse]:
+    return database.query(models.FormResponse).filter(and_(models.FormResponse.form_uuid == form_uuid, models.FormResponse.respondent_key == user_key, models.FormResponse.deleted == False)).all()
+
+@traced
+def create_my_form_response(database: Session, user_key: int, form_uuid: str, new_my_form_response: schemas.NewMyFormResponse) -> Optional[models.FormResponse]:
+    form_response_uuid = ids.uuid7()
     created_at = datetime.now()
     form_response = models.FormResponse(
         form_response_uuid=form_response_uuid,
-        respondent_name=username,
+        respondent_key=user_key,
         form_uuid=form_uuid,
         created_at=created_at
     )
+    for new_form_question_response in new_my_form_response.form_question_responses:
+        form_response.form_question_responses.append(create_form_question_response(database, form_response_uuid, new_form_question_response))
     database.add(form_response)
-    database.commit()
-    database.refresh(form_response)
-    if form_response:
-        for new_form_question_response in new_my_form_response.form_question_responses:
-            form_question_response = create_form_question_response(database, form_response.form_response_uuid, new_form_question_response)
-            if form_question_response:
-                form_response.form_question_responses.append(form_question_response)
-        database.commit()
-        database.refresh(form_response)
 
     return form_response
 
+@traced
 def create_form_question_response(database: Session, form_response_uuid: str, new_form_question_response: schemas.FormYesNoQuestionResponse) -> Optional[models.FormYesNoQuestionResponse]:
-    form_question_response_uuid = str(uuid4())
+    form_question_response_uuid = ids.uuid7()
     created_at = datetime.now()
     form_question_response = models.FormYesNoQuestionResponse(
         form_question_response_uuid=form_question_response_uuid,
@@ -459,7 +821,5 @@ def create_form_question_response(database: Session, form_response_uuid: str, ne
         created_at=created_at
     )
     database.add(form_question_response)
-    database.commit()
-    database.refresh(form_question_response)
 
     return form_question_response
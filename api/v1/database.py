@@ -2,15 +2,61 @@ import os
 import urllib.parse
 
 from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
 
+from api.v1.instrumentation import instrument_engine
+from api.v1.metrics import instrument_pool
 
-DATABASE_PASSWORD = os.getenv("DATABASE_PASSWORD")
-DATABASE_CONNECTION_STRING = urllib.parse.quote_plus("Driver={ODBC Driver 17 for SQL Server};Server=tcp:mosa-cup-backend.database.windows.net,1433;Database=mosa_cup_backend;Uid=mosa_cup_backend;Pwd={%s};Encrypt=yes;TrustServerCertificate=no;Connection Timeout=30;" % DATABASE_PASSWORD)
-DATABASE_URL = f"mssql+pyodbc:///?odbc_connect={DATABASE_CONNECTION_STRING}"
 
-engine = create_engine(DATABASE_URL)
-LocalSession = sessionmaker(engine)
+def get_database_url(read_only: bool=False) -> str:
+    DATABASE_URL = os.getenv("DATABASE_URL")
+    if DATABASE_URL:
+        return os.getenv("DATABASE_READ_ONLY_URL", DATABASE_URL) if read_only else DATABASE_URL
+    DATABASE_PROFILE = os.getenv("DATABASE_PROFILE", "azure")
+    DATABASE_PASSWORD = os.getenv("DATABASE_PASSWORD")
+    # Read-intent connections are routed by Azure SQL to a readable secondary replica.
+    APPLICATION_INTENT = "ApplicationIntent=ReadOnly;" if read_only else ""
+    if DATABASE_PROFILE == "memory":
+        return "sqlite://"
+    if DATABASE_PROFILE == "sqlite":
+        return f"sqlite:///{os.getenv('DATABASE_SQLITE_PATH', './mosa_cup_backend.sqlite3')}"
+    if DATABASE_PROFILE == "local":
+        DATABASE_CONNECTION_STRING = urllib.parse.quote_plus("Driver={ODBC Driver 17 for SQL Server};Server=tcp:localhost,1433;Database=mosa_cup_backend;Uid=sa;Pwd={%s};Encrypt=no;TrustServerCertificate=yes;Connection Timeout=30;%s" % (DATABASE_PASSWORD, APPLICATION_INTENT))
+        return f"mssql+pyodbc:///?odbc_connect={DATABASE_CONNECTION_STRING}"
+    if DATABASE_PROFILE != "azure":
+        raise ValueError(f"Unknown DATABASE_PROFILE: {DATABASE_PROFILE}")
+    DATABASE_CONNECTION_STRING = urllib.parse.quote_plus("Driver={ODBC Driver 17 for SQL Server};Server=tcp:mosa-cup-backend.database.windows.net,1433;Database=mosa_cup_backend;Uid=mosa_cup_backend;Pwd={%s};Encrypt=yes;TrustServerCertificate=no;Connection Timeout=30;%s" % (DATABASE_PASSWORD, APPLICATION_INTENT))
+
+    return f"mssql+pyodbc:///?odbc_connect={DATABASE_CONNECTION_STRING}"
+
+def create_database_engine(database_url: str) -> Engine:
+    if database_url.startswith("sqlite"):
+        if database_url in ["sqlite://", "sqlite:///:memory:"]:
+            # Every session has to share the single connection that holds the in-memory database.
+            return create_engine(database_url, connect_args={"check_same_thread": False}, poolclass=StaticPool)
+        return create_engine(database_url, connect_args={"check_same_thread": False})
+
+    return create_engine(database_url)
+
+DATABASE_URL = get_database_url()
+
+engine = create_database_engine(DATABASE_URL)
+instrument_engine(engine)
+instrument_pool(engine, "primary")
+# Objects stay usable after commit, so write paths do not reload what they have just written.
+LocalSession = sessionmaker(engine, expire_on_commit=False)
+
+DATABASE_READ_ONLY_URL = get_database_url(read_only=True)
+
+# Without a separate replica (SQLite, or DATABASE_URL without DATABASE_READ_ONLY_URL) reads share the primary engine.
+read_only_engine = engine
+if DATABASE_READ_ONLY_URL != DATABASE_URL:
+    read_only_engine = create_database_engine(DATABASE_READ_ONLY_URL)
+    instrument_engine(read_only_engine)
+    instrument_pool(read_only_engine, "read_only")
+ReadOnlySession = sessionmaker(read_only_engine, expire_on_commit=False)
 
 Base = declarative_base()
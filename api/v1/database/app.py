@@ -1,19 +1,23 @@
 import os
-import urllib.parse
+import sys
 
 from flask import Flask
 from flask_migrate import Migrate
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.dialects.mssql import ROWVERSION
 
+# Migrations are run from this directory, so the repository root is put on the path to share the api package's database settings.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "..")))
+from api.v1.database import get_database_url
 
-DATABASE_PASSWORD = os.getenv("DATABASE_PASSWORD")
-DATABASE_CONNECTION_STRING = urllib.parse.quote_plus("Driver={ODBC Driver 17 for SQL Server};Server=tcp:mosa-cup-backend.database.windows.net,1433;Database=mosa_cup_backend;Uid=mosa_cup_backend;Pwd={%s};Encrypt=yes;TrustServerCertificate=no;Connection Timeout=30;" % DATABASE_PASSWORD)
 
 app = Flask(__name__)
-app.config["SQLALCHEMY_DATABASE_URI"] = f"mssql+pyodbc:///?odbc_connect={DATABASE_CONNECTION_STRING}"
+app.config["SQLALCHEMY_DATABASE_URI"] = get_database_url()
 database = SQLAlchemy(app)
 migrate = Migrate(app, database)
 
+ChangeSequenceType = database.BigInteger().with_variant(ROWVERSION(convert_int=True), "mssql")
+
 
 class LINEUser(database.Model):
     __tablename__ = "LINEUsers"
@@ -46,10 +50,12 @@ class User(database.Model):
     user_uuid = database.Column(database.String(48), primary_key=True)
     user_id = database.Column(database.String(48), unique=True, nullable=False)
     username = database.Column(database.String(48), unique=True, nullable=False)
+    user_key = database.Column(database.Integer, database.Identity(), unique=True, nullable=False)
     hashed_password = database.Column(database.Unicode, nullable=False)
     display_name = database.Column(database.Unicode, nullable=True)
     line_user_uuid = database.Column(database.String(48), database.ForeignKey("LINEUsers.line_user_uuid"), nullable=True)
     line_user = database.relationship("LINEUser")
+    membership_change_sequence = database.Column(ChangeSequenceType, server_default="0", server_onupdate=database.FetchedValue(), nullable=False)
     created_at = database.Column(database.DateTime, nullable=False)
     updated_at = database.Column(database.DateTime, nullable=True)
     deleted = database.Column(database.Boolean, default=False, nullable=False)
@@ -57,8 +63,8 @@ class User(database.Model):
     boards = database.relationship("Board", back_populates="administrator")
     my_boards = database.relationship("Board", secondary="BoardMembers", back_populates="members")
     my_subboards = database.relationship("Subboard", secondary="SubboardMembers", back_populates="members")
-    sent_direct_messages = database.relationship("DirectMessage", back_populates="send_from", foreign_keys="DirectMessage.send_from_name")
-    received_direct_messages = database.relationship("DirectMessage", back_populates="send_to", foreign_keys="DirectMessage.send_to_name")
+    sent_direct_messages = database.relationship("DirectMessage", back_populates="send_from", foreign_keys="DirectMessage.send_from_key")
+    received_direct_messages = database.relationship("DirectMessage", back_populates="send_to", foreign_keys="DirectMessage.send_to_key")
     sent_form_responses = database.relationship("FormResponse", back_populates="respondent")
 
 
@@ -68,9 +74,10 @@ class Board(database.Model):
     board_uuid = database.Column(database.String(48), primary_key=True)
     board_id = database.Column(database.String(48), unique=True, nullable=False)
     board_name = database.Column(database.Unicode, nullable=False)
-    administrator_name = database.Column(database.String(48), database.ForeignKey("Users.username"), nullable=False)
-    administrator = database.relationship("User", back_populates="boards", foreign_keys=[administrator_name])
+    administrator_key = database.Column(database.Integer, database.ForeignKey("Users.user_key"), nullable=False, index=True)
+    administrator = database.relationship("User", back_populates="boards", foreign_keys=[administrator_key])
     members = database.relationship("User", secondary="BoardMembers", back_populates="my_boards")
+    version = database.Column(database.Integer, default=0, server_default="0", nullable=False)
     created_at = database.Column(database.DateTime, nullable=False)
     updated_at = database.Column(database.DateTime, nullable=True)
     deleted = database.Column(database.Boolean, default=False, nullable=False)
@@ -82,19 +89,34 @@ class Board(database.Model):
 
 class BoardMember(database.Model):
     __tablename__ = "BoardMembers"
+    __table_args__ = (database.Index("ix_BoardMembers_board_uuid_user_key", "board_uuid", "user_key"),)
+
+    user_key = database.Column(database.Integer, database.ForeignKey("Users.user_key"), primary_key=True)
+    board_uuid = database.Column(database.String(48), database.ForeignKey("Boards.board_uuid"), primary_key=True)
 
-    username = database.Column(database.String(48), database.ForeignKey("Users.username"), primary_key=True)
+
+class BoardReadCursor(database.Model):
+    __tablename__ = "BoardReadCursors"
+
+    user_key = database.Column(database.Integer, database.ForeignKey("Users.user_key"), primary_key=True)
     board_uuid = database.Column(database.String(48), database.ForeignKey("Boards.board_uuid"), primary_key=True)
+    last_read_message_uuid = database.Column(database.String(48), database.ForeignKey("Messages.message_uuid"), nullable=True)
+    last_read_at = database.Column(database.DateTime, nullable=True)
+    unread_count = database.Column(database.Integer, default=0, server_default="0", nullable=False)
+    created_at = database.Column(database.DateTime, nullable=False)
+    updated_at = database.Column(database.DateTime, nullable=True)
 
 
 class Subboard(database.Model):
     __tablename__ = "Subboards"
+    __table_args__ = (database.Index("ix_Subboards_board_uuid_change_sequence", "board_uuid", "change_sequence"),)
 
     subboard_uuid = database.Column(database.String(48), primary_key=True)
     subboard_name = database.Column(database.Unicode, nullable=False)
     board_uuid = database.Column(database.String(48), database.ForeignKey("Boards.board_uuid"), nullable=False)
     board = database.relationship("Board", back_populates="subboards")
     members = database.relationship("User", secondary="SubboardMembers", back_populates="my_subboards")
+    change_sequence = database.Column(ChangeSequenceType, server_default="0", server_onupdate=database.FetchedValue(), nullable=False)
     created_at = database.Column(database.DateTime, nullable=False)
     updated_at = database.Column(database.DateTime, nullable=True)
     deleted = database.Column(database.Boolean, default=False, nullable=False)
@@ -105,13 +127,15 @@ class Subboard(database.Model):
 
 class SubboardMember(database.Model):
     __tablename__ = "SubboardMembers"
+    __table_args__ = (database.Index("ix_SubboardMembers_subboard_uuid_user_key", "subboard_uuid", "user_key"),)
 
-    username = database.Column(database.String(48), database.ForeignKey("Users.username"), primary_key=True)
+    user_key = database.Column(database.Integer, database.ForeignKey("Users.user_key"), primary_key=True)
     subboard_uuid = database.Column(database.String(48), database.ForeignKey("Subboards.subboard_uuid"), primary_key=True)
 
 
 class Message(database.Model):
     __tablename__ = "Messages"
+    __table_args__ = (database.Index("ix_Messages_board_uuid_change_sequence", "board_uuid", "change_sequence"),)
 
     message_uuid = database.Column(database.String(48), primary_key=True)
     board_uuid = database.Column(database.String(48), database.ForeignKey("Boards.board_uuid"), nullable=True)
@@ -120,10 +144,13 @@ class Message(database.Model):
     body = database.Column(database.Unicode, nullable=False)
     send_time = database.Column(database.DateTime, nullable=True)
     scheduled_send_time = database.Column(database.DateTime, nullable=True)
+    change_sequence = database.Column(ChangeSequenceType, server_default="0", server_onupdate=database.FetchedValue(), nullable=False)
     created_at = database.Column(database.DateTime, nullable=False)
     updated_at = database.Column(database.DateTime, nullable=True)
     deleted = database.Column(database.Boolean, default=False, nullable=False)
 
+    deliveries = database.relationship("MessageDelivery", back_populates="message")
+
 
 class SubboardMessage(database.Model):
     __tablename__ = "SubboardMessages"
@@ -132,24 +159,103 @@ class SubboardMessage(database.Model):
     message_uuid = database.Column(database.String(48), database.ForeignKey("Messages.message_uuid"), primary_key=True)
 
 
+class MessageDelivery(database.Model):
+    __tablename__ = "MessageDeliveries"
+
+    message_delivery_uuid = database.Column(database.String(48), primary_key=True)
+    message_uuid = database.Column(database.String(48), database.ForeignKey("Messages.message_uuid"), nullable=False, index=True)
+    message = database.relationship("Message", back_populates="deliveries")
+    chunk_index = database.Column(database.Integer, nullable=False)
+    line_user_ids = database.Column(database.Unicode, nullable=False)
+    recipient_count = database.Column(database.Integer, nullable=False)
+    status = database.Column(database.String(16), nullable=False, index=True)
+    attempts = database.Column(database.Integer, default=0, nullable=False)
+    last_error = database.Column(database.Unicode, nullable=True)
+    next_attempt_at = database.Column(database.DateTime, nullable=True)
+    sent_at = database.Column(database.DateTime, nullable=True)
+    created_at = database.Column(database.DateTime, nullable=False)
+    updated_at = database.Column(database.DateTime, nullable=True)
+    deleted = database.Column(database.Boolean, default=False, nullable=False)
+
+
 class DirectMessage(database.Model):
     __tablename__ = "DirectMessages"
+    __table_args__ = (
+        database.Index("ix_DirectMessages_send_from_key_change_sequence", "send_from_key", "change_sequence"),
+        database.Index("ix_DirectMessages_send_to_key_change_sequence", "send_to_key", "change_sequence"),
+        database.Index("ix_DirectMessages_conversation_uuid_created_at", "conversation_uuid", "created_at")
+    )
 
     direct_message_uuid = database.Column(database.String(48), primary_key=True)
-    send_from_name = database.Column(database.String(48), database.ForeignKey("Users.username"), nullable=False)
-    send_from = database.relationship("User", back_populates="sent_direct_messages", foreign_keys=[send_from_name])
-    send_to_name = database.Column(database.String(48), database.ForeignKey("Users.username"), nullable=False)
-    send_to = database.relationship("User", back_populates="received_direct_messages", foreign_keys=[send_to_name])
+    send_from_key = database.Column(database.Integer, database.ForeignKey("Users.user_key"), nullable=False)
+    send_from = database.relationship("User", back_populates="sent_direct_messages", foreign_keys=[send_from_key])
+    send_to_key = database.Column(database.Integer, database.ForeignKey("Users.user_key"), nullable=False)
+    send_to = database.relationship("User", back_populates="received_direct_messages", foreign_keys=[send_to_key])
+    conversation_uuid = database.Column(database.String(48), database.ForeignKey("Conversations.conversation_uuid"), nullable=False)
+    conversation = database.relationship("Conversation", back_populates="direct_messages")
     body = database.Column(database.Unicode, nullable=False)
     send_time = database.Column(database.DateTime, nullable=True)
     scheduled_send_time = database.Column(database.DateTime, nullable=True)
+    change_sequence = database.Column(ChangeSequenceType, server_default="0", server_onupdate=database.FetchedValue(), nullable=False)
     created_at = database.Column(database.DateTime, nullable=False)
     updated_at = database.Column(database.DateTime, nullable=True)
     deleted = database.Column(database.Boolean, default=False, nullable=False)
 
+    delivery = database.relationship("DirectMessageDelivery", back_populates="direct_message", uselist=False)
+
+
+class DirectMessageDelivery(database.Model):
+    __tablename__ = "DirectMessageDeliveries"
+
+    direct_message_uuid = database.Column(database.String(48), database.ForeignKey("DirectMessages.direct_message_uuid"), primary_key=True)
+    direct_message = database.relationship("DirectMessage", back_populates="delivery")
+    line_user_id = database.Column(database.String(48), nullable=False)
+    status = database.Column(database.String(16), nullable=False, index=True)
+    attempts = database.Column(database.Integer, default=0, nullable=False)
+    last_error = database.Column(database.Unicode, nullable=True)
+    next_attempt_at = database.Column(database.DateTime, nullable=True)
+    sent_at = database.Column(database.DateTime, nullable=True)
+    created_at = database.Column(database.DateTime, nullable=False)
+    updated_at = database.Column(database.DateTime, nullable=True)
+    deleted = database.Column(database.Boolean, default=False, nullable=False)
+
+
+class Conversation(database.Model):
+    __tablename__ = "Conversations"
+    __table_args__ = (database.Index("ix_Conversations_user_key_low_user_key_high", "user_key_low", "user_key_high", unique=True),)
+
+    conversation_uuid = database.Column(database.String(48), primary_key=True)
+    user_key_low = database.Column(database.Integer, database.ForeignKey("Users.user_key"), nullable=False)
+    user_key_high = database.Column(database.Integer, database.ForeignKey("Users.user_key"), nullable=False)
+    created_at = database.Column(database.DateTime, nullable=False)
+
+    members = database.relationship("ConversationMember", back_populates="conversation")
+    direct_messages = database.relationship("DirectMessage", back_populates="conversation")
+
+
+class ConversationMember(database.Model):
+    __tablename__ = "ConversationMembers"
+    __table_args__ = (database.Index("ix_ConversationMembers_user_key_last_message_at", "user_key", "last_message_at"),)
+
+    conversation_uuid = database.Column(database.String(48), database.ForeignKey("Conversations.conversation_uuid"), primary_key=True)
+    conversation = database.relationship("Conversation", back_populates="members")
+    user_key = database.Column(database.Integer, database.ForeignKey("Users.user_key"), primary_key=True)
+    with_user_key = database.Column(database.Integer, database.ForeignKey("Users.user_key"), nullable=False)
+    with_user = database.relationship("User", foreign_keys=[with_user_key])
+    last_direct_message_uuid = database.Column(database.String(48), database.ForeignKey("DirectMessages.direct_message_uuid"), nullable=True)
+    last_direct_message = database.relationship("DirectMessage", foreign_keys=[last_direct_message_uuid])
+    last_message_at = database.Column(database.DateTime, nullable=False)
+    unread_count = database.Column(database.Integer, default=0, server_default="0", nullable=False)
+    last_read_direct_message_uuid = database.Column(database.String(48), database.ForeignKey("DirectMessages.direct_message_uuid"), nullable=True)
+    last_read_at = database.Column(database.DateTime, nullable=True)
+    # The other member's row, whose read cursor is the read receipt for this member's messages.
+    with_member = database.relationship("ConversationMember", primaryjoin="and_(remote(ConversationMember.conversation_uuid) == ConversationMember.conversation_uuid, remote(ConversationMember.user_key) == ConversationMember.with_user_key)", foreign_keys="[ConversationMember.conversation_uuid, ConversationMember.user_key]", viewonly=True, uselist=False)
+    created_at = database.Column(database.DateTime, nullable=False)
+
 
 class Form(database.Model):
     __tablename__ = "Forms"
+    __table_args__ = (database.Index("ix_Forms_board_uuid_change_sequence", "board_uuid", "change_sequence"),)
 
     form_uuid = database.Column(database.String(48), primary_key=True)
     board_uuid = database.Column(database.String(48), database.ForeignKey("Boards.board_uuid"), nullable=True)
@@ -158,6 +264,7 @@ class Form(database.Model):
     title = database.Column(database.Unicode, nullable=False)
     send_time = database.Column(database.DateTime, nullable=True)
     scheduled_send_time = database.Column(database.DateTime, nullable=True)
+    change_sequence = database.Column(ChangeSequenceType, server_default="0", server_onupdate=database.FetchedValue(), nullable=False)
     created_at = database.Column(database.DateTime, nullable=False)
     updated_at = database.Column(database.DateTime, nullable=True)
     deleted = database.Column(database.Boolean, default=False, nullable=False)
@@ -191,9 +298,10 @@ class SubboardForm(database.Model):
 
 class FormResponse(database.Model):
     __tablename__ = "FormResponses"
+    __table_args__ = (database.Index("ix_FormResponses_form_uuid_form_response_uuid", "form_uuid", "form_response_uuid"),)
 
     form_response_uuid = database.Column(database.String(48), primary_key=True)
-    respondent_name = database.Column(database.String(48), database.ForeignKey("Users.username"), nullable=False)
+    respondent_key = database.Column(database.Integer, database.ForeignKey("Users.user_key"), nullable=False)
     respondent = database.relationship("User", back_populates="sent_form_responses")
     form_uuid = database.Column(database.String(48), database.ForeignKey("Forms.form_uuid"), nullable=False)
     form = database.relationship("Form", back_populates="form_responses")
@@ -206,6 +314,7 @@ class FormResponse(database.Model):
 
 class FormYesNoQuestionResponse(database.Model):
     __tablename__ = "FormYesNoQuestionResponses"
+    __table_args__ = (database.Index("ix_FormYesNoQuestionResponses_form_response_uuid", "form_response_uuid"),)
 
     form_question_response_uuid = database.Column(database.String(48), primary_key=True)
     form_response_uuid = database.Column(database.String(48), database.ForeignKey("FormResponses.form_response_uuid"), nullable=False)
@@ -217,3 +326,49 @@ class FormYesNoQuestionResponse(database.Model):
     created_at = database.Column(database.DateTime, nullable=False)
     updated_at = database.Column(database.DateTime, nullable=True)
     deleted = database.Column(database.Boolean, default=False, nullable=False)
+
+
+class ChangeSequence(database.Model):
+    __tablename__ = "ChangeSequences"
+
+    name = database.Column(database.String(48), primary_key=True)
+    value = database.Column(database.Integer, default=0, nullable=False)
+
+
+class FeedItem(database.Model):
+    __tablename__ = "FeedItems"
+    __table_args__ = (database.Index("ix_FeedItems_user_key_board_uuid_item_type_created_at", "user_key", "board_uuid", "item_type", "created_at"),)
+
+    user_key = database.Column(database.Integer, database.ForeignKey("Users.user_key"), primary_key=True)
+    item_uuid = database.Column(database.String(48), primary_key=True)
+    item_type = database.Column(database.String(16), nullable=False)
+    board_uuid = database.Column(database.String(48), database.ForeignKey("Boards.board_uuid"), nullable=False)
+    created_at = database.Column(database.DateTime, nullable=False)
+
+
+class FeedFanOut(database.Model):
+    __tablename__ = "FeedFanOuts"
+
+    item_uuid = database.Column(database.String(48), primary_key=True)
+    item_type = database.Column(database.String(16), nullable=False)
+    board_uuid = database.Column(database.String(48), database.ForeignKey("Boards.board_uuid"), nullable=False, index=True)
+    created_at = database.Column(database.DateTime, nullable=False)
+
+
+class FeedRepair(database.Model):
+    __tablename__ = "FeedRepairs"
+
+    user_key = database.Column(database.Integer, database.ForeignKey("Users.user_key"), primary_key=True)
+    board_uuid = database.Column(database.String(48), database.ForeignKey("Boards.board_uuid"), primary_key=True)
+    created_at = database.Column(database.DateTime, nullable=False, index=True)
+
+
+class IdempotencyKey(database.Model):
+    __tablename__ = "IdempotencyKeys"
+
+    user_key = database.Column(database.Integer, database.ForeignKey("Users.user_key"), primary_key=True)
+    idempotency_key = database.Column(database.String(255), primary_key=True)
+    request_path = database.Column(database.Unicode, nullable=False)
+    status_code = database.Column(database.Integer, nullable=True)
+    response_body = database.Column(database.Unicode, nullable=True)
+    created_at = database.Column(database.DateTime, nullable=False, index=True)
@@ -0,0 +1,111 @@
+"""Switch user foreign keys from usernames to compact user keys
+
+Revision ID: 3f9c2a7d41b8
+Revises: c007ed2b2cc1
+Create Date: 2026-10-19 10:00:00.000000
+
+Written by hand, because autogenerate would drop the username columns
+together with their data.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f9c2a7d41b8'
+down_revision = 'c007ed2b2cc1'
+branch_labels = None
+depends_on = None
+
+
+# table -> [(username column, user key column)]
+USER_COLUMNS = {
+    "Boards": [("administrator_name", "administrator_key")],
+    "BoardMembers": [("username", "user_key")],
+    "SubboardMembers": [("username", "user_key")],
+    "DirectMessages": [("send_from_name", "send_from_key"), ("send_to_name", "send_to_key")],
+    "FormResponses": [("respondent_name", "respondent_key")],
+    "FeedItems": [("username", "user_key")],
+    "FeedRepairs": [("username", "user_key")],
+    "IdempotencyKeys": [("username", "user_key")]
+}
+
+# (table, username index or None, user key index, username columns, user key columns)
+INDEXES = [
+    ("Boards", None, "ix_Boards_administrator_key", None, ["administrator_key"]),
+    ("BoardMembers", None, "ix_BoardMembers_board_uuid_user_key", None, ["board_uuid", "user_key"]),
+    ("SubboardMembers", None, "ix_SubboardMembers_subboard_uuid_user_key", None, ["subboard_uuid", "user_key"]),
+    ("DirectMessages", "ix_DirectMessages_send_from_name_change_sequence", "ix_DirectMessages_send_from_key_change_sequence", ["send_from_name", "change_sequence"], ["send_from_key", "change_sequence"]),
+    ("DirectMessages", "ix_DirectMessages_send_to_name_change_sequence", "ix_DirectMessages_send_to_key_change_sequence", ["send_to_name", "change_sequence"], ["send_to_key", "change_sequence"]),
+    ("FeedItems", "ix_FeedItems_username_board_uuid_item_type_created_at", "ix_FeedItems_user_key_board_uuid_item_type_created_at", ["username", "board_uuid", "item_type", "created_at"], ["user_key", "board_uuid", "item_type", "created_at"])
+]
+
+
+def _switch_columns(table, columns, new_type, referenced_column):
+    # columns: [(old column, new column)]. The new columns are filled from Users, then take over the keys, indexes and foreign keys of the old ones.
+    bind = op.get_bind()
+    users = sa.table("Users", sa.column("username"), sa.column("user_key"))
+    old_columns = [old_column for old_column, _ in columns]
+    source_column = "username" if referenced_column == "user_key" else "user_key"
+    for old_column, new_column in columns:
+        op.add_column(table, sa.Column(new_column, new_type, nullable=True))
+        target = sa.table(table, sa.column(old_column), sa.column(new_column))
+        op.execute(target.update().values({new_column: sa.select(users.c[referenced_column]).where(users.c[source_column] == target.c[old_column]).scalar_subquery()}))
+
+    inspector = sa.inspect(bind)
+    primary_key = inspector.get_pk_constraint(table)
+    foreign_keys = [foreign_key for foreign_key in inspector.get_foreign_keys(table) if set(foreign_key["constrained_columns"]) & set(old_columns)]
+    indexes = [index for index in inspector.get_indexes(table) if set(index["column_names"]) & set(old_columns)]
+    for index in indexes:
+        op.drop_index(index["name"], table_name=table)
+    with op.batch_alter_table(table, recreate="auto") as batch:
+        for foreign_key in foreign_keys:
+            if foreign_key["name"]:
+                batch.drop_constraint(foreign_key["name"], type_="foreignkey")
+        if set(primary_key["constrained_columns"]) & set(old_columns) and primary_key["name"]:
+            batch.drop_constraint(primary_key["name"], type_="primary")
+        for old_column, new_column in columns:
+            batch.drop_column(old_column)
+            batch.alter_column(new_column, existing_type=new_type, nullable=False)
+            batch.create_foreign_key(f"fk_{table}_{new_column}_Users", "Users", [new_column], [referenced_column])
+        if set(primary_key["constrained_columns"]) & set(old_columns):
+            renamed = dict(columns)
+            batch.create_primary_key(f"pk_{table}", [renamed.get(column, column) for column in primary_key["constrained_columns"]])
+
+
+def upgrade():
+    bind = op.get_bind()
+    if bind.dialect.name == "mssql":
+        # The IDENTITY numbers existing users as it is added, and new users as they are inserted.
+        op.add_column("Users", sa.Column("user_key", sa.Integer(), sa.Identity(), nullable=False))
+        op.create_unique_constraint("uq_Users_user_key", "Users", ["user_key"])
+    else:
+        # SQLite has no IDENTITY outside the primary key, so users are numbered here in the order they signed up.
+        op.add_column("Users", sa.Column("user_key", sa.Integer(), nullable=True))
+        users = sa.table("Users", sa.column("user_uuid"), sa.column("user_key"), sa.column("created_at"))
+        user_uuids = [user_uuid for user_uuid, in bind.execute(sa.select(users.c.user_uuid).order_by(users.c.created_at, users.c.user_uuid))]
+        if user_uuids:
+            bind.execute(users.update().where(users.c.user_uuid == sa.bindparam("b_user_uuid")).values(user_key=sa.bindparam("b_user_key")), [{"b_user_uuid": user_uuid, "b_user_key": user_key} for user_key, user_uuid in enumerate(user_uuids, 1)])
+        with op.batch_alter_table("Users", recreate="auto") as batch:
+            batch.alter_column("user_key", existing_type=sa.Integer(), nullable=False)
+            batch.create_unique_constraint("uq_Users_user_key", ["user_key"])
+
+    for table, columns in USER_COLUMNS.items():
+        _switch_columns(table, columns, sa.Integer(), "user_key")
+    for table, _, key_index, _, key_columns in INDEXES:
+        op.create_index(key_index, table, key_columns)
+
+
+def downgrade():
+    for table, _, key_index, _, _ in INDEXES:
+        op.drop_index(key_index, table_name=table)
+    for table, columns in USER_COLUMNS.items():
+        _switch_columns(table, [(key_column, name_column) for name_column, key_column in columns], sa.String(48), "username")
+    for table, name_index, _, name_columns, _ in INDEXES:
+        if name_index:
+            op.create_index(name_index, table, name_columns)
+
+    with op.batch_alter_table("Users", recreate="auto") as batch:
+        batch.drop_constraint("uq_Users_user_key", type_="unique")
+        batch.drop_column("user_key")
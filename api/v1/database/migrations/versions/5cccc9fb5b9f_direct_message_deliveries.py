@@ -0,0 +1,38 @@
+"""Track direct message pushes so failed ones are retried
+
+Revision ID: 5cccc9fb5b9f
+Revises: e2d6f8a90c13
+Create Date: 2026-10-19 21:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5cccc9fb5b9f'
+down_revision = 'e2d6f8a90c13'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "DirectMessageDeliveries",
+        sa.Column("direct_message_uuid", sa.String(48), sa.ForeignKey("DirectMessages.direct_message_uuid"), primary_key=True),
+        sa.Column("line_user_id", sa.String(48), nullable=False),
+        sa.Column("status", sa.String(16), nullable=False),
+        sa.Column("attempts", sa.Integer(), nullable=False),
+        sa.Column("last_error", sa.Unicode(), nullable=True),
+        sa.Column("next_attempt_at", sa.DateTime(), nullable=True),
+        sa.Column("sent_at", sa.DateTime(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), nullable=True),
+        sa.Column("deleted", sa.Boolean(), nullable=False)
+    )
+    op.create_index("ix_DirectMessageDeliveries_status", "DirectMessageDeliveries", ["status"])
+
+
+def downgrade():
+    op.drop_index("ix_DirectMessageDeliveries_status", table_name="DirectMessageDeliveries")
+    op.drop_table("DirectMessageDeliveries")
@@ -0,0 +1,25 @@
+"""Version boards for listing ETags
+
+Revision ID: 699abbf28dda
+Revises: e1d10616a847
+Create Date: 2026-10-19 07:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '699abbf28dda'
+down_revision = 'e1d10616a847'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("Boards", sa.Column("version", sa.Integer(), server_default="0", nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table("Boards", recreate="auto") as batch:
+        batch.drop_column("version", mssql_drop_default=True)
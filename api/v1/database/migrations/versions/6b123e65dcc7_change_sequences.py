@@ -0,0 +1,61 @@
+"""Stamp synced rows with change sequences
+
+Revision ID: 6b123e65dcc7
+Revises: 699abbf28dda
+Create Date: 2026-10-19 07:30:00.000000
+
+On SQL Server the change_sequence columns are rowversions, which the
+server fills in for existing rows too. Elsewhere they start at zero and
+are stamped from the ChangeSequences counter.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import mssql
+
+
+# revision identifiers, used by Alembic.
+revision = '6b123e65dcc7'
+down_revision = '699abbf28dda'
+branch_labels = None
+depends_on = None
+
+
+# (table, change sequence column, index or None, indexed columns)
+CHANGE_SEQUENCES = [
+    ("Users", "membership_change_sequence", None, None),
+    ("Subboards", "change_sequence", "ix_Subboards_board_uuid_change_sequence", ["board_uuid", "change_sequence"]),
+    ("Messages", "change_sequence", "ix_Messages_board_uuid_change_sequence", ["board_uuid", "change_sequence"]),
+    ("DirectMessages", "change_sequence", "ix_DirectMessages_send_from_name_change_sequence", ["send_from_name", "change_sequence"]),
+    ("DirectMessages", None, "ix_DirectMessages_send_to_name_change_sequence", ["send_to_name", "change_sequence"]),
+    ("Forms", "change_sequence", "ix_Forms_board_uuid_change_sequence", ["board_uuid", "change_sequence"])
+]
+
+
+def _change_sequence_column(name):
+    if op.get_context().dialect.name == "mssql":
+        return sa.Column(name, mssql.ROWVERSION(), nullable=False)
+    return sa.Column(name, sa.BigInteger(), server_default="0", nullable=False)
+
+
+def upgrade():
+    op.create_table(
+        "ChangeSequences",
+        sa.Column("name", sa.String(48), primary_key=True),
+        sa.Column("value", sa.Integer(), nullable=False)
+    )
+    for table, column, index, index_columns in CHANGE_SEQUENCES:
+        if column:
+            op.add_column(table, _change_sequence_column(column))
+        if index:
+            op.create_index(index, table, index_columns)
+
+
+def downgrade():
+    for table, column, index, _ in reversed(CHANGE_SEQUENCES):
+        if index:
+            op.drop_index(index, table_name=table)
+        if column:
+            with op.batch_alter_table(table, recreate="auto") as batch:
+                batch.drop_column(column, mssql_drop_default=True)
+    op.drop_table("ChangeSequences")
@@ -0,0 +1,82 @@
+"""Group direct messages into conversations
+
+Revision ID: 8b51e0c6d2f4
+Revises: 3f9c2a7d41b8
+Create Date: 2026-10-19 14:00:00.000000
+
+Every pair of users that has exchanged direct messages gets one
+Conversations row and a ConversationMembers row per user. Existing
+messages start out read, so unread counts are backfilled as zero.
+
+"""
+from uuid import uuid4
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b51e0c6d2f4'
+down_revision = '3f9c2a7d41b8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "Conversations",
+        sa.Column("conversation_uuid", sa.String(48), primary_key=True),
+        sa.Column("user_key_low", sa.Integer(), sa.ForeignKey("Users.user_key"), nullable=False),
+        sa.Column("user_key_high", sa.Integer(), sa.ForeignKey("Users.user_key"), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False)
+    )
+    op.create_index("ix_Conversations_user_key_low_user_key_high", "Conversations", ["user_key_low", "user_key_high"], unique=True)
+    op.create_table(
+        "ConversationMembers",
+        sa.Column("conversation_uuid", sa.String(48), sa.ForeignKey("Conversations.conversation_uuid"), primary_key=True),
+        sa.Column("user_key", sa.Integer(), sa.ForeignKey("Users.user_key"), primary_key=True),
+        sa.Column("with_user_key", sa.Integer(), sa.ForeignKey("Users.user_key"), nullable=False),
+        sa.Column("last_direct_message_uuid", sa.String(48), sa.ForeignKey("DirectMessages.direct_message_uuid"), nullable=True),
+        sa.Column("last_message_at", sa.DateTime(), nullable=False),
+        sa.Column("unread_count", sa.Integer(), server_default="0", nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False)
+    )
+    op.create_index("ix_ConversationMembers_user_key_last_message_at", "ConversationMembers", ["user_key", "last_message_at"])
+    op.add_column("DirectMessages", sa.Column("conversation_uuid", sa.String(48), nullable=True))
+
+    bind = op.get_bind()
+    direct_messages = sa.table("DirectMessages", sa.column("direct_message_uuid"), sa.column("send_from_key"), sa.column("send_to_key"), sa.column("conversation_uuid"), sa.column("created_at"), sa.column("deleted"))
+    conversations = sa.table("Conversations", sa.column("conversation_uuid"), sa.column("user_key_low"), sa.column("user_key_high"), sa.column("created_at"))
+    conversation_members = sa.table("ConversationMembers", sa.column("conversation_uuid"), sa.column("user_key"), sa.column("with_user_key"), sa.column("last_direct_message_uuid"), sa.column("last_message_at"), sa.column("unread_count"), sa.column("created_at"))
+    user_key_low = sa.case((direct_messages.c.send_from_key < direct_messages.c.send_to_key, direct_messages.c.send_from_key), else_=direct_messages.c.send_to_key)
+    user_key_high = sa.case((direct_messages.c.send_from_key < direct_messages.c.send_to_key, direct_messages.c.send_to_key), else_=direct_messages.c.send_from_key)
+    pairs = bind.execute(sa.select(user_key_low.label("user_key_low"), user_key_high.label("user_key_high"), sa.func.min(direct_messages.c.created_at).label("created_at")).group_by(user_key_low, user_key_high)).all()
+    if pairs:
+        op.bulk_insert(conversations, [{"conversation_uuid": str(uuid4()), "user_key_low": pair.user_key_low, "user_key_high": pair.user_key_high, "created_at": pair.created_at} for pair in pairs])
+    op.execute(direct_messages.update().values(conversation_uuid=sa.select(conversations.c.conversation_uuid).where(sa.and_(conversations.c.user_key_low == user_key_low, conversations.c.user_key_high == user_key_high)).scalar_subquery()))
+
+    for user_key, with_user_key in ((conversations.c.user_key_low, conversations.c.user_key_high), (conversations.c.user_key_high, conversations.c.user_key_low)):
+        in_conversation = direct_messages.c.conversation_uuid == conversations.c.conversation_uuid
+        last_direct_message_uuid = sa.select(direct_messages.c.direct_message_uuid).where(sa.and_(in_conversation, direct_messages.c.deleted == False)).order_by(direct_messages.c.created_at.desc()).limit(1).scalar_subquery()
+        last_message_at = sa.select(sa.func.max(direct_messages.c.created_at)).where(in_conversation).scalar_subquery()
+        members = sa.select(conversations.c.conversation_uuid, user_key, with_user_key, last_direct_message_uuid, last_message_at, sa.literal(0), conversations.c.created_at)
+        if user_key is conversations.c.user_key_high:
+            # A conversation with oneself has a single member.
+            members = members.where(conversations.c.user_key_low != conversations.c.user_key_high)
+        op.execute(conversation_members.insert().from_select(["conversation_uuid", "user_key", "with_user_key", "last_direct_message_uuid", "last_message_at", "unread_count", "created_at"], members))
+
+    with op.batch_alter_table("DirectMessages", recreate="auto") as batch:
+        batch.alter_column("conversation_uuid", existing_type=sa.String(48), nullable=False)
+        batch.create_foreign_key("fk_DirectMessages_conversation_uuid_Conversations", "Conversations", ["conversation_uuid"], ["conversation_uuid"])
+    op.create_index("ix_DirectMessages_conversation_uuid_created_at", "DirectMessages", ["conversation_uuid", "created_at"])
+
+
+def downgrade():
+    op.drop_index("ix_DirectMessages_conversation_uuid_created_at", table_name="DirectMessages")
+    with op.batch_alter_table("DirectMessages", recreate="auto") as batch:
+        batch.drop_constraint("fk_DirectMessages_conversation_uuid_Conversations", type_="foreignkey")
+        batch.drop_column("conversation_uuid")
+    op.drop_index("ix_ConversationMembers_user_key_last_message_at", table_name="ConversationMembers")
+    op.drop_table("ConversationMembers")
+    op.drop_index("ix_Conversations_user_key_low_user_key_high", table_name="Conversations")
+    op.drop_table("Conversations")
@@ -0,0 +1,34 @@
+"""Store responses for Idempotency-Key replays
+
+Revision ID: c007ed2b2cc1
+Revises: d30d5b88496b
+Create Date: 2026-10-19 08:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c007ed2b2cc1'
+down_revision = 'd30d5b88496b'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "IdempotencyKeys",
+        sa.Column("username", sa.String(48), sa.ForeignKey("Users.username"), primary_key=True),
+        sa.Column("idempotency_key", sa.String(255), primary_key=True),
+        sa.Column("request_path", sa.Unicode(), nullable=False),
+        sa.Column("status_code", sa.Integer(), nullable=True),
+        sa.Column("response_body", sa.Unicode(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=False)
+    )
+    op.create_index("ix_IdempotencyKeys_created_at", "IdempotencyKeys", ["created_at"])
+
+
+def downgrade():
+    op.drop_index("ix_IdempotencyKeys_created_at", table_name="IdempotencyKeys")
+    op.drop_table("IdempotencyKeys")
@@ -0,0 +1,53 @@
+"""Add read cursors for boards and conversations
+
+Revision ID: c47a93e1b5d0
+Revises: 8b51e0c6d2f4
+Create Date: 2026-10-19 17:00:00.000000
+
+Existing board members and conversation members start with everything
+read, matching the zero unread counts they are backfilled with.
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c47a93e1b5d0'
+down_revision = '8b51e0c6d2f4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "BoardReadCursors",
+        sa.Column("user_key", sa.Integer(), sa.ForeignKey("Users.user_key"), primary_key=True),
+        sa.Column("board_uuid", sa.String(48), sa.ForeignKey("Boards.board_uuid"), primary_key=True),
+        sa.Column("last_read_message_uuid", sa.String(48), sa.ForeignKey("Messages.message_uuid"), nullable=True),
+        sa.Column("last_read_at", sa.DateTime(), nullable=True),
+        sa.Column("unread_count", sa.Integer(), server_default="0", nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), nullable=True)
+    )
+    now = datetime.now()
+    board_members = sa.table("BoardMembers", sa.column("user_key"), sa.column("board_uuid"))
+    board_read_cursors = sa.table("BoardReadCursors", sa.column("user_key"), sa.column("board_uuid"), sa.column("last_read_at"), sa.column("unread_count"), sa.column("created_at"))
+    op.execute(board_read_cursors.insert().from_select(["user_key", "board_uuid", "last_read_at", "unread_count", "created_at"], sa.select(board_members.c.user_key, board_members.c.board_uuid, sa.literal(now, sa.DateTime()), sa.literal(0), sa.literal(now, sa.DateTime()))))
+
+    with op.batch_alter_table("ConversationMembers", recreate="auto") as batch:
+        batch.add_column(sa.Column("last_read_direct_message_uuid", sa.String(48), nullable=True))
+        batch.add_column(sa.Column("last_read_at", sa.DateTime(), nullable=True))
+        batch.create_foreign_key("fk_ConversationMembers_last_read_direct_message_uuid_DirectMessages", "DirectMessages", ["last_read_direct_message_uuid"], ["direct_message_uuid"])
+    conversation_members = sa.table("ConversationMembers", sa.column("last_direct_message_uuid"), sa.column("last_message_at"), sa.column("last_read_direct_message_uuid"), sa.column("last_read_at"), sa.column("unread_count"))
+    op.execute(conversation_members.update().values(last_read_direct_message_uuid=conversation_members.c.last_direct_message_uuid, last_read_at=conversation_members.c.last_message_at).where(conversation_members.c.unread_count == 0))
+
+
+def downgrade():
+    with op.batch_alter_table("ConversationMembers", recreate="auto") as batch:
+        batch.drop_constraint("fk_ConversationMembers_last_read_direct_message_uuid_DirectMessages", type_="foreignkey")
+        batch.drop_column("last_read_at")
+        batch.drop_column("last_read_direct_message_uuid")
+    op.drop_table("BoardReadCursors")
@@ -0,0 +1,56 @@
+"""Add the fan-out-on-write participant feeds
+
+Revision ID: d30d5b88496b
+Revises: 6b123e65dcc7
+Create Date: 2026-10-19 08:00:00.000000
+
+The tables start out empty. Feeds are only read once FEED_ENABLED is
+turned on, and api.v1.feeds.enqueue_all_feed_repairs queues every
+existing membership for a rebuild at that point.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd30d5b88496b'
+down_revision = '6b123e65dcc7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "FeedItems",
+        sa.Column("username", sa.String(48), sa.ForeignKey("Users.username"), primary_key=True),
+        sa.Column("item_uuid", sa.String(48), primary_key=True),
+        sa.Column("item_type", sa.String(16), nullable=False),
+        sa.Column("board_uuid", sa.String(48), sa.ForeignKey("Boards.board_uuid"), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False)
+    )
+    op.create_index("ix_FeedItems_username_board_uuid_item_type_created_at", "FeedItems", ["username", "board_uuid", "item_type", "created_at"])
+    op.create_table(
+        "FeedFanOuts",
+        sa.Column("item_uuid", sa.String(48), primary_key=True),
+        sa.Column("item_type", sa.String(16), nullable=False),
+        sa.Column("board_uuid", sa.String(48), sa.ForeignKey("Boards.board_uuid"), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False)
+    )
+    op.create_index("ix_FeedFanOuts_board_uuid", "FeedFanOuts", ["board_uuid"])
+    op.create_table(
+        "FeedRepairs",
+        sa.Column("username", sa.String(48), sa.ForeignKey("Users.username"), primary_key=True),
+        sa.Column("board_uuid", sa.String(48), sa.ForeignKey("Boards.board_uuid"), primary_key=True),
+        sa.Column("created_at", sa.DateTime(), nullable=False)
+    )
+    op.create_index("ix_FeedRepairs_created_at", "FeedRepairs", ["created_at"])
+
+
+def downgrade():
+    op.drop_index("ix_FeedRepairs_created_at", table_name="FeedRepairs")
+    op.drop_table("FeedRepairs")
+    op.drop_index("ix_FeedFanOuts_board_uuid", table_name="FeedFanOuts")
+    op.drop_table("FeedFanOuts")
+    op.drop_index("ix_FeedItems_username_board_uuid_item_type_created_at", table_name="FeedItems")
+    op.drop_table("FeedItems")
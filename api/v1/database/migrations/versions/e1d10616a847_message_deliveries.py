@@ -0,0 +1,43 @@
+"""Track message deliveries per chunk
+
+Revision ID: e1d10616a847
+Revises: f1f6647edbce
+Create Date: 2026-10-19 06:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e1d10616a847'
+down_revision = 'f1f6647edbce'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "MessageDeliveries",
+        sa.Column("message_delivery_uuid", sa.String(48), primary_key=True),
+        sa.Column("message_uuid", sa.String(48), sa.ForeignKey("Messages.message_uuid"), nullable=False),
+        sa.Column("chunk_index", sa.Integer(), nullable=False),
+        sa.Column("line_user_ids", sa.Unicode(), nullable=False),
+        sa.Column("recipient_count", sa.Integer(), nullable=False),
+        sa.Column("status", sa.String(16), nullable=False),
+        sa.Column("attempts", sa.Integer(), nullable=False),
+        sa.Column("last_error", sa.Unicode(), nullable=True),
+        sa.Column("next_attempt_at", sa.DateTime(), nullable=True),
+        sa.Column("sent_at", sa.DateTime(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), nullable=True),
+        sa.Column("deleted", sa.Boolean(), nullable=False)
+    )
+    op.create_index("ix_MessageDeliveries_message_uuid", "MessageDeliveries", ["message_uuid"])
+    op.create_index("ix_MessageDeliveries_status", "MessageDeliveries", ["status"])
+
+
+def downgrade():
+    op.drop_index("ix_MessageDeliveries_status", table_name="MessageDeliveries")
+    op.drop_index("ix_MessageDeliveries_message_uuid", table_name="MessageDeliveries")
+    op.drop_table("MessageDeliveries")
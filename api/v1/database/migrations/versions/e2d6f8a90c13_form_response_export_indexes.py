@@ -0,0 +1,26 @@
+"""Index form responses for the streaming export
+
+Revision ID: e2d6f8a90c13
+Revises: c47a93e1b5d0
+Create Date: 2026-10-19 20:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2d6f8a90c13'
+down_revision = 'c47a93e1b5d0'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index("ix_FormResponses_form_uuid_form_response_uuid", "FormResponses", ["form_uuid", "form_response_uuid"])
+    op.create_index("ix_FormYesNoQuestionResponses_form_response_uuid", "FormYesNoQuestionResponses", ["form_response_uuid"])
+
+
+def downgrade():
+    op.drop_index("ix_FormYesNoQuestionResponses_form_response_uuid", table_name="FormYesNoQuestionResponses")
+    op.drop_index("ix_FormResponses_form_uuid_form_response_uuid", table_name="FormResponses")
@@ -0,0 +1,161 @@
+"""Create the schema the API started from
+
+Revision ID: f1f6647edbce
+Revises:
+Create Date: 2026-10-19 06:00:00.000000
+
+These are the tables that main.py used to create with create_all. A
+database that was set up that way already has them; mark it with
+``flask db stamp f1f6647edbce`` and then run ``flask db upgrade``.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f1f6647edbce'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "LINEUsers",
+        sa.Column("line_user_uuid", sa.String(48), primary_key=True),
+        sa.Column("user_id", sa.String(48), unique=True, nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), nullable=True),
+        sa.Column("deleted", sa.Boolean(), nullable=False)
+    )
+    op.create_table(
+        "LINEMessageContexts",
+        sa.Column("line_message_context_uuid", sa.String(48), primary_key=True),
+        sa.Column("message_context", sa.Unicode(), nullable=True),
+        sa.Column("line_user_uuid", sa.String(48), sa.ForeignKey("LINEUsers.line_user_uuid"), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), nullable=True),
+        sa.Column("deleted", sa.Boolean(), nullable=False)
+    )
+    op.create_table(
+        "Users",
+        sa.Column("user_uuid", sa.String(48), primary_key=True),
+        sa.Column("user_id", sa.String(48), unique=True, nullable=False),
+        sa.Column("username", sa.String(48), unique=True, nullable=False),
+        sa.Column("hashed_password", sa.Unicode(), nullable=False),
+        sa.Column("display_name", sa.Unicode(), nullable=True),
+        sa.Column("line_user_uuid", sa.String(48), sa.ForeignKey("LINEUsers.line_user_uuid"), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), nullable=True),
+        sa.Column("deleted", sa.Boolean(), nullable=False)
+    )
+    op.create_table(
+        "Boards",
+        sa.Column("board_uuid", sa.String(48), primary_key=True),
+        sa.Column("board_id", sa.String(48), unique=True, nullable=False),
+        sa.Column("board_name", sa.Unicode(), nullable=False),
+        sa.Column("administrator_name", sa.String(48), sa.ForeignKey("Users.username"), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), nullable=True),
+        sa.Column("deleted", sa.Boolean(), nullable=False)
+    )
+    op.create_table(
+        "BoardMembers",
+        sa.Column("username", sa.String(48), sa.ForeignKey("Users.username"), primary_key=True),
+        sa.Column("board_uuid", sa.String(48), sa.ForeignKey("Boards.board_uuid"), primary_key=True)
+    )
+    op.create_table(
+        "Subboards",
+        sa.Column("subboard_uuid", sa.String(48), primary_key=True),
+        sa.Column("subboard_name", sa.Unicode(), nullable=False),
+        sa.Column("board_uuid", sa.String(48), sa.ForeignKey("Boards.board_uuid"), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), nullable=True),
+        sa.Column("deleted", sa.Boolean(), nullable=False)
+    )
+    op.create_table(
+        "SubboardMembers",
+        sa.Column("username", sa.String(48), sa.ForeignKey("Users.username"), primary_key=True),
+        sa.Column("subboard_uuid", sa.String(48), sa.ForeignKey("Subboards.subboard_uuid"), primary_key=True)
+    )
+    op.create_table(
+        "Messages",
+        sa.Column("message_uuid", sa.String(48), primary_key=True),
+        sa.Column("board_uuid", sa.String(48), sa.ForeignKey("Boards.board_uuid"), nullable=True),
+        sa.Column("body", sa.Unicode(), nullable=False),
+        sa.Column("send_time", sa.DateTime(), nullable=True),
+        sa.Column("scheduled_send_time", sa.DateTime(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), nullable=True),
+        sa.Column("deleted", sa.Boolean(), nullable=False)
+    )
+    op.create_table(
+        "SubboardMessages",
+        sa.Column("subboard_uuid", sa.String(48), sa.ForeignKey("Subboards.subboard_uuid"), primary_key=True),
+        sa.Column("message_uuid", sa.String(48), sa.ForeignKey("Messages.message_uuid"), primary_key=True)
+    )
+    op.create_table(
+        "DirectMessages",
+        sa.Column("direct_message_uuid", sa.String(48), primary_key=True),
+        sa.Column("send_from_name", sa.String(48), sa.ForeignKey("Users.username"), nullable=False),
+        sa.Column("send_to_name", sa.String(48), sa.ForeignKey("Users.username"), nullable=False),
+        sa.Column("body", sa.Unicode(), nullable=False),
+        sa.Column("send_time", sa.DateTime(), nullable=True),
+        sa.Column("scheduled_send_time", sa.DateTime(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), nullable=True),
+        sa.Column("deleted", sa.Boolean(), nullable=False)
+    )
+    op.create_table(
+        "Forms",
+        sa.Column("form_uuid", sa.String(48), primary_key=True),
+        sa.Column("board_uuid", sa.String(48), sa.ForeignKey("Boards.board_uuid"), nullable=True),
+        sa.Column("title", sa.Unicode(), nullable=False),
+        sa.Column("send_time", sa.DateTime(), nullable=True),
+        sa.Column("scheduled_send_time", sa.DateTime(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), nullable=True),
+        sa.Column("deleted", sa.Boolean(), nullable=False)
+    )
+    op.create_table(
+        "FormYesNoQuestions",
+        sa.Column("form_question_uuid", sa.String(48), primary_key=True),
+        sa.Column("form_uuid", sa.String(48), sa.ForeignKey("Forms.form_uuid"), nullable=False),
+        sa.Column("title", sa.Unicode(), nullable=False),
+        sa.Column("yes", sa.Unicode(), nullable=False),
+        sa.Column("no", sa.Unicode(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), nullable=True),
+        sa.Column("deleted", sa.Boolean(), nullable=False)
+    )
+    op.create_table(
+        "SubboardForms",
+        sa.Column("subboard_uuid", sa.String(48), sa.ForeignKey("Subboards.subboard_uuid"), primary_key=True),
+        sa.Column("form_uuid", sa.String(48), sa.ForeignKey("Forms.form_uuid"), primary_key=True)
+    )
+    op.create_table(
+        "FormResponses",
+        sa.Column("form_response_uuid", sa.String(48), primary_key=True),
+        sa.Column("respondent_name", sa.String(48), sa.ForeignKey("Users.username"), nullable=False),
+        sa.Column("form_uuid", sa.String(48), sa.ForeignKey("Forms.form_uuid"), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), nullable=True),
+        sa.Column("deleted", sa.Boolean(), nullable=False)
+    )
+    op.create_table(
+        "FormYesNoQuestionResponses",
+        sa.Column("form_question_response_uuid", sa.String(48), primary_key=True),
+        sa.Column("form_response_uuid", sa.String(48), sa.ForeignKey("FormResponses.form_response_uuid"), nullable=False),
+        sa.Column("form_question_uuid", sa.String(48), sa.ForeignKey("FormYesNoQuestions.form_question_uuid"), nullable=False),
+        sa.Column("yes", sa.Boolean(), nullable=False),
+        sa.Column("no", sa.Boolean(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), nullable=True),
+        sa.Column("deleted", sa.Boolean(), nullable=False)
+    )
+
+
+def downgrade():
+    for table in ["FormYesNoQuestionResponses", "FormResponses", "SubboardForms", "FormYesNoQuestions", "Forms", "DirectMessages", "SubboardMessages", "Messages", "SubboardMembers", "Subboards", "BoardMembers", "Boards", "Users", "LINEMessageContexts", "LINEUsers"]:
+        op.drop_table(table)
@@ -0,0 +1,115 @@
+import asyncio
+import json
+import os
+from typing import Dict, List, Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+from linebot.models import FlexSendMessage
+from sqlalchemy.orm import Session
+
+from api.v1 import crud, models
+from api.v1.line_client import LINEClient
+from api.v1.tracing import traced
+
+
+DELIVERY_MAX_ATTEMPTS = int(os.getenv("DELIVERY_MAX_ATTEMPTS", "5"))
+DELIVERY_RETRY_BACKOFF = float(os.getenv("DELIVERY_RETRY_BACKOFF", "60"))
+# How long a claimed delivery may stay "sending" before it is presumed lost and retried.
+DELIVERY_LEASE = float(os.getenv("DELIVERY_LEASE", "300"))
+
+def build_message_flex_message(message: models.Message) -> FlexSendMessage:
+    with open("./api/v1/assets/flex_messages/message.json") as f:
+        flex_message = json.load(f)
+    flex_message["body"]["contents"][0]["text"] = message.board.board_name
+    flex_message["body"]["contents"][1]["contents"][0]["contents"][0]["text"] = ", ".join([subboard.subboard_name for subboard in message.subboards])
+    flex_message["body"]["contents"][1]["contents"][1]["contents"][0]["text"] = message.body
+
+    return FlexSendMessage(message.body, flex_message)
+
+async def _multicast_chunks(line_client: LINEClient, chunks: List[List[str]], flex_message: FlexSendMessage) -> List[Optional[str]]:
+    results = await asyncio.gather(*[line_client.multicast(chunk, flex_message) for chunk in chunks], return_exceptions=True)
+
+    return [str(result) if isinstance(result, Exception) else None for result in results]
+
+def _commit_message_deliveries(database: Session, message: models.Message, message_deliveries: List[models.MessageDelivery]) -> Tuple[FlexSendMessage, List[List[str]]]:
+    flex_message = build_message_flex_message(message)
+    chunks = [json.loads(message_delivery.line_user_ids) for message_delivery in message_deliveries]
+    # Claimed deliveries are committed first, so no transaction is held open across the LINE calls.
+    database.commit()
+
+    return flex_message, chunks
+
+@traced
+async def send_message_deliveries(database: Session, line_client: LINEClient, message: models.Message, message_deliveries: List[models.MessageDelivery]) -> List[models.MessageDelivery]:
+    if not message_deliveries:
+        return []
+    # Only the LINE calls run on the event loop; database work goes to the thread pool, so no worker thread waits on LINE.
+    flex_message, chunks = await run_in_threadpool(_commit_message_deliveries, database, message, message_deliveries)
+    errors = await _multicast_chunks(line_client, chunks, flex_message)
+
+    return await run_in_threadpool(crud.update_message_delivery_results, database, list(zip(message_deliveries, errors)), DELIVERY_MAX_ATTEMPTS, DELIVERY_RETRY_BACKOFF)
+
+@traced
+async def deliver_message(database: Session, line_client: LINEClient, message: models.Message, line_user_ids: List[str]) -> List[models.MessageDelivery]:
+    message_deliveries = await run_in_threadpool(crud.create_message_deliveries, database, message.message_uuid, line_user_ids, LINEClient.MULTICAST_MAX_RECIPIENTS, DELIVERY_LEASE)
+
+    return await send_message_deliveries(database, line_client, message, message_deliveries)
+
+@traced
+async def replay_message_deliveries(database: Session, line_client: LINEClient, message: models.Message) -> List[models.MessageDelivery]:
+    message_deliveries = await run_in_threadpool(crud.update_replayable_message_deliveries_sending, database, message.message_uuid, DELIVERY_LEASE)
+
+    return await send_message_deliveries(database, line_client, message, message_deliveries)
+
+def _claim_retryable_message_deliveries(database: Session, limit: int) -> Dict[str, Tuple[models.Message, List[models.MessageDelivery]]]:
+    message_deliveries_by_message: Dict[str, Tuple[models.Message, List[models.MessageDelivery]]] = {}
+    for message_delivery in crud.update_retryable_message_deliveries_sending(database, limit, DELIVERY_LEASE):
+        message_deliveries_by_message.setdefault(message_delivery.message_uuid, (message_delivery.message, []))[1].append(message_delivery)
+
+    return message_deliveries_by_message
+
+@traced
+async def retry_message_deliveries(database: Session, line_client: LINEClient, limit: int=100) -> List[models.MessageDelivery]:
+    # Only what this run claimed is sent, so a concurrent replay or a second timer never sends the same chunk.
+    message_deliveries_by_message = await run_in_threadpool(_claim_retryable_message_deliveries, database, limit)
+    retried_message_deliveries = []
+    for message, message_deliveries in message_deliveries_by_message.values():
+        retried_message_deliveries += await send_message_deliveries(database, line_client, message, message_deliveries)
+
+    return retried_message_deliveries
+
+def build_direct_message_flex_message(direct_message: models.DirectMessage) -> FlexSendMessage:
+    with open("./api/v1/assets/flex_messages/direct_message.json") as f:
+        flex_message = json.load(f)
+    flex_message["body"]["contents"][0]["text"] = direct_message.send_from.display_name if direct_message.send_from.display_name else direct_message.send_from.username
+    flex_message["body"]["contents"][1]["contents"][0]["contents"][0]["text"] = direct_message.body
+
+    return FlexSendMessage(direct_message.body, flex_message)
+
+def _commit_direct_message_deliveries(database: Session, direct_message_deliveries: List[models.DirectMessageDelivery]) -> List[Tuple[str, FlexSendMessage]]:
+    line_pushes = [(direct_message_delivery.line_user_id, build_direct_message_flex_message(direct_message_delivery.direct_message)) for direct_message_delivery in direct_message_deliveries]
+    database.commit()
+
+    return line_pushes
+
+@traced
+async def send_direct_message_deliveries(database: Session, line_client: LINEClient, direct_message_deliveries: List[models.DirectMessageDelivery]) -> List[models.DirectMessageDelivery]:
+    if not direct_message_deliveries:
+        return []
+    line_pushes = await run_in_threadpool(_commit_direct_message_deliveries, database, direct_message_deliveries)
+    results = await asyncio.gather(*[line_client.push_message(line_user_id, flex_message) for line_user_id, flex_message in line_pushes], return_exceptions=True)
+    errors = [str(result) if isinstance(result, Exception) else None for result in results]
+
+    return await run_in_threadpool(crud.update_direct_message_delivery_results, database, list(zip(direct_message_deliveries, errors)), DELIVERY_MAX_ATTEMPTS, DELIVERY_RETRY_BACKOFF)
+
+@traced
+async def deliver_direct_messages(database: Session, line_client: LINEClient, direct_messages: List[models.DirectMessage]) -> List[models.DirectMessageDelivery]:
+    direct_message_deliveries = await run_in_threadpool(crud.create_direct_message_deliveries, database, direct_messages, DELIVERY_LEASE)
+
+    return await send_direct_message_deliveries(database, line_client, direct_message_deliveries)
+
+@traced
+async def retry_direct_message_deliveries(database: Session, line_client: LINEClient, limit: int=100) -> List[models.DirectMessageDelivery]:
+    direct_message_deliveries = await run_in_threadpool(crud.update_retryable_direct_message_deliveries_sending, database, limit, DELIVERY_LEASE)
+
+    return await send_direct_message_deliveries(database, line_client, direct_message_deliveries)
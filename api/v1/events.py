@@ -0,0 +1,89 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Dict, List
+from urllib.parse import quote
+
+import httpx
+from jose import jwt
+from opentelemetry.trace import SpanKind
+
+from api.v1 import models
+from api.v1.tracing import tracer
+
+
+# Clients hold their WebSocket to Azure Web PubSub rather than to a function instance, so pushes reach them
+# whichever instance handled the write, and no response body has to stay open through AsgiMiddleware.
+WEB_PUBSUB_CONNECTION_STRING = os.getenv("WEB_PUBSUB_CONNECTION_STRING", "")
+WEB_PUBSUB_HUB = os.getenv("WEB_PUBSUB_HUB", "events")
+WEB_PUBSUB_API_VERSION = "2024-01-01"
+EVENTS_ENABLED = bool(WEB_PUBSUB_CONNECTION_STRING)
+# Groups are fixed when a client access URL is issued, so clients negotiate again after joining or leaving subboards.
+EVENTS_TOKEN_TTL = int(os.getenv("EVENTS_TOKEN_TTL", "3600"))
+EVENTS_PUBLISH_TIMEOUT = float(os.getenv("EVENTS_PUBLISH_TIMEOUT", "5"))
+
+logger = logging.getLogger("api.v1.events")
+
+_http_clients: Dict[asyncio.AbstractEventLoop, httpx.AsyncClient] = {}
+
+
+def _connection_setting(name: str) -> str:
+    settings = dict(part.split("=", 1) for part in WEB_PUBSUB_CONNECTION_STRING.split(";") if "=" in part)
+
+    return settings[name].rstrip("/") if name == "Endpoint" else settings[name]
+
+def _get_http_client() -> httpx.AsyncClient:
+    # httpx connection pools are bound to the event loop they were opened on.
+    loop = asyncio.get_running_loop()
+    if loop not in _http_clients:
+        for closed_loop in [closed_loop for closed_loop in _http_clients if closed_loop.is_closed()]:
+            del _http_clients[closed_loop]
+        _http_clients[loop] = httpx.AsyncClient(timeout=httpx.Timeout(EVENTS_PUBLISH_TIMEOUT))
+
+    return _http_clients[loop]
+
+def _subboard_group(subboard_uuid: str) -> str:
+    return f"subboard.{subboard_uuid}"
+
+def _access_token(audience: str, **claims) -> str:
+    issued_at = int(time.time())
+
+    return jwt.encode({"aud": audience, "iat": issued_at, "exp": issued_at + EVENTS_TOKEN_TTL, **claims}, _connection_setting("AccessKey"), "HS256")
+
+def create_client_access_url(user: models.User, subboard_uuids: List[str]) -> str:
+    endpoint = _connection_setting("Endpoint")
+    audience = f"{endpoint}/client/hubs/{WEB_PUBSUB_HUB}"
+    # The connection joins the caller's subboard groups as it opens, and is addressed by user UUID for direct messages.
+    access_token = _access_token(audience, sub=user.user_uuid, **{"webpubsub.group": [_subboard_group(subboard_uuid) for subboard_uuid in subboard_uuids]})
+
+    return f"{audience.replace('https://', 'wss://', 1).replace('http://', 'ws://', 1)}?access_token={access_token}"
+
+async def _send(operation: str, path: str, event: dict, **params: str) -> None:
+    url = f"{_connection_setting('Endpoint')}/api/hubs/{WEB_PUBSUB_HUB}{path}"
+    params["api-version"] = WEB_PUBSUB_API_VERSION
+    request = _get_http_client().build_request("POST", url, params=params, json=event)
+    request.headers["Authorization"] = f"Bearer {_access_token(str(request.url))}"
+    with tracer.start_as_current_span(f"web_pubsub.{operation}", kind=SpanKind.CLIENT, attributes={"http.request.method": "POST", "url.full": url}) as span:
+        try:
+            response = await _get_http_client().send(request)
+            span.set_attribute("http.response.status_code", response.status_code)
+            response.raise_for_status()
+        except httpx.HTTPError as e:
+            # Events only tell clients what to fetch; the write is committed, and /changes catches up whatever a client missed.
+            logger.warning("Web PubSub %s failed: %s", operation, e)
+
+async def publish_board_item(item_type: str, board_uuid: str, item_uuid: str, subboard_uuids: List[str]) -> None:
+    if not EVENTS_ENABLED or not subboard_uuids:
+        return
+    # One send with a group filter, so a member of several of the subboards gets the event once.
+    groups = " or ".join(f"'{_subboard_group(subboard_uuid)}' in groups" for subboard_uuid in subboard_uuids)
+    await _send(f"publish_{item_type}", "/:send", {"type": item_type, "board_uuid": board_uuid, f"{item_type}_uuid": item_uuid}, filter=groups)
+
+async def publish_direct_messages(direct_messages: List[models.DirectMessage]) -> None:
+    if not EVENTS_ENABLED:
+        return
+    await asyncio.gather(*[
+        _send("publish_direct_message", f"/users/{quote(direct_message.send_to.user_uuid, safe='')}/:send", {"type": "direct_message", "conversation_uuid": direct_message.conversation_uuid, "direct_message_uuid": direct_message.direct_message_uuid})
+        for direct_message in direct_messages
+    ])
@@ -0,0 +1,80 @@
+import csv
+import io
+from itertools import groupby
+import json
+import os
+from typing import Iterator, Optional
+
+from sqlalchemy import and_
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from api.v1 import models
+
+
+EXPORT_YIELD_PER = int(os.getenv("EXPORT_YIELD_PER", "1000"))
+# The Azure Functions host collects the whole response body before sending it, so one export holds at most this many responses.
+EXPORT_MAX_RESPONSES = int(os.getenv("EXPORT_MAX_RESPONSES", "10000"))
+EXPORT_NEXT_AFTER_HEADER = "X-Export-Next-After"
+EXPORT_FORMATS = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson"
+}
+
+
+def _csv_cell(value: str) -> str:
+    # Spreadsheets evaluate cells that start with these characters, and display names come from users.
+    return "'" + value if value and value[0] in "=+-@\t\r" else value
+
+def _csv_line(values: list) -> str:
+    line = io.StringIO()
+    csv.writer(line).writerow([_csv_cell(value) for value in values])
+
+    return line.getvalue()
+
+def _csv_answer(form_question, answer) -> str:
+    # Answers are written with the question's own labels for yes and no.
+    if answer and answer.yes:
+        return form_question.yes
+    if answer and answer.no:
+        return form_question.no
+
+    return ""
+
+def stream_form_responses(bind: Engine, form_uuid: str, export_format: str, after: Optional[str]=None, until: Optional[str]=None) -> Iterator[str]:
+    # The session is opened here rather than borrowed from the request, because the response outlives the request.
+    with Session(bind) as database:
+        form_questions = database.query(models.FormYesNoQuestion.form_question_uuid, models.FormYesNoQuestion.title, models.FormYesNoQuestion.yes, models.FormYesNoQuestion.no).filter(and_(models.FormYesNoQuestion.form_uuid == form_uuid, models.FormYesNoQuestion.deleted == False)).order_by(models.FormYesNoQuestion.created_at, models.FormYesNoQuestion.form_question_uuid).all()
+        if export_format == "csv":
+            yield _csv_line(["form_response_uuid", "username", "display_name", "created_at"] + [form_question.title for form_question in form_questions])
+        query = database.query(models.FormResponse.form_response_uuid, models.User.username, models.User.display_name, models.FormResponse.created_at, models.FormYesNoQuestionResponse.form_question_uuid, models.FormYesNoQuestionResponse.yes, models.FormYesNoQuestionResponse.no)
+        query = query.join(models.User, models.User.user_key == models.FormResponse.respondent_key)
+        query = query.outerjoin(models.FormYesNoQuestionResponse, and_(models.FormYesNoQuestionResponse.form_response_uuid == models.FormResponse.form_response_uuid, models.FormYesNoQuestionResponse.deleted == False))
+        # Rows come off a server-side cursor in response order, so only one batch is held at a time.
+        query = query.filter(and_(models.FormResponse.form_uuid == form_uuid, models.FormResponse.deleted == False))
+        if after:
+            query = query.filter(models.FormResponse.form_response_uuid > after)
+        if until:
+            query = query.filter(models.FormResponse.form_response_uuid <= until)
+        rows = query.order_by(models.FormResponse.form_response_uuid).yield_per(EXPORT_YIELD_PER)
+        lines = []
+        for form_response_uuid, form_response_rows in groupby(rows, key=lambda row: row.form_response_uuid):
+            form_response_rows = list(form_response_rows)
+            username, display_name, created_at = form_response_rows[0].username, form_response_rows[0].display_name, form_response_rows[0].created_at
+            answers = {row.form_question_uuid: row for row in form_response_rows if row.form_question_uuid}
+            if export_format == "csv":
+                cells = [_csv_answer(form_question, answers.get(form_question.form_question_uuid)) for form_question in form_questions]
+                lines.append(_csv_line([form_response_uuid, username, display_name or "", created_at.isoformat()] + cells))
+            else:
+                lines.append(json.dumps({
+                    "form_response_uuid": form_response_uuid,
+                    "username": username,
+                    "display_name": display_name,
+                    "created_at": created_at.isoformat(),
+                    "form_question_responses": [{"form_question_uuid": form_question_uuid, "yes": answer.yes, "no": answer.no} for form_question_uuid, answer in answers.items()]
+                }, ensure_ascii=False) + "\n")
+            if len(lines) >= EXPORT_YIELD_PER:
+                yield "".join(lines)
+                lines = []
+        if lines:
+            yield "".join(lines)
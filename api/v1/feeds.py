@@ -0,0 +1,68 @@
+from datetime import datetime
+import os
+
+from sqlalchemy import DateTime, Integer, String, and_, exists, func, insert, literal, select
+from sqlalchemy.orm import Session
+
+from api.v1 import models
+
+
+FEED_ENABLED = os.getenv("FEED_ENABLED", "false").lower() == "true"
+FEED_INLINE_FAN_OUT_LIMIT = int(os.getenv("FEED_INLINE_FAN_OUT_LIMIT", "1000"))
+
+FEED_ITEM_COLUMNS = ["user_key", "item_uuid", "item_type", "board_uuid", "created_at"]
+FEED_ITEM_MODELS = {
+    "message": (models.Message, models.SubboardMessage, "message_uuid"),
+    "form": (models.Form, models.SubboardForm, "form_uuid")
+}
+
+
+def _audience(item_type: str, item_uuid: str):
+    _, association, key = FEED_ITEM_MODELS[item_type]
+
+    return select(models.SubboardMember.user_key).join(models.Subboard, models.Subboard.subboard_uuid == models.SubboardMember.subboard_uuid).join(association, association.subboard_uuid == models.SubboardMember.subboard_uuid).where(and_(getattr(association, key) == item_uuid, models.Subboard.deleted == False)).distinct()
+
+def create_feed_items(database: Session, item_type: str, item_uuid: str, board_uuid: str, created_at: datetime) -> None:
+    # A repair may already have picked the item up, so users who have it are skipped.
+    audience = _audience(item_type, item_uuid).add_columns(literal(item_uuid, String), literal(item_type, String), literal(board_uuid, String), literal(created_at, DateTime)).where(~exists().where(and_(models.FeedItem.user_key == models.SubboardMember.user_key, models.FeedItem.item_uuid == item_uuid)))
+    database.execute(insert(models.FeedItem).from_select(FEED_ITEM_COLUMNS, audience))
+
+def fan_out(database: Session, item_type: str, item_uuid: str, board_uuid: str, created_at: datetime) -> None:
+    database.flush()
+    audience_size = database.execute(select(func.count()).select_from(_audience(item_type, item_uuid).subquery())).scalar()
+    # Large audiences are left to the maintain_feeds timer, so that posting stays fast; readers cover the gap from FeedFanOuts.
+    if audience_size <= FEED_INLINE_FAN_OUT_LIMIT:
+        create_feed_items(database, item_type, item_uuid, board_uuid, created_at)
+    else:
+        database.add(models.FeedFanOut(item_uuid=item_uuid, item_type=item_type, board_uuid=board_uuid, created_at=created_at))
+
+def enqueue_feed_repairs(database: Session, user_keys, board_uuid: str) -> None:
+    created_at = datetime.now()
+    # user_keys may be a subquery, so that every member of a subboard is queued with one UPDATE and one INSERT.
+    database.query(models.FeedRepair).filter(and_(models.FeedRepair.user_key.in_(user_keys), models.FeedRepair.board_uuid == board_uuid)).update({models.FeedRepair.created_at: created_at}, synchronize_session=False)
+    feed_repairs = select(models.User.user_key, literal(board_uuid, String), literal(created_at, DateTime)).where(and_(models.User.user_key.in_(user_keys), ~exists().where(and_(models.FeedRepair.user_key == models.User.user_key, models.FeedRepair.board_uuid == board_uuid))))
+    database.execute(insert(models.FeedRepair).from_select(["user_key", "board_uuid", "created_at"], feed_repairs))
+
+def enqueue_all_feed_repairs(database: Session) -> None:
+    # Run once when FEED_ENABLED is turned on for an existing database; readers use the join until each feed is built.
+    memberships = select(models.SubboardMember.user_key, models.Subboard.board_uuid, literal(datetime.now(), DateTime)).distinct().join(models.Subboard, models.Subboard.subboard_uuid == models.SubboardMember.subboard_uuid).where(and_(models.Subboard.deleted == False, ~exists().where(and_(models.FeedRepair.user_key == models.SubboardMember.user_key, models.FeedRepair.board_uuid == models.Subboard.board_uuid))))
+    database.execute(insert(models.FeedRepair).from_select(["user_key", "board_uuid", "created_at"], memberships))
+
+def has_feed_repair(database: Session, user_key: int, board_uuid: str) -> bool:
+    return database.query(exists().where(and_(models.FeedRepair.user_key == user_key, models.FeedRepair.board_uuid == board_uuid))).scalar()
+
+def rebuild_feed(database: Session, user_key: int, board_uuid: str) -> None:
+    database.query(models.FeedItem).filter(and_(models.FeedItem.user_key == user_key, models.FeedItem.board_uuid == board_uuid)).delete(synchronize_session=False)
+    for item_type, (model, association, key) in FEED_ITEM_MODELS.items():
+        item_uuid = getattr(model, key)
+        items = select(literal(user_key, Integer), item_uuid, literal(item_type, String), model.board_uuid, model.created_at).distinct().select_from(model).join(association, getattr(association, key) == item_uuid).join(models.Subboard, models.Subboard.subboard_uuid == association.subboard_uuid).join(models.SubboardMember, models.SubboardMember.subboard_uuid == association.subboard_uuid).where(and_(models.SubboardMember.user_key == user_key, model.board_uuid == board_uuid, model.deleted == False, models.Subboard.deleted == False))
+        database.execute(insert(models.FeedItem).from_select(FEED_ITEM_COLUMNS, items))
+
+def read_feed(database: Session, item_type: str, user_key: int, board_uuid: str, options: tuple=()) -> list:
+    model, _, key = FEED_ITEM_MODELS[item_type]
+    item_uuid = getattr(model, key)
+    feed_items = database.query(model).options(*options).join(models.FeedItem, models.FeedItem.item_uuid == item_uuid).filter(and_(models.FeedItem.user_key == user_key, models.FeedItem.board_uuid == board_uuid, models.FeedItem.item_type == item_type, model.deleted == False)).order_by(models.FeedItem.created_at).all()
+    # Items whose fan-out is still queued are matched against subboard membership, as the feed does not have them yet.
+    queued_items = database.query(model).options(*options).join(models.FeedFanOut, models.FeedFanOut.item_uuid == item_uuid).filter(and_(models.FeedFanOut.board_uuid == board_uuid, model.deleted == False, model.subboards.any(and_(models.Subboard.subboard_uuid.in_(select(models.SubboardMember.subboard_uuid).where(models.SubboardMember.user_key == user_key)), models.Subboard.deleted == False)))).all()
+
+    return feed_items + queued_items
@@ -0,0 +1,60 @@
+from datetime import datetime, timedelta
+import json
+import os
+from typing import Any, Optional, Tuple
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from api.v1 import caches, models
+
+
+IDEMPOTENCY_KEY_TTL = float(os.getenv("IDEMPOTENCY_KEY_TTL", "86400"))
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+
+# Only completed responses are cached, so a repeat never has to wait on the table once it has been answered.
+idempotent_response_cache = caches.TTLCache(int(os.getenv("IDEMPOTENCY_KEY_CACHE_SIZE", "10000")), IDEMPOTENCY_KEY_TTL)
+
+
+def _stored_response(idempotency_key: models.IdempotencyKey) -> Tuple[str, Optional[int], Any]:
+    stored_response = (idempotency_key.request_path, idempotency_key.status_code, json.loads(idempotency_key.response_body) if idempotency_key.response_body is not None else None)
+    if idempotency_key.status_code is not None:
+        idempotent_response_cache.set((idempotency_key.user_key, idempotency_key.idempotency_key), stored_response)
+
+    return stored_response
+
+def claim(database: Session, user_key: int, idempotency_key: str, request_path: str) -> Optional[Tuple[str, Optional[int], Any]]:
+    stored_response = idempotent_response_cache.get((user_key, idempotency_key))
+    if stored_response:
+        return stored_response
+    created_at = datetime.now()
+    stored = database.get(models.IdempotencyKey, (user_key, idempotency_key))
+    if stored and stored.created_at >= created_at - timedelta(seconds=IDEMPOTENCY_KEY_TTL):
+        return _stored_response(stored)
+    if stored:
+        # An expired key that the cleanup has not reached yet is reused as if it were new.
+        stored.request_path = request_path
+        stored.status_code = None
+        stored.response_body = None
+        stored.created_at = created_at
+    else:
+        database.add(models.IdempotencyKey(user_key=user_key, idempotency_key=idempotency_key, request_path=request_path, created_at=created_at))
+    # The key row is written in the same transaction as the request, so a concurrent repeat waits on it and then finds the response.
+    try:
+        database.flush()
+    except IntegrityError:
+        database.rollback()
+        stored = database.get(models.IdempotencyKey, (user_key, idempotency_key))
+        return _stored_response(stored) if stored else (request_path, None, None)
+
+    return None
+
+def save_response(database: Session, user_key: int, idempotency_key: Optional[str], status_code: int, content: Any) -> None:
+    if not idempotency_key:
+        return
+    stored = database.get(models.IdempotencyKey, (user_key, idempotency_key))
+    stored.status_code = status_code
+    stored.response_body = json.dumps(content)
+
+def delete_expired_idempotency_keys(database: Session) -> int:
+    return database.query(models.IdempotencyKey).filter(models.IdempotencyKey.created_at < datetime.now() - timedelta(seconds=IDEMPOTENCY_KEY_TTL)).delete(synchronize_session=False)
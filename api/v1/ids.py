@@ -0,0 +1,39 @@
+from secrets import randbits
+from threading import Lock
+import time
+from uuid import UUID
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from api.v1 import models
+
+
+_lock = Lock()
+_last_timestamp = 0
+_counter = 0
+
+
+def uuid7() -> str:
+    # UUIDv7: a 48-bit millisecond timestamp leads, so keys sort in insert order and new rows land at the end of the clustered index.
+    global _last_timestamp, _counter
+    with _lock:
+        timestamp = time.time_ns() // 1000000
+        if timestamp > _last_timestamp:
+            _last_timestamp = timestamp
+            _counter = randbits(11)
+        else:
+            # Ids made within the same millisecond (or after the clock stepped back) keep increasing through the 12-bit counter.
+            _counter += 1
+            if _counter > 0xFFF:
+                _last_timestamp += 1
+                _counter = 0
+        timestamp, counter = _last_timestamp, _counter
+
+    return str(UUID(int=(timestamp << 80) | (0x7 << 76) | (counter << 64) | (0b10 << 62) | randbits(62)))
+
+def assign_user_key(database: Session, user: models.User) -> None:
+    # Compact keys for the membership and fact tables. SQL Server hands them out from the IDENTITY column; SQLite has
+    # no IDENTITY outside the primary key and runs one writer at a time, so the INSERT takes the next one itself.
+    if database.get_bind().dialect.name != "mssql":
+        user.user_key = select(func.coalesce(func.max(models.User.user_key), 0) + 1).scalar_subquery()
@@ -0,0 +1,95 @@
+import contextvars
+import logging
+import os
+import re
+import time
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+
+SLOW_QUERY_THRESHOLD = float(os.getenv("SLOW_QUERY_THRESHOLD", "0.5"))
+
+logger = logging.getLogger("api.v1.instrumentation")
+
+
+class RequestStatistics:
+    def __init__(self, scope: Scope):
+        self.scope = scope
+        self.statement_count = 0
+        self.statement_duration = 0.0
+
+    @property
+    def route(self) -> str:
+        # The route template is only known once routing has matched the request, and carries no ids unlike the path.
+        route = self.scope.get("route")
+
+        return route.path if route is not None else self.scope["path"]
+
+
+current_request_statistics: contextvars.ContextVar[Optional[RequestStatistics]] = contextvars.ContextVar("current_request_statistics", default=None)
+
+def _redact(statement: str) -> str:
+    # Bound parameters are never logged; inline string and number literals are masked as well.
+    statement = re.sub(r"N?'(?:[^']|'')*'", "'?'", statement)
+    statement = re.sub(r"\b\d+(\.\d+)?\b", "?", statement)
+
+    return " ".join(statement.split())
+
+def instrument_engine(engine: Engine) -> None:
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        # The start time lives on the execution context, so a statement that raises leaves nothing behind.
+        context._query_started_at = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        duration = time.perf_counter() - context._query_started_at
+        request_statistics = current_request_statistics.get()
+        if request_statistics:
+            request_statistics.statement_count += 1
+            request_statistics.statement_duration += duration
+        if duration >= SLOW_QUERY_THRESHOLD:
+            route = request_statistics.route if request_statistics else None
+            logger.warning(
+                "Slow query on %s took %.3f s",
+                route,
+                duration,
+                extra={"custom_dimensions": {"route": route, "duration": duration, "statement": _redact(statement), "parameter_count": len(parameters) if parameters and not executemany else 0, "executemany": executemany}}
+            )
+
+
+class QueryStatisticsMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        request_statistics = RequestStatistics(scope)
+        token = current_request_statistics.set(request_statistics)
+        status_code = None
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        started_at = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            duration = time.perf_counter() - started_at
+            current_request_statistics.reset(token)
+            logger.info(
+                "%s %s: %d statements in %.3f s",
+                scope["method"],
+                request_statistics.route,
+                request_statistics.statement_count,
+                request_statistics.statement_duration,
+                extra={"custom_dimensions": {"method": scope["method"], "route": request_statistics.route, "status_code": status_code, "duration": duration, "statement_count": request_statistics.statement_count, "statement_duration": request_statistics.statement_duration}}
+            )
@@ -0,0 +1,162 @@
+import asyncio
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple, Union
+from uuid import uuid4
+
+import httpx
+from linebot.models import RichMenu, SendMessage
+from opentelemetry import trace
+from opentelemetry.trace import SpanKind
+
+from api.v1 import metrics
+from api.v1.tracing import tracer
+
+
+class LINEAPIError(Exception):
+    def __init__(self, status_code: int, message: str):
+        super().__init__(f"{status_code}: {message}")
+        self.status_code = status_code
+        self.message = message
+
+
+class LINEClient:
+    MULTICAST_MAX_RECIPIENTS = 500
+
+    def __init__(self, channel_access_token: str, endpoint: str="https://api.line.me", data_endpoint: str="https://api-data.line.me", max_connections: int=100, max_keepalive_connections: int=20, keepalive_expiry: float=60.0, max_concurrency: int=20, timeout: float=10.0, max_retries: int=3, retry_backoff: float=0.5):
+        self.channel_access_token = channel_access_token
+        self.endpoint = endpoint.rstrip("/")
+        self.data_endpoint = data_endpoint.rstrip("/")
+        self.limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_keepalive_connections, keepalive_expiry=keepalive_expiry)
+        self.timeout = httpx.Timeout(timeout)
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self._http_clients: Dict[asyncio.AbstractEventLoop, Tuple[httpx.AsyncClient, asyncio.Semaphore]] = {}
+
+    def _get_http_client(self) -> Tuple[httpx.AsyncClient, asyncio.Semaphore]:
+        # httpx connection pools are bound to the event loop they were opened on.
+        loop = asyncio.get_running_loop()
+        if loop not in self._http_clients:
+            for closed_loop in [closed_loop for closed_loop in self._http_clients if closed_loop.is_closed()]:
+                del self._http_clients[closed_loop]
+            http_client = httpx.AsyncClient(
+                headers={"Authorization": f"Bearer {self.channel_access_token}"},
+                limits=self.limits,
+                timeout=self.timeout
+            )
+            self._http_clients[loop] = (http_client, asyncio.Semaphore(self.max_concurrency))
+
+        return self._http_clients[loop]
+
+    def _get_retry_delay(self, response: Optional[httpx.Response], attempt: int) -> float:
+        if response is not None and "Retry-After" in response.headers:
+            try:
+                return max(float(response.headers["Retry-After"]), 0.0)
+            except ValueError:
+                pass
+
+        return self.retry_backoff * 2 ** attempt
+
+    async def _request(self, operation: str, method: str, url: str, retry_key: Optional[str]=None, **kwargs: Any) -> httpx.Response:
+        with tracer.start_as_current_span(f"line.{operation}", kind=SpanKind.CLIENT, attributes={"http.request.method": method, "url.full": url}) as span:
+            response = await self._request_with_retries(operation, method, url, retry_key, **kwargs)
+            span.set_attribute("http.response.status_code", response.status_code)
+
+            return response
+
+    async def _request_with_retries(self, operation: str, method: str, url: str, retry_key: Optional[str]=None, **kwargs: Any) -> httpx.Response:
+        http_client, semaphore = self._get_http_client()
+        headers = kwargs.pop("headers", {})
+        if retry_key:
+            headers["X-Line-Retry-Key"] = retry_key
+        for attempt in range(self.max_retries + 1):
+            trace.get_current_span().set_attribute("line.attempts", attempt + 1)
+            response = None
+            try:
+                async with semaphore:
+                    started_at = time.perf_counter()
+                    try:
+                        response = await http_client.request(method, url, headers=headers, **kwargs)
+                    finally:
+                        metrics.line_api_request_duration_seconds.observe(time.perf_counter() - started_at, operation)
+            except httpx.TransportError as e:
+                metrics.line_api_errors_total.inc(operation, "0")
+                if attempt >= self.max_retries:
+                    raise LINEAPIError(0, str(e))
+            else:
+                if response.is_error:
+                    metrics.line_api_errors_total.inc(operation, str(response.status_code))
+                # A 409 on a retried request means LINE already accepted it under the same retry key.
+                if response.status_code == 409 and retry_key and attempt > 0:
+                    return response
+                if response.status_code != 429 and response.status_code < 500:
+                    break
+                if attempt >= self.max_retries:
+                    break
+            await asyncio.sleep(self._get_retry_delay(response, attempt))
+        if response.is_error:
+            raise LINEAPIError(response.status_code, response.text)
+
+        return response
+
+    async def push_message(self, to: str, messages: Union[SendMessage, List[SendMessage]]) -> None:
+        if not isinstance(messages, list):
+            messages = [messages]
+        data = {
+            "to": to,
+            "messages": [message.as_json_dict() for message in messages]
+        }
+        await self._request("push_message", "POST", f"{self.endpoint}/v2/bot/message/push", retry_key=str(uuid4()), json=data)
+
+    async def multicast(self, to: List[str], messages: Union[SendMessage, List[SendMessage]]) -> None:
+        if not isinstance(messages, list):
+            messages = [messages]
+        messages = [message.as_json_dict() for message in messages]
+        chunks = [to[i:i + self.MULTICAST_MAX_RECIPIENTS] for i in range(0, len(to), self.MULTICAST_MAX_RECIPIENTS)]
+        await asyncio.gather(*[
+            self._request("multicast", "POST", f"{self.endpoint}/v2/bot/message/multicast", retry_key=str(uuid4()), json={"to": chunk, "messages": messages})
+            for chunk in chunks
+        ])
+
+    async def reply_message(self, reply_token: str, messages: Union[SendMessage, List[SendMessage]]) -> None:
+        if not isinstance(messages, list):
+            messages = [messages]
+        data = {
+            "replyToken": reply_token,
+            "messages": [message.as_json_dict() for message in messages]
+        }
+        await self._request("reply_message", "POST", f"{self.endpoint}/v2/bot/message/reply", json=data)
+
+    async def create_rich_menu(self, rich_menu: RichMenu) -> str:
+        response = await self._request("create_rich_menu", "POST", f"{self.endpoint}/v2/bot/richmenu", json=rich_menu.as_json_dict())
+
+        return response.json()["richMenuId"]
+
+    async def set_rich_menu_image(self, rich_menu_id: str, content_type: str, content: bytes) -> None:
+        await self._request("set_rich_menu_image", "POST", f"{self.data_endpoint}/v2/bot/richmenu/{rich_menu_id}/content", headers={"Content-Type": content_type}, content=content)
+
+    async def set_default_rich_menu(self, rich_menu_id: str) -> None:
+        await self._request("set_default_rich_menu", "POST", f"{self.endpoint}/v2/bot/user/all/richmenu/{rich_menu_id}")
+
+    async def aclose(self) -> None:
+        loop = asyncio.get_running_loop()
+        if loop in self._http_clients:
+            http_client, _ = self._http_clients.pop(loop)
+            await http_client.aclose()
+
+
+def create_line_client() -> LINEClient:
+    line_client = LINEClient(
+        os.getenv("CHANNEL_ACCESS_TOKEN"),
+        endpoint=os.getenv("LINE_API_ENDPOINT", "https://api.line.me"),
+        data_endpoint=os.getenv("LINE_API_DATA_ENDPOINT", "https://api-data.line.me"),
+        max_connections=int(os.getenv("LINE_API_MAX_CONNECTIONS", "100")),
+        max_keepalive_connections=int(os.getenv("LINE_API_MAX_KEEPALIVE_CONNECTIONS", "20")),
+        keepalive_expiry=float(os.getenv("LINE_API_KEEPALIVE_EXPIRY", "60")),
+        max_concurrency=int(os.getenv("LINE_API_MAX_CONCURRENCY", "20")),
+        timeout=float(os.getenv("LINE_API_TIMEOUT", "10")),
+        max_retries=int(os.getenv("LINE_API_MAX_RETRIES", "3"))
+    )
+
+    return line_client
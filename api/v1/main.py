@@ -1,30 +1,43 @@
+import asyncio
 from contextlib import contextmanager
 import copy
+import hashlib
 import json
 import os
-from typing import List, Tuple
+from typing import List, Optional, Tuple
 import urllib.parse
 
-from fastapi import APIRouter, Depends, HTTPException, Header, Request, status
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, Depends, HTTPException, Header, Request, Response, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, ORJSONResponse, StreamingResponse
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from linebot import LineBotApi, WebhookHandler
+from linebot import WebhookParser
 from linebot.exceptions import InvalidSignatureError
-from linebot.models import FlexSendMessage, FollowEvent, MessageAction, MessageEvent, RichMenu, RichMenuArea, RichMenuBounds, RichMenuSize, TextMessage, TextSendMessage
+from linebot.models import Event, FlexSendMessage, FollowEvent, MessageEvent, SendMessage, TextMessage, TextSendMessage
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from sqlalchemy.orm import Session
 
-from api.v1 import crud, models, schemas
-from api.v1.database import LocalSession, engine
+from api.v1 import crud, deliveries, events, exports, idempotency, models, payloads, schemas
+from api.v1.database import LocalSession, ReadOnlySession, engine
+from api.v1.line_client import LINEClient, create_line_client
+from api.v1.read_your_writes import READ_YOUR_WRITES_HEADER, reads_own_writes
+from api.v1.tracing import traced
 
 
-models.Base.metadata.create_all(engine)
+# Outside SQLite the schema is owned by the migrations in api/v1/database/migrations, which also import this package.
+if engine.dialect.name == "sqlite":
+    models.Base.metadata.create_all(engine)
 
 api_router = APIRouter()
 
-def _get_database():
-    database = LocalSession()
+def _get_database(request: Request):
+    # Reads go to the read-intent replica, except for clients that echo the marker of a recent write,
+    # because the replica may not have caught up with their changes yet.
+    if request.method in ["GET", "HEAD"] and not reads_own_writes(request.headers.get(READ_YOUR_WRITES_HEADER)):
+        database = ReadOnlySession()
+    else:
+        database = LocalSession()
     try:
         yield database
     finally:
@@ -52,82 +65,104 @@ def _get_current_user(access_token: str=Depends(OAuth2PasswordBearer("/api/v1/si
 
     return user
 
-def init_line_bot_api() -> Tuple[LineBotApi, WebhookHandler]:
+def _compute_etag(*parts) -> str:
+    return 'W/"%s"' % hashlib.sha1(repr(parts).encode("utf-8")).hexdigest()
+
+def _claim_idempotency_key(database: Session, user_key: int, idempotency_key: Optional[str], request: Request) -> Optional[JSONResponse]:
+    if not idempotency_key:
+        return None
+    if len(idempotency_key) > idempotency.IDEMPOTENCY_KEY_MAX_LENGTH:
+        raise HTTPException(status.HTTP_400_BAD_REQUEST)
+    stored_response = idempotency.claim(database, user_key, idempotency_key, request.url.path)
+    if not stored_response:
+        return None
+    request_path, status_code, content = stored_response
+    if request_path != request.url.path:
+        raise HTTPException(status.HTTP_422_UNPROCESSABLE_ENTITY)
+    # The first request is still in progress, or was rolled back while this one waited.
+    if status_code is None:
+        raise HTTPException(status.HTTP_409_CONFLICT)
+
+    return JSONResponse(content, status_code)
+
+def _check_etag(if_none_match: Optional[str], response: Response, etag: str) -> dict:
+    headers = {
+        "ETag": etag,
+        "Cache-Control": "private, no-cache"
+    }
+    if if_none_match:
+        # If-None-Match uses the weak comparison, so W/ prefixes are ignored on both sides.
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        if "*" in tags or etag.removeprefix("W/") in tags:
+            raise HTTPException(status.HTTP_304_NOT_MODIFIED, headers=headers)
+    response.headers.update(headers)
+
+    # Returned for routes that answer with a raised 204, which does not carry the injected response's headers.
+    return headers
+
+def init_line_bot_api() -> Tuple[LINEClient, WebhookParser]:
     CHANNEL_SECRET_KEY = os.getenv("CHANNEL_SECRET_KEY")
-    CHANNEL_ACCESS_TOKEN = os.getenv("CHANNEL_ACCESS_TOKEN")
-
-    line_bot_api = LineBotApi(CHANNEL_ACCESS_TOKEN)
-    web_hook_handler = WebhookHandler(CHANNEL_SECRET_KEY)
-
-    rich_menu_id = line_bot_api.create_rich_menu(
-        RichMenu(
-            size=RichMenuSize(width=2500, height=1686),
-            selected=True,
-            name="リッチメニュー",
-            chat_bar_text="メニュー",
-            areas=[
-                RichMenuArea(
-                    bounds=RichMenuBounds(x=0, y=0, width=1250, height=843),
-                    action=MessageAction(label="サインアップ", text="サインアップ")
-                ),
-                RichMenuArea(
-                    bounds=RichMenuBounds(x=0, y=843, width=1250, height=843),
-                    action=MessageAction(label="ボード設定", text="ボード設定")
-                ),
-                RichMenuArea(
-                    bounds=RichMenuBounds(x=1250, y=843, width=1250, height=843),
-                    action=MessageAction(label="サブボード設定", text="サブボード設定")
-                ),
-                RichMenuArea(
-                    bounds=RichMenuBounds(x=1250, y=0, width=1250, height=843),
-                    action=MessageAction(label="DM", text="DM")
-                )
-            ]
-        )
-    )
-    with open("./api/v1/assets/rich_menu.png", "rb") as f:
-        line_bot_api.set_rich_menu_image(rich_menu_id, "image/png", f)
-        line_bot_api.set_default_rich_menu(rich_menu_id)
 
-    return line_bot_api, web_hook_handler
+    # No LINE calls are made here; the rich menu is set up at deploy time by api.v1.rich_menu, so a LINE outage cannot fail a cold start.
+    line_client = create_line_client()
+    web_hook_parser = WebhookParser(CHANNEL_SECRET_KEY)
+
+    return line_client, web_hook_parser
+
+line_client, web_hook_parser = init_line_bot_api()
 
-line_bot_api, web_hook_handler = init_line_bot_api()
+# (LINE user ID, message) pairs that a webhook event handler wants pushed once its database work is done.
+LINEPushes = List[Tuple[str, SendMessage]]
+
+async def push_line_messages(line_pushes: LINEPushes) -> None:
+    await asyncio.gather(*[line_client.push_message(line_user_id, message) for line_user_id, message in line_pushes])
 
 @api_router.post("/callback", tags=["LINE"])
 async def callback(request: Request, x_line_signature=Header()):
     body = await request.body()
     try:
-        web_hook_handler.handle(body.decode("utf-8"), x_line_signature)
+        line_events = web_hook_parser.parse(body.decode("utf-8"), x_line_signature)
     except InvalidSignatureError:
         raise HTTPException(status.HTTP_400_BAD_REQUEST)
+    for line_event in line_events:
+        # Handlers only touch the database, in the thread pool; their pushes are awaited here on the event loop.
+        line_pushes = await run_in_threadpool(handle_line_event, line_event)
+        await push_line_messages(line_pushes)
 
     return status.HTTP_200_OK
 
-@web_hook_handler.add(FollowEvent)
-def handle_follow_event(event: FollowEvent):
+def handle_line_event(event: Event) -> LINEPushes:
+    if isinstance(event, FollowEvent):
+        return handle_follow_event(event)
+    if isinstance(event, MessageEvent) and isinstance(event.message, TextMessage):
+        return handle_message_event(event)
+
+    return []
+
+@traced
+def handle_follow_event(event: FollowEvent) -> LINEPushes:
     with _get_database_with_contextmanager() as database:
-        line_user = crud.read_line_user(database, event.source.user_id)
-        if not line_user:
-            line_user = crud.create_line_user(database, event.source.user_id)
-        if line_user:
-            user = crud.read_user(database, line_user_id=event.source.user_id)
-            if user:
-                line_bot_api.push_message(
-                    event.source.user_id,
-                    TextSendMessage(f"{user.display_name if user.display_name else user.username}さんでサインインしました。")
-                )
-            else:
-                signup_url = f"https://orange-sand-0f913e000.3.azurestaticapps.net/paticipant/signup?line_user_uuid={line_user.line_user_uuid}"
-                line_bot_api.push_message(
-                    event.source.user_id,
-                    TextSendMessage(f"{signup_url} でサインアップします。")
-                )
+        return _sign_in_line_user(database, event.source.user_id)
+
+@traced
+def _sign_in_line_user(database: Session, line_user_id: str) -> LINEPushes:
+    # Sessions are read from the database on every event, because signups, display names and message contexts change on whichever instance handles them.
+    line_session = crud.upsert_line_user(database, line_user_id)
+    database.commit()
+    if not line_session:
+        return []
+    if line_session.user_uuid:
+        return [(line_user_id, TextSendMessage(f"{line_session.display_name if line_session.display_name else line_session.username}さんでサインインしました。"))]
+    signup_url = f"https://orange-sand-0f913e000.3.azurestaticapps.net/paticipant/signup?line_user_uuid={line_session.line_user_uuid}"
+
+    return [(line_user_id, TextSendMessage(f"{signup_url} でサインアップします。"))]
 
 @api_router.post("/signup", tags=["users"])
 def signup(request: schemas.Signup, database: Session=Depends(_get_database)):
     user = crud.create_user(database, request)
     if not user:
         raise HTTPException(status.HTTP_400_BAD_REQUEST)
+    database.commit()
 
     return status.HTTP_201_CREATED
 
@@ -150,51 +185,56 @@ def get_me(current_user: models.User=Depends(_get_current_user)) -> schemas.User
 
 @api_router.post("/me/update_password", tags=["users"])
 def update_password(request: schemas.Password, current_user: models.User=Depends(_get_current_user), database: Session=Depends(_get_database)):
-    user = crud.update_password(database, current_user.username, request)
+    user = crud.update_password(database, current_user, request)
     if not user:
         raise HTTPException(status.HTTP_400_BAD_REQUEST)
+    database.commit()
 
     return status.HTTP_201_CREATED
 
 @api_router.post("/me/update_display_name", tags=["users"])
 def update_display_name(request: schemas.DisplayName, current_user: models.User=Depends(_get_current_user), database: Session=Depends(_get_database)):
-    user = crud.update_display_name(database, current_user.username, request)
+    user = crud.update_display_name(database, current_user, request)
     if not user:
         raise HTTPException(status.HTTP_400_BAD_REQUEST)
+    database.commit()
 
     return status.HTTP_201_CREATED
 
 @api_router.delete("/me", tags=["users"])
 def delete_me(current_user: models.User=Depends(_get_current_user), database: Session=Depends(_get_database)):
-    user = crud.delete_user(database, current_user.username)
+    user = crud.delete_user(database, current_user)
     if not user:
         raise HTTPException(status.HTTP_400_BAD_REQUEST)
+    database.commit()
 
     return status.HTTP_200_OK
 
 @api_router.get("/boards", response_model=List[schemas.BoardWithSubboards], tags=["boards"])
-def get_boards(current_user: models.User=Depends(_get_current_user), database: Session=Depends(_get_database)) -> List[schemas.BoardWithSubboards]:
-    boards = crud.read_boards(database, current_user.username)
+def get_boards(response: Response, if_none_match: Optional[str]=Header(None), current_user: models.User=Depends(_get_current_user), database: Session=Depends(_get_database)) -> List[schemas.BoardWithSubboards]:
+    etag_headers = _check_etag(if_none_match, response, _compute_etag(current_user.username, sorted(crud.read_board_versions(database, current_user.user_key))))
+    boards = payloads.read_boards(database, current_user.user_key)
     if not boards:
-        raise HTTPException(status.HTTP_204_NO_CONTENT)
+        raise HTTPException(status.HTTP_204_NO_CONTENT, headers=etag_headers)
 
-    return boards
+    return ORJSONResponse(boards, headers=etag_headers)
 
 @api_router.get("/board/{board_uuid}", response_model=schemas.BoardWithSubboards, tags=["boards"])
 def get_board(board_uuid: str, current_user: models.User=Depends(_get_current_user), database: Session=Depends(_get_database)) -> schemas.BoardWithSubboards:
     board = crud.read_board(database, board_uuid=board_uuid)
     if not board:
         raise HTTPException(status.HTTP_404_NOT_FOUND)
-    if board.administrator != current_user:
+    if board.administrator_key != current_user.user_key:
         raise HTTPException(status.HTTP_401_UNAUTHORIZED)
 
     return board
 
 @api_router.post("/board", tags=["boards"])
 def post_board(request: schemas.NewBoard, _request: Request, current_user: models.User=Depends(_get_current_user), database: Session=Depends(_get_database)):
-    board = crud.create_board(database, current_user.username, request)
+    board = crud.create_board(database, current_user.user_key, request)
     if not board:
         raise HTTPException(status.HTTP_400_BAD_REQUEST)
+    database.commit()
     response = {
         "Location": urllib.parse.urljoin(_request.url._url, f"./board/{board.board_uuid}")
     }
@@ -206,49 +246,53 @@ def delete_board(board_uuid: str, current_user: models.User=Depends(_get_current
     board = crud.read_board(database, board_uuid=board_uuid)
     if not board:
         raise HTTPException(status.HTTP_404_NOT_FOUND)
-    if board.administrator != current_user:
+    if board.administrator_key != current_user.user_key:
         raise HTTPException(status.HTTP_401_UNAUTHORIZED)
-    board = crud.delete_board(database, board_uuid)
+    board = crud.delete_board(database, board)
     if not board:
         raise HTTPException(status.HTTP_400_BAD_REQUEST)
+    database.commit()
 
     return status.HTTP_200_OK
 
 @api_router.get("/my_boards", response_model=List[schemas.MyBoardWithSubboards], tags=["boards"])
-def get_my_boards(current_user: models.User=Depends(_get_current_user), database: Session=Depends(_get_database)) -> List[schemas.MyBoardWithSubboards]:
-    my_boards = crud.read_my_boards(database, current_user.username)
+def get_my_boards(response: Response, if_none_match: Optional[str]=Header(None), current_user: models.User=Depends(_get_current_user), database: Session=Depends(_get_database)) -> List[schemas.MyBoardWithSubboards]:
+    etag_headers = _check_etag(if_none_match, response, _compute_etag(current_user.username, sorted(crud.read_my_board_versions(database, current_user.user_key))))
+    my_boards = crud.read_my_boards(database, current_user.user_key)
     if not my_boards:
-        raise HTTPException(status.HTTP_204_NO_CONTENT)
+        raise HTTPException(status.HTTP_204_NO_CONTENT, headers=etag_headers)
 
     return my_boards
 
 @api_router.post("/update_my_boards", tags=["boards"])
 def update_my_boards(request: schemas.NewMyBoards, current_user: models.User=Depends(_get_current_user), database: Session=Depends(_get_database)):
-    user = crud.update_my_boards(database, current_user.username, request)
+    user = crud.update_my_boards(database, current_user, request)
     if not user:
         raise HTTPException(status.HTTP_400_BAD_REQUEST)
+    database.commit()
 
     return status.HTTP_201_CREATED
 
 @api_router.get("/board/{board_uuid}/subboards",response_model=List[schemas.SubboardWithBoard], tags=["subboards"])
-def get_subboards(board_uuid: str, current_user: models.User=Depends(_get_current_user), database: Session=Depends(_get_database)) -> List[schemas.SubboardWithBoard]:
+def get_subboards(board_uuid: str, response: Response, if_none_match: Optional[str]=Header(None), current_user: models.User=Depends(_get_current_user), database: Session=Depends(_get_database)) -> List[schemas.SubboardWithBoard]:
     board = crud.read_board(database, board_uuid=board_uuid)
     if not board:
         raise HTTPException(status.HTTP_404_NOT_FOUND)
-    if board.administrator != current_user:
+    if board.administrator_key != current_user.user_key:
         raise HTTPException(status.HTTP_401_UNAUTHORIZED)
-    subboards = crud.read_subboards(database, board_uuid)
+    etag_headers = _check_etag(if_none_match, response, _compute_etag(current_user.username, board.board_uuid, board.version))
+    subboards = payloads.read_subboards(database, board)
     if not subboards:
-        raise HTTPException(status.HTTP_204_NO_CONTENT)
+        raise HTTPException(status.HTTP_204_NO_CONTENT, headers=etag_headers)
 
-    return subboards
+    return ORJSONResponse(subboards, headers=etag_headers)
 
 @api_router.get("/board/{board_uuid}/subboards/{subboard_uuid}", response_model = schemas.SubboardWithBoard, tags=["subboards"])
 def get_subboard(board_uuid: str, subboard_uuid: str, current_user: models.User=Depends(_get_current_user), database: Session=Depends(_get_database)) -> schemas.SubboardWithBoard:
     board = crud.read_board(database, board_uuid=board_uuid)
     if not board:
         raise HTTPException(status.HTTP_404_NOT_FOUND)
-    if board.administrator != current_user:
+    if board.administrator_key != current_user.user_key:
         raise HTTPException(status.HTTP_401_UNAUTHORIZED)
     subboard = crud.read_subboard(database, board_uuid, subboard_uuid)
     if not subboard:
@@ -261,11 +305,12 @@ def post_subboard(board_uuid: str, request: schemas.NewSubboard, _request: Reque
     board = crud.read_board(database, board_uuid=board_uuid)
     if not board:
         raise HTTPException(status.HTTP_404_NOT_FOUND)
-    if board.administrator != current_user:
+    if board.administrator_key != current_user.user_key:
         raise HTTPException(status.HTTP_401_UNAUTHORIZED)
     subboard = crud.create_subboard(database, board_uuid, request)
     if not subboard:
         raise HTTPException(status.HTTP_400_BAD_REQUEST)
+    database.commit()
     response = {
         "Location": urllib.parse.urljoin(_request.url._url, f"./subboard/{subboard.subboard_uuid}")
     }
@@ -277,27 +322,29 @@ def delete_subboard(board_uuid: str, subboard_uuid: str, current_user: models.Us
     board = crud.read_board(database, board_uuid=board_uuid)
     if not board:
         raise HTTPException(status.HTTP_404_NOT_FOUND)
-    if board.administrator != current_user:
+    if board.administrator_key != current_user.user_key:
         raise HTTPException(status.HTTP_401_UNAUTHORIZED)
     subboard = crud.read_subboard(database, board_uuid, subboard_uuid)
     if not subboard:
         raise HTTPException(status.HTTP_404_NOT_FOUND)
-    subboard = crud.delete_subboard(database, board_uuid, subboard_uuid)
+    subboard = crud.delete_subboard(database, subboard)
     if not subboard:
         raise HTTPException(status.HTTP_400_BAD_REQUEST)
+    database.commit()
 
     return status.HTTP_200_OK
 
 @api_router.get("/board/{board_uuid}/available_subboards", response_model=List[schemas.MySubboardWithBoard], tags=["subboards"])
-def get_available_subboards(board_uuid: str, current_user: models.User=Depends(_get_current_user), database: Session=Depends(_get_database)) -> List[schemas.MySubboardWithBoard]:
+def get_available_subboards(board_uuid: str, response: Response, if_none_match: Optional[str]=Header(None), current_user: models.User=Depends(_get_current_user), database: Session=Depends(_get_database)) -> List[schemas.MySubboardWithBoard]:
     board = crud.read_board(database, board_uuid=board_uuid)
     if not board:
         raise HTTPException(status.HTTP_404_NOT_FOUND)
-    if current_user not in board.members:
+    if not crud.read_board_membership(database, board.board_uuid, current_user.user_key):
         raise HTTPException(status.HTTP_401_UNAUTHORIZED)
+    etag_headers = _check_etag(if_none_match, response, _compute_etag(current_user.username, board.board_uuid, board.version))
     available_subboards = crud.read_subboards(database, board_uuid)
     if not available_subboards:
-        raise HTTPException(status.HTTP_204_NO_CONTENT)
+        raise HTTPException(status.HTTP_204_NO_CONTENT, headers=etag_headers)
 
     return available_subboards
 
@@ -306,24 +353,40 @@ def get_my_subboards(board_uuid: str, current_user: models.User=Depends(_get_cur
     board = crud.read_board(database, board_uuid=board_uuid)
     if not board:
         raise HTTPException(status.HTTP_404_NOT_FOUND)
-    if current_user not in board.members:
+    if not crud.read_board_membership(database, board.board_uuid, current_user.user_key):
         raise HTTPException(status.HTTP_401_UNAUTHORIZED)
-    my_subboards = crud.read_my_subboards(database, current_user.username, board_uuid)
+    my_subboards = crud.read_my_subboards(database, current_user.user_key, board_uuid)
     if not my_subboards:
         raise HTTPException(status.HTTP_204_NO_CONTENT)
 
     return my_subboards
 
+@api_router.get("/board/{board_uuid}/my_subboards/changes", response_model=schemas.MySubboardChanges, tags=["subboards"])
+def get_my_subboard_changes(board_uuid: str, since: Optional[int]=None, current_user: models.User=Depends(_get_current_user), database: Session=Depends(_get_database)) -> schemas.MySubboardChanges:
+    board = crud.read_board(database, board_uuid=board_uuid)
+    if not board:
+        raise HTTPException(status.HTTP_404_NOT_FOUND)
+    if not crud.read_board_membership(database, board.board_uuid, current_user.user_key):
+        raise HTTPException(status.HTTP_401_UNAUTHORIZED)
+    next_since, reset, changes = crud.read_my_subboard_changes(database, current_user.user_key, board_uuid, since)
+
+    return {
+        "changes": changes,
+        "next_since": next_since,
+        "reset": reset
+    }
+
 @api_router.post("/board/{board_uuid}/update_my_subboards", tags=["subboards"])
 def update_my_subboards(board_uuid: str, request: schemas.NewMySubboards, current_user: models.User=Depends(_get_current_user), database: Session=Depends(_get_database)):
     board = crud.read_board(database, board_uuid=board_uuid)
     if not board:
         raise HTTPException(status.HTTP_404_NOT_FOUND)
-    if current_user not in board.members:
+    if not crud.read_board_membership(database, board.board_uuid, current_user.user_key):
         raise HTTPException(status.HTTP_401_UNAUTHORIZED)
-    user = crud.update_my_subboards(database, current_user.username, board_uuid, request)
+    user = crud.update_my_subboards(database, current_user, board_uuid, request)
     if not user:
         raise HTTPException(status.HTTP_400_BAD_REQUEST)
+    database.commit()
 
     return status.HTTP_201_CREATED
 
@@ -332,333 +395,568 @@ def get_messages(board_uuid: str, current_user: models.User=Depends(_get_current
     board = crud.read_board(database, board_uuid=board_uuid)
     if not board:
         raise HTTPException(status.HTTP_404_NOT_FOUND)
-    if board.administrator != current_user:
+    if board.administrator_key != current_user.user_key:
         raise HTTPException(status.HTTP_401_UNAUTHORIZED)
-    messages = crud.read_messages(database, board_uuid)
+    messages = payloads.read_messages(database, board)
     if not messages:
         raise HTTPException(status.HTTP_204_NO_CONTENT)
 
-    return messages
+    return ORJSONResponse(messages)
 
-@api_router.post("/board/{board_uuid}/message", tags=["messages"])
-def post_message(board_uuid: str, request: schemas.NewMessage, _request: Request, current_user: models.User=Depends(_get_current_user), database: Session=Depends(_get_database)):
+def _create_message(database: Session, board_uuid: str, request: schemas.NewMessage, _request: Request, idempotency_key: Optional[str], current_user: models.User) -> Tuple[JSONResponse, Optional[models.Message]]:
     board = crud.read_board(database, board_uuid=board_uuid)
     if not board:
         raise HTTPException(status.HTTP_404_NOT_FOUND)
-    if board.administrator != current_user:
+    if board.administrator_key != current_user.user_key:
         raise HTTPException(status.HTTP_401_UNAUTHORIZED)
+    idempotent_response = _claim_idempotency_key(database, current_user.user_key, idempotency_key, _request)
+    if idempotent_response:
+        return idempotent_response, None
     message = crud.create_message(database, board_uuid, request)
     if not message:
         raise HTTPException(status.HTTP_400_BAD_REQUEST)
-    if not message.scheduled_send_time:
-        post_message_from_line_bot(message)
-        _ = crud.update_message_send_time(database, board_uuid, message.message_uuid)
     response = {
         "Location": urllib.parse.urljoin(_request.url._url, f"./message/{message.message_uuid}")
     }
+    # Saved before the deliveries commit, so a repeat never sends to LINE again.
+    idempotency.save_response(database, current_user.user_key, idempotency_key, status.HTTP_201_CREATED, response)
 
-    return JSONResponse(response, status.HTTP_201_CREATED)
+    return JSONResponse(response, status.HTTP_201_CREATED), message
 
-def post_message_from_line_bot(message: schemas.Message) -> None:
+@api_router.post("/board/{board_uuid}/message", tags=["messages"])
+async def post_message(board_uuid: str, request: schemas.NewMessage, _request: Request, idempotency_key: Optional[str]=Header(None), current_user: models.User=Depends(_get_current_user), database: Session=Depends(_get_database)):
+    # Database work runs in the thread pool and the LINE calls are awaited here, so no worker thread waits on LINE.
+    response, message = await run_in_threadpool(_create_message, database, board_uuid, request, _request, idempotency_key, current_user)
+    if not message:
+        return response
+    if not message.scheduled_send_time:
+        await post_message_from_line_bot(database, message)
+        _ = await run_in_threadpool(crud.update_message_send_time, database, message)
+    await run_in_threadpool(database.commit)
+    await events.publish_board_item("message", message.board_uuid, message.message_uuid, [subboard.subboard_uuid for subboard in message.subboards])
+
+    return response
+
+def _read_message_line_user_ids(message: models.Message) -> List[str]:
     line_user_ids = []
     for subboard in message.subboards:
         for member in subboard.members:
             if member.line_user:
                 line_user_ids.append(member.line_user.user_id)
-    line_user_ids = list(set(line_user_ids))
 
-    if line_user_ids:
-        with open("./api/v1/assets/flex_messages/message.json") as f:
-            flex_message = json.load(f)
-        flex_message["body"]["contents"][0]["text"] = message.board.board_name
-        flex_message["body"]["contents"][1]["contents"][0]["contents"][0]["text"] = ", ".join([subboard.subboard_name for subboard in message.subboards])
-        flex_message["body"]["contents"][1]["contents"][1]["contents"][0]["text"] = message.body
-        line_bot_api.multicast(line_user_ids, FlexSendMessage(message.body, flex_message))
+    return list(set(line_user_ids))
+
+@traced
+async def post_message_from_line_bot(database: Session, message: models.Message) -> List[models.MessageDelivery]:
+    line_user_ids = await run_in_threadpool(_read_message_line_user_ids, message)
+
+    return await deliveries.deliver_message(database, line_client, message, line_user_ids)
+
+@api_router.get("/board/{board_uuid}/message/{message_uuid}/deliveries", response_model=List[schemas.MessageDelivery], tags=["messages"])
+def get_message_deliveries(board_uuid: str, message_uuid: str, current_user: models.User=Depends(_get_current_user), database: Session=Depends(_get_database)) -> List[schemas.MessageDelivery]:
+    board = crud.read_board(database, board_uuid=board_uuid)
+    if not board:
+        raise HTTPException(status.HTTP_404_NOT_FOUND)
+    if board.administrator_key != current_user.user_key:
+        raise HTTPException(status.HTTP_401_UNAUTHORIZED)
+    message = crud.read_message(database, board_uuid, message_uuid)
+    if not message:
+        raise HTTPException(status.HTTP_404_NOT_FOUND)
+    message_deliveries = crud.read_message_deliveries(database, message_uuid)
+    if not message_deliveries:
+        raise HTTPException(status.HTTP_204_NO_CONTENT)
+
+    return message_deliveries
+
+def _read_administered_message(database: Session, board_uuid: str, message_uuid: str, current_user: models.User) -> models.Message:
+    board = crud.read_board(database, board_uuid=board_uuid)
+    if not board:
+        raise HTTPException(status.HTTP_404_NOT_FOUND)
+    if board.administrator_key != current_user.user_key:
+        raise HTTPException(status.HTTP_401_UNAUTHORIZED)
+    message = crud.read_message(database, board_uuid, message_uuid)
+    if not message:
+        raise HTTPException(status.HTTP_404_NOT_FOUND)
+
+    return message
+
+@api_router.post("/board/{board_uuid}/message/{message_uuid}/deliveries/replay", response_model=List[schemas.MessageDelivery], tags=["messages"])
+async def replay_message_deliveries(board_uuid: str, message_uuid: str, current_user: models.User=Depends(_get_current_user), database: Session=Depends(_get_database)) -> List[schemas.MessageDelivery]:
+    message = await run_in_threadpool(_read_administered_message, database, board_uuid, message_uuid, current_user)
+    message_deliveries = await deliveries.replay_message_deliveries(database, line_client, message)
+    await run_in_threadpool(database.commit)
+    if not message_deliveries:
+        raise HTTPException(status.HTTP_204_NO_CONTENT)
+
+    return message_deliveries
+
+@api_router.get("/board/{board_uuid}/dead_letter_deliveries", response_model=List[schemas.MessageDelivery], tags=["messages"])
+def get_dead_letter_deliveries(board_uuid: str, current_user: models.User=Depends(_get_current_user), database: Session=Depends(_get_database)) -> List[schemas.MessageDelivery]:
+    board = crud.read_board(database, board_uuid=board_uuid)
+    if not board:
+        raise HTTPException(status.HTTP_404_NOT_FOUND)
+    if board.administrator_key != current_user.user_key:
+        raise HTTPException(status.HTTP_401_UNAUTHORIZED)
+    dead_letter_deliveries = crud.read_dead_letter_message_deliveries(database, board_uuid)
+    if not dead_letter_deliveries:
+        raise HTTPException(status.HTTP_204_NO_CONTENT)
+
+    return dead_letter_deliveries
 
 @api_router.delete("/board/{board_uuid}/message/{message_uuid}", tags=["messages"])
 def delete_message(board_uuid: str, message_uuid: str, current_user: models.User=Depends(_get_current_user), database: Session=Depends(_get_database)):
     board = crud.read_board(database, board_uuid=board_uuid)
     if not board:
         raise HTTPException(status.HTTP_404_NOT_FOUND)
-    if board.administrator != current_user:
+    if board.administrator_key != current_user.user_key:
         raise HTTPException(status.HTTP_401_UNAUTHORIZED)
     message = crud.read_message(database, board_uuid, message_uuid)
     if not message:
         raise HTTPException(status.HTTP_404_NOT_FOUND)
-    if message.board.administrator != current_user:
+    if message.board.administrator_key != current_user.user_key:
         raise HTTPException(status.HTTP_401_UNAUTHORIZED)
-    message = crud.delete_message(database, board_uuid, message_uuid)
+    message = crud.delete_message(database, message)
     if not message:
         raise HTTPException(status.HTTP_400_BAD_REQUEST)
+    database.commit()
 
     return status.HTTP_200_OK
 
+@api_router.post("/board/{board_uuid}/mark_read", tags=["messages"])
+def mark_board_read(board_uuid: str, request: Optional[schemas.NewBoardReadCursor]=None, current_user: models.User=Depends(_get_current_user), database: Session=Depends(_get_database)):
+    board = crud.read_board(database, board_uuid=board_uuid)
+    if not board:
+        raise HTTPException(status.HTTP_404_NOT_FOUND)
+    if not crud.read_board_membership(database, board.board_uuid, current_user.user_key):
+        raise HTTPException(status.HTTP_401_UNAUTHORIZED)
+    message = None
+    if request and request.message_uuid:
+        message = crud.read_message(database, board_uuid, request.message_uuid)
+        if not message:
+            raise HTTPException(status.HTTP_404_NOT_FOUND)
+    crud.update_board_read_cursor(database, current_user.user_key, board_uuid, message)
+    database.commit()
+
+    return status.HTTP_201_CREATED
+
 @api_router.get("/board/{board_uuid}/my_messages", response_model=List[schemas.Message], tags=["messages"])
 def get_my_messages(board_uuid: str, current_user: models.User=Depends(_get_current_user), database: Session=Depends(_get_database)) -> List[schemas.Message]:
     board = crud.read_board(database, board_uuid=board_uuid)
     if not board:
         raise HTTPException(status.HTTP_404_NOT_FOUND)
-    if current_user not in board.members:
+    if not crud.read_board_membership(database, board.board_uuid, current_user.user_key):
         raise HTTPException(status.HTTP_401_UNAUTHORIZED)
-    my_messages = crud.read_my_messages(database, current_user.username, board_uuid)
+    my_messages = crud.read_my_messages(database, current_user.user_key, board_uuid)
     if not my_messages:
         raise HTTPException(status.HTTP_204_NO_CONTENT)
 
-    return my_messages
+    return ORJSONResponse(payloads.build_messages(my_messages))
+
+@api_router.get("/board/{board_uuid}/my_events/negotiate", response_model=schemas.EventsConnection, tags=["messages"])
+def get_my_events_connection(board_uuid: str, current_user: models.User=Depends(_get_current_user), database: Session=Depends(_get_database)) -> schemas.EventsConnection:
+    if not events.EVENTS_ENABLED:
+        raise HTTPException(status.HTTP_503_SERVICE_UNAVAILABLE)
+    board = crud.read_board(database, board_uuid=board_uuid)
+    if not board:
+        raise HTTPException(status.HTTP_404_NOT_FOUND)
+    if not crud.read_board_membership(database, board.board_uuid, current_user.user_key):
+        raise HTTPException(status.HTTP_401_UNAUTHORIZED)
+    my_subboards = crud.read_my_subboards(database, current_user.user_key, board_uuid)
+
+    return {
+        "url": events.create_client_access_url(current_user, [my_subboard.subboard_uuid for my_subboard in my_subboards]),
+        "expires_in": events.EVENTS_TOKEN_TTL
+    }
+
+@api_router.get("/board/{board_uuid}/my_messages/changes", response_model=schemas.MessageChanges, tags=["messages"])
+def get_my_message_changes(board_uuid: str, since: Optional[int]=None, current_user: models.User=Depends(_get_current_user), database: Session=Depends(_get_database)) -> schemas.MessageChanges:
+    board = crud.read_board(database, board_uuid=board_uuid)
+    if not board:
+        raise HTTPException(status.HTTP_404_NOT_FOUND)
+    if not crud.read_board_membership(database, board.board_uuid, current_user.user_key):
+        raise HTTPException(status.HTTP_401_UNAUTHORIZED)
+    next_since, reset, changes = crud.read_my_message_changes(database, current_user.user_key, board_uuid, since)
+
+    return {
+        "changes": changes,
+        "next_since": next_since,
+        "reset": reset
+    }
 
 @api_router.get("/direct_messages", response_model=List[schemas.DirectMessage], tags=["direct_messages"])
 def get_direct_messages(current_user: models.User=Depends(_get_current_user), database: Session=Depends(_get_database)) -> List[schemas.DirectMessage]:
-    direct_messages = crud.read_direct_messages(database, current_user.username)
+    direct_messages = crud.read_direct_messages(database, current_user.user_key)
     if not direct_messages:
         raise HTTPException(status.HTTP_204_NO_CONTENT)
 
     return direct_messages
 
-@api_router.post("/direct_message", tags=["direct_messages"])
-def post_direct_message(request: schemas.NewDirectMessage, _request: Request, current_user: models.User=Depends(_get_current_user), database: Session=Depends(_get_database)):
-    direct_message = crud.create_direct_message(database, current_user.username, request)
-    if not direct_message:
+@api_router.get("/direct_messages/changes", response_model=schemas.DirectMessageChanges, tags=["direct_messages"])
+def get_direct_message_changes(since: Optional[int]=None, current_user: models.User=Depends(_get_current_user), database: Session=Depends(_get_database)) -> schemas.DirectMessageChanges:
+    next_since, reset, changes = crud.read_direct_message_changes(database, current_user.user_key, since)
+
+    return {
+        "changes": changes,
+        "next_since": next_since,
+        "reset": reset
+    }
+
+def _create_direct_messages(database: Session, request: schemas.NewDirectMessage, _request: Request, idempotency_key: Optional[str], current_user: models.User) -> Tuple[JSONResponse, List[models.DirectMessage]]:
+    idempotent_response = _claim_idempotency_key(database, current_user.user_key, idempotency_key, _request)
+    if idempotent_response:
+        return idempotent_response, []
+    direct_messages = crud.create_direct_message(database, current_user, request)
+    if not direct_messages:
         raise HTTPException(status.HTTP_400_BAD_REQUEST)
-    if not direct_message.scheduled_send_time:
-        post_direct_message_from_line_bot(direct_message)
-        _ = crud.update_direct_message_send_time(database, direct_message.direct_message_uuid)
     response = {
-        "Location": urllib.parse.urljoin(_request.url._url, f"./direct_message/{direct_message.direct_message_uuid}")
+        "Location": urllib.parse.urljoin(_request.url._url, f"./conversation/{direct_messages[0].conversation_uuid}")
     }
+    # Saved before the deliveries commit, so a repeat never pushes to LINE again; a failed push is left to the retry timer.
+    idempotency.save_response(database, current_user.user_key, idempotency_key, status.HTTP_201_CREATED, response)
 
-    return JSONResponse(response, status.HTTP_201_CREATED)
+    return JSONResponse(response, status.HTTP_201_CREATED), direct_messages
+
+def _update_direct_message_send_times(database: Session, direct_messages: List[models.DirectMessage]) -> None:
+    for direct_message in direct_messages:
+        _ = crud.update_direct_message_send_time(database, direct_message)
+
+@api_router.post("/direct_message", tags=["direct_messages"])
+async def post_direct_message(request: schemas.NewDirectMessage, _request: Request, idempotency_key: Optional[str]=Header(None), current_user: models.User=Depends(_get_current_user), database: Session=Depends(_get_database)):
+    response, direct_messages = await run_in_threadpool(_create_direct_messages, database, request, _request, idempotency_key, current_user)
+    if not direct_messages:
+        return response
+    if not request.scheduled_send_time:
+        await post_direct_message_from_line_bot(database, direct_messages)
+        await run_in_threadpool(_update_direct_message_send_times, database, direct_messages)
+    await run_in_threadpool(database.commit)
+    await events.publish_direct_messages(direct_messages)
+
+    return response
 
-def post_direct_message_from_line_bot(direct_message: schemas.DirectMessage) -> None:
-    if direct_message.send_to.line_user:
-        with open("./api/v1/assets/flex_messages/direct_message.json") as f:
-            flex_message = json.load(f)
-        flex_message["body"]["contents"][0]["text"] = direct_message.send_from.display_name if direct_message.send_from.display_name else direct_message.send_from.username
-        flex_message["body"]["contents"][1]["contents"][0]["contents"][0]["text"] = direct_message.body
-        line_bot_api.push_message(
-            direct_message.send_to.line_user.user_id,
-            FlexSendMessage(direct_message.body, flex_message)
-        )
+@traced
+async def post_direct_message_from_line_bot(database: Session, direct_messages: List[models.DirectMessage]) -> List[models.DirectMessageDelivery]:
+    return await deliveries.deliver_direct_messages(database, line_client, direct_messages)
 
 @api_router.delete("/direct_message/{direct_message_uuid}", tags=["direct_messages"])
 def delete_direct_message(direct_message_uuid: str, current_user: models.User=Depends(_get_current_user), database: Session=Depends(_get_database)):
     direct_message = crud.read_direct_message(database, direct_message_uuid)
     if not direct_message:
         raise HTTPException(status.HTTP_404_NOT_FOUND)
-    if direct_message.send_from != current_user:
+    if direct_message.send_from_key != current_user.user_key:
         raise HTTPException(status.HTTP_401_UNAUTHORIZED)
-    direct_message = crud.delete_direct_message(database, direct_message_uuid)
+    direct_message = crud.delete_direct_message(database, direct_message)
     if not direct_message:
         raise HTTPException(status.HTTP_400_BAD_REQUEST)
+    database.commit()
 
     return status.HTTP_200_OK
 
 @api_router.get("/my_direct_messages", response_model=List[schemas.DirectMessage], tags=["direct_messages"])
 def get_my_direct_messages(current_user: models.User=Depends(_get_current_user), database: Session=Depends(_get_database)) -> List[schemas.DirectMessage]:
-    my_direct_messages = crud.read_my_direct_messages(database, current_user.username)
+    my_direct_messages = crud.read_my_direct_messages(database, current_user.user_key)
     if not my_direct_messages:
         raise HTTPException(status.HTTP_204_NO_CONTENT)
 
     return my_direct_messages
 
+@api_router.get("/my_unread_counts", response_model=schemas.UnreadCounts, tags=["users"])
+def get_my_unread_counts(response: Response, if_none_match: Optional[str]=Header(None), current_user: models.User=Depends(_get_current_user), database: Session=Depends(_get_database)) -> schemas.UnreadCounts:
+    board_read_cursors, conversation_members = crud.read_unread_counts(database, current_user.user_key)
+    boards = sorted((board_read_cursor.board_uuid, board_read_cursor.unread_count) for board_read_cursor in board_read_cursors)
+    conversations = sorted((conversation_member.conversation_uuid, conversation_member.unread_count) for conversation_member in conversation_members)
+    # Badge polls are answered from the counters alone, and unchanged counts cost a 304.
+    _check_etag(if_none_match, response, _compute_etag(current_user.username, boards, conversations))
+
+    return {
+        "boards": [{"board_uuid": board_uuid, "unread_count": unread_count} for board_uuid, unread_count in boards],
+        "conversations": [{"conversation_uuid": conversation_uuid, "unread_count": unread_count} for conversation_uuid, unread_count in conversations],
+        "total_unread_count": sum(unread_count for _, unread_count in boards + conversations)
+    }
+
+@api_router.get("/conversations", response_model=List[schemas.Conversation], tags=["direct_messages"])
+def get_conversations(current_user: models.User=Depends(_get_current_user), database: Session=Depends(_get_database)) -> List[schemas.Conversation]:
+    conversations = crud.read_conversations(database, current_user.user_key)
+    if not conversations:
+        raise HTTPException(status.HTTP_204_NO_CONTENT)
+
+    return conversations
+
+@api_router.get("/conversation/{conversation_uuid}", response_model=List[schemas.DirectMessage], tags=["direct_messages"])
+def get_conversation(conversation_uuid: str, current_user: models.User=Depends(_get_current_user), database: Session=Depends(_get_database)) -> List[schemas.DirectMessage]:
+    conversation = crud.read_conversation(database, current_user.user_key, conversation_uuid)
+    if not conversation:
+        raise HTTPException(status.HTTP_404_NOT_FOUND)
+    direct_messages = crud.read_conversation_direct_messages(database, conversation_uuid)
+    if not direct_messages:
+        raise HTTPException(status.HTTP_204_NO_CONTENT)
+
+    return direct_messages
+
+@api_router.post("/conversation/{conversation_uuid}/mark_read", tags=["direct_messages"])
+def mark_conversation_read(conversation_uuid: str, request: Optional[schemas.NewConversationReadCursor]=None, current_user: models.User=Depends(_get_current_user), database: Session=Depends(_get_database)):
+    conversation = crud.read_conversation(database, current_user.user_key, conversation_uuid)
+    if not conversation:
+        raise HTTPException(status.HTTP_404_NOT_FOUND)
+    direct_message = None
+    if request and request.direct_message_uuid:
+        direct_message = crud.read_direct_message(database, request.direct_message_uuid)
+        if not direct_message or direct_message.conversation_uuid != conversation_uuid:
+            raise HTTPException(status.HTTP_404_NOT_FOUND)
+    _ = crud.update_conversation_read_cursor(database, conversation, direct_message)
+    database.commit()
+
+    return status.HTTP_201_CREATED
+
 @api_router.get("/board/{board_uuid}/forms", response_model=List[schemas.Form], tags=["forms"])
 def get_forms(board_uuid: str, current_user: models.User=Depends(_get_current_user), database: Session=Depends(_get_database)) -> List[schemas.Form]:
     board = crud.read_board(database, board_uuid=board_uuid)
     if not board:
         raise HTTPException(status.HTTP_404_NOT_FOUND)
-    if board.administrator != current_user:
+    if board.administrator_key != current_user.user_key:
         raise HTTPException(status.HTTP_401_UNAUTHORIZED)
-    forms = crud.read_forms(database, board_uuid)
+    forms = payloads.read_forms(database, board)
     if not forms:
         raise HTTPException(status.HTTP_204_NO_CONTENT)
 
-    return forms
+    return ORJSONResponse(forms)
 
-@api_router.post("/board/{board_uuid}/form", tags=["forms"])
-def post_form(board_uuid: str, request: schemas.NewForm, _request: Request, current_user: models.User=Depends(_get_current_user), database: Session=Depends(_get_database)):
+def _create_form(database: Session, board_uuid: str, request: schemas.NewForm, _request: Request, idempotency_key: Optional[str], current_user: models.User) -> Tuple[JSONResponse, Optional[models.Form]]:
     board = crud.read_board(database, board_uuid=board_uuid)
     if not board:
         raise HTTPException(status.HTTP_404_NOT_FOUND)
-    if board.administrator != current_user:
+    if board.administrator_key != current_user.user_key:
         raise HTTPException(status.HTTP_401_UNAUTHORIZED)
+    idempotent_response = _claim_idempotency_key(database, current_user.user_key, idempotency_key, _request)
+    if idempotent_response:
+        return idempotent_response, None
     form = crud.create_form(database, board_uuid, request)
     if not form:
         raise HTTPException(status.HTTP_400_BAD_REQUEST)
     response = {
         "Location": urllib.parse.urljoin(_request.url._url, f"./form/{form.form_uuid}")
     }
+    idempotency.save_response(database, current_user.user_key, idempotency_key, status.HTTP_201_CREATED, response)
+    database.commit()
 
-    return JSONResponse(response, status.HTTP_201_CREATED)
+    return JSONResponse(response, status.HTTP_201_CREATED), form
+
+@api_router.post("/board/{board_uuid}/form", tags=["forms"])
+async def post_form(board_uuid: str, request: schemas.NewForm, _request: Request, idempotency_key: Optional[str]=Header(None), current_user: models.User=Depends(_get_current_user), database: Session=Depends(_get_database)):
+    response, form = await run_in_threadpool(_create_form, database, board_uuid, request, _request, idempotency_key, current_user)
+    if form:
+        await events.publish_board_item("form", form.board_uuid, form.form_uuid, [subboard.subboard_uuid for subboard in form.subboards])
+
+    return response
 
 @api_router.delete("/board/{board_uuid}/form/{form_uuid}", tags=["forms"])
 def delete_form(board_uuid: str, form_uuid: str, current_user: models.User=Depends(_get_current_user), database: Session=Depends(_get_database)):
     board = crud.read_board(database, board_uuid=board_uuid)
     if not board:
         raise HTTPException(status.HTTP_404_NOT_FOUND)
-    if board.administrator != current_user:
+    if board.administrator_key != current_user.user_key:
         raise HTTPException(status.HTTP_401_UNAUTHORIZED)
     form = crud.read_form(database, board_uuid, form_uuid)
     if not form:
         raise HTTPException(status.HTTP_404_NOT_FOUND)
-    form = crud.delete_form(database, board_uuid, form_uuid)
+    form = crud.delete_form(database, form)
     if not form:
         raise HTTPException(status.HTTP_404_NOT_FOUND)
+    database.commit()
 
     return status.HTTP_200_OK
 
 @api_router.get("/board/{board_uuid}/my_forms", response_model=List[schemas.MyForm], tags=["forms"])
-def get_my_forms(board_uuid: str, current_user: models.User=Depends(_get_current_user), database: Session=Depends(_get_database)) -> List[schemas.MyForm]:
+def get_my_forms(board_uuid: str, response: Response, if_none_match: Optional[str]=Header(None), current_user: models.User=Depends(_get_current_user), database: Session=Depends(_get_database)) -> List[schemas.MyForm]:
     board = crud.read_board(database, board_uuid=board_uuid)
     if not board:
         raise HTTPException(status.HTTP_404_NOT_FOUND)
-    if current_user not in board.members:
+    if not crud.read_board_membership(database, board.board_uuid, current_user.user_key):
         raise HTTPException(status.HTTP_401_UNAUTHORIZED)
-    my_forms = crud.read_my_forms(database, current_user.username, board_uuid)
+    etag_headers = _check_etag(if_none_match, response, _compute_etag(current_user.username, board.board_uuid, board.version))
+    my_forms = crud.read_my_forms(database, current_user.user_key, board_uuid)
     if not my_forms:
-        raise HTTPException(status.HTTP_204_NO_CONTENT)
+        raise HTTPException(status.HTTP_204_NO_CONTENT, headers=etag_headers)
 
     return my_forms
 
+@api_router.get("/board/{board_uuid}/my_forms/changes", response_model=schemas.MyFormChanges, tags=["forms"])
+def get_my_form_changes(board_uuid: str, since: Optional[int]=None, current_user: models.User=Depends(_get_current_user), database: Session=Depends(_get_database)) -> schemas.MyFormChanges:
+    board = crud.read_board(database, board_uuid=board_uuid)
+    if not board:
+        raise HTTPException(status.HTTP_404_NOT_FOUND)
+    if not crud.read_board_membership(database, board.board_uuid, current_user.user_key):
+        raise HTTPException(status.HTTP_401_UNAUTHORIZED)
+    next_since, reset, changes = crud.read_my_form_changes(database, current_user.user_key, board_uuid, since)
+
+    return {
+        "changes": changes,
+        "next_since": next_since,
+        "reset": reset
+    }
+
+@api_router.get("/board/{board_uuid}/form/{form_uuid}/form_responses/export", response_class=StreamingResponse, tags=["forms"])
+def get_form_responses_export(board_uuid: str, form_uuid: str, export_format: str="csv", after: Optional[str]=None, current_user: models.User=Depends(_get_current_user), database: Session=Depends(_get_database)) -> StreamingResponse:
+    if export_format not in exports.EXPORT_FORMATS:
+        raise HTTPException(status.HTTP_400_BAD_REQUEST)
+    board = crud.read_board(database, board_uuid=board_uuid)
+    if not board:
+        raise HTTPException(status.HTTP_404_NOT_FOUND)
+    if board.administrator_key != current_user.user_key:
+        raise HTTPException(status.HTTP_401_UNAUTHORIZED)
+    form = crud.read_form(database, board_uuid, form_uuid)
+    if not form:
+        raise HTTPException(status.HTTP_404_NOT_FOUND)
+    until = crud.read_form_response_page_end(database, form_uuid, after, exports.EXPORT_MAX_RESPONSES)
+    bind = database.get_bind()
+    # The export streams from its own session, so the request's connection goes back to the pool before it starts.
+    database.close()
+    headers = {
+        "Content-Disposition": f'attachment; filename="{form_uuid}.{export_format}"'
+    }
+    # Larger forms are exported in pages; the next one is requested with after set to this header.
+    if until:
+        headers[exports.EXPORT_NEXT_AFTER_HEADER] = until
+
+    return StreamingResponse(exports.stream_form_responses(bind, form_uuid, export_format, after, until), media_type=exports.EXPORT_FORMATS[export_format], headers=headers)
+
 @api_router.get("/board/{board_uuid}/form/{form_uuid}/my_form_responses", response_model=List[schemas.FormResponse], tags=["forms"])
 def get_my_form_responses(board_uuid: str, form_uuid, current_user: models.User=Depends(_get_current_user), database: Session=Depends(_get_database)) -> List[schemas.FormResponse]:
     board = crud.read_board(database, board_uuid=board_uuid)
     if not board:
         raise HTTPException(status.HTTP_404_NOT_FOUND)
-    if current_user not in board.members:
+    if not crud.read_board_membership(database, board.board_uuid, current_user.user_key):
         raise HTTPException(status.HTTP_401_UNAUTHORIZED)
     form = crud.read_form(database, board_uuid, form_uuid)
     if not form:
         raise HTTPException(status.HTTP_404_NOT_FOUND)
-    my_form_responses = crud.read_my_form_responses(database, current_user.username, form_uuid)
+    my_form_responses = crud.read_my_form_responses(database, current_user.user_key, form_uuid)
     if not my_form_responses:
         raise HTTPException(status.HTTP_204_NO_CONTENT)
 
     return my_form_responses
 
 @api_router.post("/board/{board_uuid}/form/{form_uuid}/my_form_response", tags=["forms"])
-def post_my_form_response(board_uuid: str, form_uuid: str, request: schemas.NewMyFormResponse, current_user: models.User=Depends(_get_current_user), database: Session=Depends(_get_database)):
+def post_my_form_response(board_uuid: str, form_uuid: str, request: schemas.NewMyFormResponse, _request: Request, idempotency_key: Optional[str]=Header(None), current_user: models.User=Depends(_get_current_user), database: Session=Depends(_get_database)):
     board = crud.read_board(database, board_uuid=board_uuid)
     if not board:
         raise HTTPException(status.HTTP_404_NOT_FOUND)
-    if current_user not in board.members:
+    if not crud.read_board_membership(database, board.board_uuid, current_user.user_key):
         raise HTTPException(status.HTTP_401_UNAUTHORIZED)
     form = crud.read_form(database, board_uuid, form_uuid)
     if not form:
         raise HTTPException(status.HTTP_404_NOT_FOUND)
-    my_form_response = crud.create_my_form_response(database, current_user.username, form_uuid, request)
+    idempotent_response = _claim_idempotency_key(database, current_user.user_key, idempotency_key, _request)
+    if idempotent_response:
+        return idempotent_response
+    my_form_response = crud.create_my_form_response(database, current_user.user_key, form_uuid, request)
     if not my_form_response:
         raise HTTPException(status.HTTP_400_BAD_REQUEST)
+    idempotency.save_response(database, current_user.user_key, idempotency_key, status.HTTP_200_OK, status.HTTP_201_CREATED)
+    database.commit()
 
     return status.HTTP_201_CREATED
 
-@web_hook_handler.add(MessageEvent, message=TextMessage)
-def handle_message_event(event: MessageEvent):
-    with _get_database_with_contextmanager() as database:
-        if event.message.text == "サインアップ":
-            line_user = crud.read_line_user(database, event.source.user_id)
-            if not line_user:
-                line_user = crud.create_line_user(database, event.source.user_id)
-            if line_user:
-                user = crud.read_user(database, line_user_id=event.source.user_id)
-                if user:
-                    line_bot_api.push_message(
-                        event.source.user_id,
-                        TextSendMessage(f"{user.display_name if user.display_name else user.username}さんでサインインしました。")
-                    )
-                else:
-                    signup_url = f"https://orange-sand-0f913e000.3.azurestaticapps.net/paticipant/signup?line_user_uuid={line_user.line_user_uuid}"
-                    line_bot_api.push_message(
-                        event.source.user_id,
-                        TextSendMessage(f"{signup_url} でサインアップします。")
-                    )
-        elif event.message.text == "ボード設定":
-            user = crud.read_user(database, line_user_id=event.source.user_id)
-            if user:
-                line_message_context = crud.read_line_message_context(database, user.line_user_uuid)
-                if not line_message_context:
-                    line_message_context = crud.create_line_message_context(database, user.line_user_uuid, "ボード設定")
-                else:
-                    line_message_context = crud.update_line_message_context(database, user.line_user_uuid, "ボード設定")
-                if line_message_context:
-                    line_bot_api.push_message(
-                        event.source.user_id,
-                        TextSendMessage("1: 入っているボードを表示する\n2: ボードに入る/ボードから出る")
-                    )
-        elif event.message.text == "サブボード設定":
-            user = crud.read_user(database, line_user_id=event.source.user_id)
+def _push_board_settings_menu(database: Session, line_session: schemas.LINESession, text: str) -> LINEPushes:
+    return [(line_session.line_user_id, TextSendMessage("1: 入っているボードを表示する\n2: ボードに入る/ボードから出る"))]
+
+def _push_board_id_prompt(database: Session, line_session: schemas.LINESession, text: str) -> LINEPushes:
+    return [(line_session.line_user_id, TextSendMessage("ボードID:"))]
+
+def _push_my_boards(database: Session, line_session: schemas.LINESession, text: str) -> LINEPushes:
+    my_boards = crud.read_my_boards(database, line_session.user_key)
+    with open("./api/v1/assets/flex_messages/boards.json") as f:
+        flex_message = json.load(f)
+    if len(my_boards) > 0:
+        for _ in range(len(my_boards) - 1):
+            flex_message["body"]["contents"][1]["contents"].append(copy.deepcopy(flex_message["body"]["contents"][1]["contents"][0]))
+        for i, my_board in enumerate(my_boards):
+            flex_message["body"]["contents"][1]["contents"][i]["contents"][0]["text"] = my_board.board_id
+            flex_message["body"]["contents"][1]["contents"][i]["contents"][1]["text"] = my_board.board_name
+    else:
+        flex_message["body"]["contents"][1]["contents"][0]["contents"][0]["text"] = "入っているボードはありません"
+        flex_message["body"]["contents"][1]["contents"][0]["contents"][1]["text"] = "入っているボードはありません"
+
+    return [(line_session.line_user_id, FlexSendMessage("入っているボード", flex_message))]
+
+def _join_or_leave_board(database: Session, line_session: schemas.LINESession, text: str) -> LINEPushes:
+    board = crud.read_board(database, board_id=text)
+    if board:
+        my_boards = crud.read_my_boards(database, line_session.user_key)
+        new_my_board_ids = [my_board.board_id for my_board in my_boards]
+        if board.board_id not in new_my_board_ids:
+            new_my_board_ids.append(board.board_id)
+            user = crud.update_my_boards(database, crud.read_user(database, username=line_session.username), schemas.NewMyBoards(new_my_board_ids=new_my_board_ids))
+            database.commit()
             if user:
-                line_message_context = crud.read_line_message_context(database, user.line_user_uuid)
-                if not line_message_context:
-                    line_message_context = crud.create_line_message_context(database, user.line_user_uuid, "サブボード設定")
-                else:
-                    line_message_context = crud.update_line_message_context(database, user.line_user_uuid, "サブボード設定")
-                if line_message_context:
-                    line_bot_api.push_message(
-                        event.source.user_id,
-                        TextSendMessage("ボードID:")
-                    )
+                return [(line_session.line_user_id, TextSendMessage(f'ボード "{board.board_name}" に入りました。'))]
         else:
-            user = crud.read_user(database, line_user_id=event.source.user_id)
+            new_my_board_ids.remove(board.board_id)
+            user = crud.update_my_boards(database, crud.read_user(database, username=line_session.username), schemas.NewMyBoards(new_my_board_ids=new_my_board_ids))
+            database.commit()
             if user:
-                line_message_context = crud.read_line_message_context(database, user.line_user_uuid)
-                if line_message_context:
-                    if line_message_context.message_context == "ボード設定":
-                        if event.message.text == "1":
-                            line_message_context = crud.update_line_message_context(database, user.line_user_uuid, None)
-                            if line_message_context:
-                                with open("./api/v1/assets/flex_messages/boards.json") as f:
-                                    flex_message = json.load(f)
-                                if len(user.my_boards) > 0:
-                                    for _ in range(len(user.my_boards) - 1):
-                                        flex_message["body"]["contents"][1]["contents"].append(copy.deepcopy(flex_message["body"]["contents"][1]["contents"][0]))
-                                    for i, my_board in enumerate(user.my_boards):
-                                        flex_message["body"]["contents"][1]["contents"][i]["contents"][0]["text"] = my_board.board_id
-                                        flex_message["body"]["contents"][1]["contents"][i]["contents"][1]["text"] = my_board.board_name
-                                else:
-                                    flex_message["body"]["contents"][1]["contents"][0]["contents"][0]["text"] = "入っているボードはありません"
-                                    flex_message["body"]["contents"][1]["contents"][0]["contents"][1]["text"] = "入っているボードはありません"
-                                line_bot_api.push_message(
-                                    event.source.user_id,
-                                    FlexSendMessage("入っているボード", flex_message)
-                                )
-                        elif event.message.text == "2":
-                            line_message_context = crud.update_line_message_context(database, user.line_user_uuid, "ボードに入る/ボードから出る")
-                            if line_message_context:
-                                line_bot_api.push_message(
-                                    event.source.user_id,
-                                    TextSendMessage("ボードID:")
-                                )
-                    elif line_message_context.message_context == "ボードに入る/ボードから出る":
-                        line_message_context = crud.update_line_message_context(database, user.line_user_uuid, None)
-                        if line_message_context:
-                            board = crud.read_board(database, board_id=event.message.text)
-                            if board:
-                                my_boards = crud.read_my_boards(database, user.username)
-                                new_my_board_ids = [my_board.board_id for my_board in my_boards]
-                                if board.board_id not in new_my_board_ids:
-                                    new_my_board_ids.append(board.board_id)
-                                    user = crud.update_my_boards(database, user.username, schemas.NewMyBoards(new_my_board_ids=new_my_board_ids))
-                                    if user:
-                                        line_bot_api.push_message(
-                                            event.source.user_id,
-                                            TextSendMessage(f'ボード "{board.board_name}" に入りました。')
-                                        )
-                                else:
-                                    new_my_board_ids.remove(board.board_id)
-                                    user = crud.update_my_boards(database, user.username, schemas.NewMyBoards(new_my_board_ids=new_my_board_ids))
-                                    if user:
-                                        line_bot_api.push_message(
-                                            event.source.user_id,
-                                            TextSendMessage(f'ボード "{board.board_name}" から出ました。')
-                                        )
-                    elif line_message_context.message_context == "サブボード設定":
-                        line_message_context = crud.update_line_message_context(database, user.line_user_uuid, None)
-                        if line_message_context:
-                            board = crud.read_board(database, board_id=event.message.text)
-                            if board:
-                                my_boards = crud.read_my_boards(database, user.username)
-                                if board.board_id in [my_board.board_id for my_board in my_boards]:
-                                    update_my_subboards_url = f"https://orange-sand-0f913e000.3.azurestaticapps.net/paticipant/boardregistration/{board.board_uuid}"
-                                    line_bot_api.push_message(
-                                        event.source.user_id,
-                                        TextSendMessage(f'{update_my_subboards_url} でサブボードに入る/サブボードから出ることができます。')
-                                    )
+                return [(line_session.line_user_id, TextSendMessage(f'ボード "{board.board_name}" から出ました。'))]
+
+    return []
+
+def _push_update_my_subboards_url(database: Session, line_session: schemas.LINESession, text: str) -> LINEPushes:
+    board = crud.read_board(database, board_id=text)
+    if board:
+        my_boards = crud.read_my_boards(database, line_session.user_key)
+        if board.board_id in [my_board.board_id for my_board in my_boards]:
+            update_my_subboards_url = f"https://orange-sand-0f913e000.3.azurestaticapps.net/paticipant/boardregistration/{board.board_uuid}"
+            return [(line_session.line_user_id, TextSendMessage(f'{update_my_subboards_url} でサブボードに入る/サブボードから出ることができます。'))]
+
+    return []
+
+# (text) -> (next message context, action), accepted in any message context.
+_LINE_COMMANDS = {
+    "ボード設定": ("ボード設定", _push_board_settings_menu),
+    "サブボード設定": ("サブボード設定", _push_board_id_prompt)
+}
+
+# (message context, text) -> (next message context, action). A text of None matches any text.
+_LINE_MESSAGE_CONTEXT_TRANSITIONS = {
+    ("ボード設定", "1"): (None, _push_my_boards),
+    ("ボード設定", "2"): ("ボードに入る/ボードから出る", _push_board_id_prompt),
+    ("ボードに入る/ボードから出る", None): (None, _join_or_leave_board),
+    ("サブボード設定", None): (None, _push_update_my_subboards_url)
+}
+
+def _update_line_message_context(database: Session, line_session: schemas.LINESession, message_context: Optional[str]) -> bool:
+    if line_session.message_context == message_context:
+        return True
+    if line_session.has_message_context:
+        # Keyed on the context the transition was chosen from, so an event handled meanwhile is not overwritten.
+        updated = crud.update_line_message_context(database, line_session.line_user_uuid, line_session.message_context, message_context)
+    else:
+        updated = crud.create_line_message_context(database, line_session.line_user_uuid, message_context) is not None
+    database.commit()
+    if not updated:
+        return False
+    line_session.message_context = message_context
+    line_session.has_message_context = True
+
+    return True
+
+@traced
+def handle_message_event(event: MessageEvent) -> LINEPushes:
+    with _get_database_with_contextmanager() as database:
+        if event.message.text == "サインアップ":
+            return _sign_in_line_user(database, event.source.user_id)
+        # A context changed by another event since it was read is read again, and the transition chosen from that.
+        for _ in range(2):
+            line_session = crud.read_line_session(database, event.source.user_id)
+            if not line_session or not line_session.user_uuid:
+                return []
+            transition = _LINE_COMMANDS.get(event.message.text)
+            if not transition:
+                transition = _LINE_MESSAGE_CONTEXT_TRANSITIONS.get((line_session.message_context, event.message.text))
+            if not transition:
+                transition = _LINE_MESSAGE_CONTEXT_TRANSITIONS.get((line_session.message_context, None))
+            if not transition:
+                return []
+            message_context, action = transition
+            if _update_line_message_context(database, line_session, message_context):
+                return action(database, line_session, event.message.text)
+
+        return []
@@ -0,0 +1,179 @@
+from bisect import bisect_left
+from threading import Lock
+import time
+from typing import Callable, Dict, List, Tuple
+
+from sqlalchemy.engine import Engine
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 7.5, 10.0)
+
+
+def _format_labels(label_names: Tuple[str, ...], label_values: Tuple[str, ...], extra: str="") -> str:
+    labels = [f'{name}="{value}"' for name, value in zip(label_names, label_values)]
+    if extra:
+        labels.append(extra)
+    if not labels:
+        return ""
+
+    return "{" + ",".join(labels) + "}"
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+
+    return repr(float(value))
+
+
+class Counter:
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, label_names: Tuple[str, ...]=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = Lock()
+
+    def inc(self, *label_values: str, amount: float=1.0) -> None:
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = list(self._values.items())
+
+        return [f"{self.name}{_format_labels(self.label_names, label_values)} {_format_value(value)}" for label_values, value in values]
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def __init__(self, name: str, documentation: str, label_names: Tuple[str, ...]=()):
+        super().__init__(name, documentation, label_names)
+        self._functions: Dict[Tuple[str, ...], Callable[[], float]] = {}
+
+    def dec(self, *label_values: str, amount: float=1.0) -> None:
+        self.inc(*label_values, amount=-amount)
+
+    def set_function(self, function: Callable[[], float], *label_values: str) -> None:
+        # A label set with a function is read when it is scraped instead of being updated in place.
+        with self._lock:
+            self._functions[label_values] = function
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            functions = list(self._functions.items())
+
+        return super().samples() + [f"{self.name}{_format_labels(self.label_names, label_values)} {_format_value(function())}" for label_values, function in functions]
+
+
+class Histogram:
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, label_names: Tuple[str, ...]=(), buckets: Tuple[float, ...]=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self.buckets = tuple(buckets) + (float("inf"),)
+        # Per label set: a count for each bucket (not cumulative), then the sum.
+        self._values: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+        self._lock = Lock()
+
+    def observe(self, value: float, *label_values: str) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            if label_values not in self._values:
+                self._values[label_values] = ([0] * len(self.buckets), [0.0])
+            counts, total = self._values[label_values]
+            counts[index] += 1
+            total[0] += value
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = [(label_values, list(counts), total[0]) for label_values, (counts, total) in self._values.items()]
+        samples = []
+        for label_values, counts, total in values:
+            cumulative = 0
+            for bucket, count in zip(self.buckets, counts):
+                cumulative += count
+                le = 'le="%s"' % _format_value(bucket)
+                samples.append(f"{self.name}_bucket{_format_labels(self.label_names, label_values, le)} {cumulative}")
+            samples.append(f"{self.name}_sum{_format_labels(self.label_names, label_values)} {_format_value(total)}")
+            samples.append(f"{self.name}_count{_format_labels(self.label_names, label_values)} {cumulative}")
+
+        return samples
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines += metric.samples()
+
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_request_duration_seconds = registry.register(Histogram("http_request_duration_seconds", "HTTP request latency by route template.", ("method", "route", "status_code")))
+http_requests_in_flight = registry.register(Gauge("http_requests_in_flight", "HTTP requests currently being handled."))
+database_pool_checkout_wait_seconds = registry.register(Histogram("database_pool_checkout_wait_seconds", "Time spent waiting for a connection from the database pool.", ("pool",), buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0)))
+database_pool_checked_out = registry.register(Gauge("database_pool_checked_out", "Database connections currently checked out of the pool.", ("pool",)))
+line_api_request_duration_seconds = registry.register(Histogram("line_api_request_duration_seconds", "LINE API request latency by operation, including retried attempts.", ("operation",)))
+line_api_errors_total = registry.register(Counter("line_api_errors_total", "LINE API errors by operation and status code, 0 for transport errors.", ("operation", "status_code")))
+
+
+def instrument_pool(engine: Engine, name: str) -> None:
+    pool = engine.pool
+    connect = pool.connect
+
+    def timed_connect():
+        started_at = time.perf_counter()
+        try:
+            return connect()
+        finally:
+            database_pool_checkout_wait_seconds.observe(time.perf_counter() - started_at, name)
+
+    # The engine checks connections out through pool.connect(), so shadowing it on the instance times every checkout.
+    pool.connect = timed_connect
+    if hasattr(pool, "checkedout"):
+        database_pool_checked_out.set_function(pool.checkedout, name)
+
+
+class MetricsMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        http_requests_in_flight.inc()
+        started_at = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            http_requests_in_flight.dec()
+            # Unmatched paths share one label so that scanning bots cannot blow up the series count.
+            route = scope.get("route")
+            http_request_duration_seconds.observe(time.perf_counter() - started_at, scope["method"], route.path if route is not None else "unmatched", str(status_code))
@@ -1,9 +1,14 @@
-from sqlalchemy import Boolean, Column, DateTime, ForeignKey, String, Unicode
+from sqlalchemy import BigInteger, Boolean, Column, DateTime, FetchedValue, ForeignKey, Identity, Index, Integer, String, Unicode
+from sqlalchemy.dialects.mssql import ROWVERSION
 from sqlalchemy.orm import relationship
 
 from api.v1.database import Base
 
 
+# SQL Server stamps change sequences itself as rowversions; SQLite takes them from the ChangeSequences counter.
+ChangeSequenceType = BigInteger().with_variant(ROWVERSION(convert_int=True), "mssql")
+
+
 class LINEUser(Base):
     __tablename__ = "LINEUsers"
 
@@ -35,10 +40,12 @@ class User(Base):
     user_uuid = Column(String(48), primary_key=True)
     user_id = Column(String(48), unique=True, nullable=False)
     username = Column(String(48), unique=True, nullable=False)
+    user_key = Column(Integer, Identity(), unique=True, nullable=False)
     hashed_password = Column(Unicode, nullable=False)
     display_name = Column(Unicode, nullable=True)
     line_user_uuid = Column(String(48), ForeignKey("LINEUsers.line_user_uuid"), nullable=True)
     line_user = relationship("LINEUser")
+    membership_change_sequence = Column(ChangeSequenceType, server_default="0", server_onupdate=FetchedValue(), nullable=False)
     created_at = Column(DateTime, nullable=False)
     updated_at = Column(DateTime, nullable=True)
     deleted = Column(Boolean, default=False, nullable=False)
@@ -46,8 +53,8 @@ class User(Base):
     boards = relationship("Board", back_populates="administrator")
     my_boards = relationship("Board", secondary="BoardMembers", back_populates="members")
     my_subboards = relationship("Subboard", secondary="SubboardMembers", back_populates="members")
-    sent_direct_messages = relationship("DirectMessage", back_populates="send_from", foreign_keys="DirectMessage.send_from_name")
-    received_direct_messages = relationship("DirectMessage", back_populates="send_to", foreign_keys="DirectMessage.send_to_name")
+    sent_direct_messages = relationship("DirectMessage", back_populates="send_from", foreign_keys="DirectMessage.send_from_key")
+    received_direct_messages = relationship("DirectMessage", back_populates="send_to", foreign_keys="DirectMessage.send_to_key")
     sent_form_responses = relationship("FormResponse", back_populates="respondent")
 
 
@@ -57,9 +64,10 @@ class Board(Base):
     board_uuid = Column(String(48), primary_key=True)
     board_id = Column(String(48), unique=True, nullable=False)
     board_name = Column(Unicode, nullable=False)
-    administrator_name = Column(String(48), ForeignKey("Users.username"), nullable=False)
-    administrator = relationship("User", back_populates="boards", foreign_keys=[administrator_name])
+    administrator_key = Column(Integer, ForeignKey("Users.user_key"), nullable=False, index=True)
+    administrator = relationship("User", back_populates="boards", foreign_keys=[administrator_key])
     members = relationship("User", secondary="BoardMembers", back_populates="my_boards")
+    version = Column(Integer, default=0, server_default="0", nullable=False)
     created_at = Column(DateTime, nullable=False)
     updated_at = Column(DateTime, nullable=True)
     deleted = Column(Boolean, default=False, nullable=False)
@@ -71,19 +79,34 @@ class Board(Base):
 
 class BoardMember(Base):
     __tablename__ = "BoardMembers"
+    __table_args__ = (Index("ix_BoardMembers_board_uuid_user_key", "board_uuid", "user_key"),)
+
+    user_key = Column(Integer, ForeignKey("Users.user_key"), primary_key=True)
+    board_uuid = Column(String(48), ForeignKey("Boards.board_uuid"), primary_key=True)
+
+
+class BoardReadCursor(Base):
+    __tablename__ = "BoardReadCursors"
 
-    username = Column(String(48), ForeignKey("Users.username"), primary_key=True)
+    user_key = Column(Integer, ForeignKey("Users.user_key"), primary_key=True)
     board_uuid = Column(String(48), ForeignKey("Boards.board_uuid"), primary_key=True)
+    last_read_message_uuid = Column(String(48), ForeignKey("Messages.message_uuid"), nullable=True)
+    last_read_at = Column(DateTime, nullable=True)
+    unread_count = Column(Integer, default=0, server_default="0", nullable=False)
+    created_at = Column(DateTime, nullable=False)
+    updated_at = Column(DateTime, nullable=True)
 
 
 class Subboard(Base):
     __tablename__ = "Subboards"
+    __table_args__ = (Index("ix_Subboards_board_uuid_change_sequence", "board_uuid", "change_sequence"),)
 
     subboard_uuid = Column(String(48), primary_key=True)
     subboard_name = Column(Unicode, nullable=False)
     board_uuid = Column(String(48), ForeignKey("Boards.board_uuid"), nullable=False)
     board = relationship("Board", back_populates="subboards")
     members = relationship("User", secondary="SubboardMembers", back_populates="my_subboards")
+    change_sequence = Column(ChangeSequenceType, server_default="0", server_onupdate=FetchedValue(), nullable=False)
     created_at = Column(DateTime, nullable=False)
     updated_at = Column(DateTime, nullable=True)
     deleted = Column(Boolean, default=False, nullable=False)
@@ -94,13 +117,15 @@ class Subboard(Base):
 
 class SubboardMember(Base):
     __tablename__ = "SubboardMembers"
+    __table_args__ = (Index("ix_SubboardMembers_subboard_uuid_user_key", "subboard_uuid", "user_key"),)
 
-    username = Column(String(48), ForeignKey("Users.username"), primary_key=True)
+    user_key = Column(Integer, ForeignKey("Users.user_key"), primary_key=True)
     subboard_uuid = Column(String(48), ForeignKey("Subboards.subboard_uuid"), primary_key=True)
 
 
 class Message(Base):
     __tablename__ = "Messages"
+    __table_args__ = (Index("ix_Messages_board_uuid_change_sequence", "board_uuid", "change_sequence"),)
 
     message_uuid = Column(String(48), primary_key=True)
     board_uuid = Column(String(48), ForeignKey("Boards.board_uuid"), nullable=True)
@@ -109,10 +134,13 @@ class Message(Base):
     body = Column(Unicode, nullable=False)
     send_time = Column(DateTime, nullable=True)
     scheduled_send_time = Column(DateTime, nullable=True)
+    change_sequence = Column(ChangeSequenceType, server_default="0", server_onupdate=FetchedValue(), nullable=False)
     created_at = Column(DateTime, nullable=False)
     updated_at = Column(DateTime, nullable=True)
     deleted = Column(Boolean, default=False, nullable=False)
 
+    deliveries = relationship("MessageDelivery", back_populates="message")
+
 
 class SubboardMessage(Base):
     __tablename__ = "SubboardMessages"
@@ -121,24 +149,103 @@ class SubboardMessage(Base):
     message_uuid = Column(String(48), ForeignKey("Messages.message_uuid"), primary_key=True)
 
 
+class MessageDelivery(Base):
+    __tablename__ = "MessageDeliveries"
+
+    message_delivery_uuid = Column(String(48), primary_key=True)
+    message_uuid = Column(String(48), ForeignKey("Messages.message_uuid"), nullable=False, index=True)
+    message = relationship("Message", back_populates="deliveries")
+    chunk_index = Column(Integer, nullable=False)
+    line_user_ids = Column(Unicode, nullable=False)
+    recipient_count = Column(Integer, nullable=False)
+    status = Column(String(16), nullable=False, index=True)
+    attempts = Column(Integer, default=0, nullable=False)
+    last_error = Column(Unicode, nullable=True)
+    next_attempt_at = Column(DateTime, nullable=True)
+    sent_at = Column(DateTime, nullable=True)
+    created_at = Column(DateTime, nullable=False)
+    updated_at = Column(DateTime, nullable=True)
+    deleted = Column(Boolean, default=False, nullable=False)
+
+
 class DirectMessage(Base):
     __tablename__ = "DirectMessages"
+    __table_args__ = (
+        Index("ix_DirectMessages_send_from_key_change_sequence", "send_from_key", "change_sequence"),
+        Index("ix_DirectMessages_send_to_key_change_sequence", "send_to_key", "change_sequence"),
+        Index("ix_DirectMessages_conversation_uuid_created_at", "conversation_uuid", "created_at")
+    )
 
     direct_message_uuid = Column(String(48), primary_key=True)
-    send_from_name = Column(String(48), ForeignKey("Users.username"), nullable=False)
-    send_from = relationship("User", back_populates="sent_direct_messages", foreign_keys=[send_from_name])
-    send_to_name = Column(String(48), ForeignKey("Users.username"), nullable=False)
-    send_to = relationship("User", back_populates="received_direct_messages", foreign_keys=[send_to_name])
+    send_from_key = Column(Integer, ForeignKey("Users.user_key"), nullable=False)
+    send_from = relationship("User", back_populates="sent_direct_messages", foreign_keys=[send_from_key])
+    send_to_key = Column(Integer, ForeignKey("Users.user_key"), nullable=False)
+    send_to = relationship("User", back_populates="received_direct_messages", foreign_keys=[send_to_key])
+    conversation_uuid = Column(String(48), ForeignKey("Conversations.conversation_uuid"), nullable=False)
+    conversation = relationship("Conversation", back_populates="direct_messages")
     body = Column(Unicode, nullable=False)
     send_time = Column(DateTime, nullable=True)
     scheduled_send_time = Column(DateTime, nullable=True)
+    change_sequence = Column(ChangeSequenceType, server_default="0", server_onupdate=FetchedValue(), nullable=False)
     created_at = Column(DateTime, nullable=False)
     updated_at = Column(DateTime, nullable=True)
     deleted = Column(Boolean, default=False, nullable=False)
 
+    delivery = relationship("DirectMessageDelivery", back_populates="direct_message", uselist=False)
+
+
+class DirectMessageDelivery(Base):
+    __tablename__ = "DirectMessageDeliveries"
+
+    direct_message_uuid = Column(String(48), ForeignKey("DirectMessages.direct_message_uuid"), primary_key=True)
+    direct_message = relationship("DirectMessage", back_populates="delivery")
+    line_user_id = Column(String(48), nullable=False)
+    status = Column(String(16), nullable=False, index=True)
+    attempts = Column(Integer, default=0, nullable=False)
+    last_error = Column(Unicode, nullable=True)
+    next_attempt_at = Column(DateTime, nullable=True)
+    sent_at = Column(DateTime, nullable=True)
+    created_at = Column(DateTime, nullable=False)
+    updated_at = Column(DateTime, nullable=True)
+    deleted = Column(Boolean, default=False, nullable=False)
+
+
+class Conversation(Base):
+    __tablename__ = "Conversations"
+    __table_args__ = (Index("ix_Conversations_user_key_low_user_key_high", "user_key_low", "user_key_high", unique=True),)
+
+    conversation_uuid = Column(String(48), primary_key=True)
+    user_key_low = Column(Integer, ForeignKey("Users.user_key"), nullable=False)
+    user_key_high = Column(Integer, ForeignKey("Users.user_key"), nullable=False)
+    created_at = Column(DateTime, nullable=False)
+
+    members = relationship("ConversationMember", back_populates="conversation")
+    direct_messages = relationship("DirectMessage", back_populates="conversation")
+
+
+class ConversationMember(Base):
+    __tablename__ = "ConversationMembers"
+    __table_args__ = (Index("ix_ConversationMembers_user_key_last_message_at", "user_key", "last_message_at"),)
+
+    conversation_uuid = Column(String(48), ForeignKey("Conversations.conversation_uuid"), primary_key=True)
+    conversation = relationship("Conversation", back_populates="members")
+    user_key = Column(Integer, ForeignKey("Users.user_key"), primary_key=True)
+    with_user_key = Column(Integer, ForeignKey("Users.user_key"), nullable=False)
+    with_user = relationship("User", foreign_keys=[with_user_key])
+    last_direct_message_uuid = Column(String(48), ForeignKey("DirectMessages.direct_message_uuid"), nullable=True)
+    last_direct_message = relationship("DirectMessage", foreign_keys=[last_direct_message_uuid])
+    last_message_at = Column(DateTime, nullable=False)
+    unread_count = Column(Integer, default=0, server_default="0", nullable=False)
+    last_read_direct_message_uuid = Column(String(48), ForeignKey("DirectMessages.direct_message_uuid"), nullable=True)
+    last_read_at = Column(DateTime, nullable=True)
+    # The other member's row, whose read cursor is the read receipt for this member's messages.
+    with_member = relationship("ConversationMember", primaryjoin="and_(remote(ConversationMember.conversation_uuid) == ConversationMember.conversation_uuid, remote(ConversationMember.user_key) == ConversationMember.with_user_key)", foreign_keys="[ConversationMember.conversation_uuid, ConversationMember.user_key]", viewonly=True, uselist=False)
+    created_at = Column(DateTime, nullable=False)
+
 
 class Form(Base):
     __tablename__ = "Forms"
+    __table_args__ = (Index("ix_Forms_board_uuid_change_sequence", "board_uuid", "change_sequence"),)
 
     form_uuid = Column(String(48), primary_key=True)
     board_uuid = Column(String(48), ForeignKey("Boards.board_uuid"), nullable=True)
@@ -147,6 +254,7 @@ class Form(Base):
     title = Column(Unicode, nullable=False)
     send_time = Column(DateTime, nullable=True)
     scheduled_send_time = Column(DateTime, nullable=True)
+    change_sequence = Column(ChangeSequenceType, server_default="0", server_onupdate=FetchedValue(), nullable=False)
     created_at = Column(DateTime, nullable=False)
     updated_at = Column(DateTime, nullable=True)
     deleted = Column(Boolean, default=False, nullable=False)
@@ -180,9 +288,10 @@ class SubboardForm(Base):
 
 class FormResponse(Base):
     __tablename__ = "FormResponses"
+    __table_args__ = (Index("ix_FormResponses_form_uuid_form_response_uuid", "form_uuid", "form_response_uuid"),)
 
     form_response_uuid = Column(String(48), primary_key=True)
-    respondent_name = Column(String(48), ForeignKey("Users.username"), nullable=False)
+    respondent_key = Column(Integer, ForeignKey("Users.user_key"), nullable=False)
     respondent = relationship("User", back_populates="sent_form_responses")
     form_uuid = Column(String(48), ForeignKey("Forms.form_uuid"), nullable=False)
     form = relationship("Form", back_populates="form_responses")
@@ -195,6 +304,7 @@ class FormResponse(Base):
 
 class FormYesNoQuestionResponse(Base):
     __tablename__ = "FormYesNoQuestionResponses"
+    __table_args__ = (Index("ix_FormYesNoQuestionResponses_form_response_uuid", "form_response_uuid"),)
 
     form_question_response_uuid = Column(String(48), primary_key=True)
     form_response_uuid = Column(String(48), ForeignKey("FormResponses.form_response_uuid"), nullable=False)
@@ -206,3 +316,49 @@ class FormYesNoQuestionResponse(Base):
     created_at = Column(DateTime, nullable=False)
     updated_at = Column(DateTime, nullable=True)
     deleted = Column(Boolean, default=False, nullable=False)
+
+
+class ChangeSequence(Base):
+    __tablename__ = "ChangeSequences"
+
+    name = Column(String(48), primary_key=True)
+    value = Column(Integer, default=0, nullable=False)
+
+
+class FeedItem(Base):
+    __tablename__ = "FeedItems"
+    __table_args__ = (Index("ix_FeedItems_user_key_board_uuid_item_type_created_at", "user_key", "board_uuid", "item_type", "created_at"),)
+
+    user_key = Column(Integer, ForeignKey("Users.user_key"), primary_key=True)
+    item_uuid = Column(String(48), primary_key=True)
+    item_type = Column(String(16), nullable=False)
+    board_uuid = Column(String(48), ForeignKey("Boards.board_uuid"), nullable=False)
+    created_at = Column(DateTime, nullable=False)
+
+
+class FeedFanOut(Base):
+    __tablename__ = "FeedFanOuts"
+
+    item_uuid = Column(String(48), primary_key=True)
+    item_type = Column(String(16), nullable=False)
+    board_uuid = Column(String(48), ForeignKey("Boards.board_uuid"), nullable=False, index=True)
+    created_at = Column(DateTime, nullable=False)
+
+
+class FeedRepair(Base):
+    __tablename__ = "FeedRepairs"
+
+    user_key = Column(Integer, ForeignKey("Users.user_key"), primary_key=True)
+    board_uuid = Column(String(48), ForeignKey("Boards.board_uuid"), primary_key=True)
+    created_at = Column(DateTime, nullable=False, index=True)
+
+
+class IdempotencyKey(Base):
+    __tablename__ = "IdempotencyKeys"
+
+    user_key = Column(Integer, ForeignKey("Users.user_key"), primary_key=True)
+    idempotency_key = Column(String(255), primary_key=True)
+    request_path = Column(Unicode, nullable=False)
+    status_code = Column(Integer, nullable=True)
+    response_body = Column(Unicode, nullable=True)
+    created_at = Column(DateTime, nullable=False, index=True)
@@ -0,0 +1,152 @@
+from typing import Dict, List
+
+from sqlalchemy import and_
+from sqlalchemy.orm import Query, Session
+
+from api.v1 import models
+from api.v1.tracing import traced
+
+
+# The payloads below mirror schemas.BoardWithSubboards, schemas.SubboardWithBoard, schemas.Message and schemas.Form field for field. They are built from
+# column tuples in a fixed number of queries, instead of validating lazily loaded ORM objects item by item.
+
+_USER_COLUMNS = (
+    models.User.user_uuid,
+    models.User.user_id,
+    models.User.username,
+    models.User.display_name,
+    models.LINEUser.line_user_uuid,
+    models.LINEUser.user_id
+)
+
+
+def _user(row) -> dict:
+    user_uuid, user_id, username, display_name, line_user_uuid, line_user_id = row[-6:]
+
+    return {
+        "user_uuid": user_uuid,
+        "user_id": user_id,
+        "username": username,
+        "display_name": display_name,
+        "line_user": {"line_user_uuid": line_user_uuid, "user_id": line_user_id} if line_user_uuid else None
+    }
+
+def _read_boards(database: Session, board_uuids: Query) -> Dict[str, dict]:
+    boards = {}
+    for board_uuid, board_id, board_name in database.query(models.Board.board_uuid, models.Board.board_id, models.Board.board_name).filter(models.Board.board_uuid.in_(board_uuids)).all():
+        boards[board_uuid] = {"board_uuid": board_uuid, "board_id": board_id, "board_name": board_name, "members": []}
+    for member in database.query(models.BoardMember.board_uuid, *_USER_COLUMNS).join(models.User, models.User.user_key == models.BoardMember.user_key).outerjoin(models.LINEUser, models.LINEUser.line_user_uuid == models.User.line_user_uuid).filter(models.BoardMember.board_uuid.in_(board_uuids)).all():
+        boards[member[0]]["members"].append(_user(member))
+
+    return boards
+
+def _read_board(database: Session, board: models.Board) -> dict:
+    members = database.query(*_USER_COLUMNS).join(models.BoardMember, models.BoardMember.user_key == models.User.user_key).outerjoin(models.LINEUser, models.LINEUser.line_user_uuid == models.User.line_user_uuid).filter(models.BoardMember.board_uuid == board.board_uuid).all()
+
+    return {
+        "board_uuid": board.board_uuid,
+        "board_id": board.board_id,
+        "board_name": board.board_name,
+        "members": [_user(member) for member in members]
+    }
+
+def _read_subboards(database: Session, subboard_uuids: Query) -> Dict[str, dict]:
+    subboards = {}
+    for subboard_uuid, subboard_name in database.query(models.Subboard.subboard_uuid, models.Subboard.subboard_name).filter(models.Subboard.subboard_uuid.in_(subboard_uuids)).all():
+        subboards[subboard_uuid] = {"subboard_uuid": subboard_uuid, "subboard_name": subboard_name, "members": []}
+    for member in database.query(models.SubboardMember.subboard_uuid, *_USER_COLUMNS).join(models.User, models.User.user_key == models.SubboardMember.user_key).outerjoin(models.LINEUser, models.LINEUser.line_user_uuid == models.User.line_user_uuid).filter(models.SubboardMember.subboard_uuid.in_(subboard_uuids)).all():
+        subboards[member[0]]["members"].append(_user(member))
+
+    return subboards
+
+@traced
+def read_boards(database: Session, user_key: int) -> List[dict]:
+    board_uuids = database.query(models.Board.board_uuid).filter(and_(models.Board.administrator_key == user_key, models.Board.deleted == False))
+    boards = _read_boards(database, board_uuids)
+    if not boards:
+        return []
+    for board in boards.values():
+        board["subboards"] = []
+    # schemas.BoardWithSubboards lists every subboard of a board, as Board.subboards does.
+    subboard_uuids = database.query(models.Subboard.subboard_uuid).filter(models.Subboard.board_uuid.in_(board_uuids))
+    subboard_board_uuids = dict(subboard_uuids.with_entities(models.Subboard.subboard_uuid, models.Subboard.board_uuid).all())
+    for subboard_uuid, subboard in _read_subboards(database, subboard_uuids).items():
+        boards[subboard_board_uuids[subboard_uuid]]["subboards"].append(subboard)
+
+    return list(boards.values())
+
+@traced
+def read_subboards(database: Session, board: models.Board) -> List[dict]:
+    subboards = _read_subboards(database, database.query(models.Subboard.subboard_uuid).filter(and_(models.Subboard.board_uuid == board.board_uuid, models.Subboard.deleted == False)))
+    if not subboards:
+        return []
+    board_payload = _read_board(database, board)
+
+    return [{"subboard_uuid": subboard["subboard_uuid"], "subboard_name": subboard["subboard_name"], "board": board_payload, "members": subboard["members"]} for subboard in subboards.values()]
+
+def _user_payload(user: models.User) -> dict:
+    return {
+        "user_uuid": user.user_uuid,
+        "user_id": user.user_id,
+        "username": user.username,
+        "display_name": user.display_name,
+        "line_user": {"line_user_uuid": user.line_user.line_user_uuid, "user_id": user.line_user.user_id} if user.line_user else None
+    }
+
+@traced
+def build_messages(messages: List[models.Message]) -> List[dict]:
+    # For messages read with their relationships loaded; boards and subboards shared by several messages are built once.
+    boards, subboards = {}, {}
+    for message in messages:
+        if message.board_uuid not in boards:
+            boards[message.board_uuid] = {"board_uuid": message.board.board_uuid, "board_id": message.board.board_id, "board_name": message.board.board_name, "members": [_user_payload(member) for member in message.board.members]}
+        for subboard in message.subboards:
+            if subboard.subboard_uuid not in subboards:
+                subboards[subboard.subboard_uuid] = {"subboard_uuid": subboard.subboard_uuid, "subboard_name": subboard.subboard_name, "members": [_user_payload(member) for member in subboard.members]}
+
+    return [{"message_uuid": message.message_uuid, "board": boards[message.board_uuid], "subboards": [subboards[subboard.subboard_uuid] for subboard in message.subboards], "body": message.body, "send_time": message.send_time, "scheduled_send_time": message.scheduled_send_time} for message in messages]
+
+@traced
+def read_messages(database: Session, board: models.Board) -> List[dict]:
+    messages = {}
+    for message_uuid, body, send_time, scheduled_send_time in database.query(models.Message.message_uuid, models.Message.body, models.Message.send_time, models.Message.scheduled_send_time).filter(and_(models.Message.board_uuid == board.board_uuid, models.Message.deleted == False)).all():
+        messages[message_uuid] = {"message_uuid": message_uuid, "board": None, "subboards": [], "body": body, "send_time": send_time, "scheduled_send_time": scheduled_send_time}
+    if not messages:
+        return []
+    board_payload = _read_board(database, board)
+    links = database.query(models.SubboardMessage.message_uuid, models.SubboardMessage.subboard_uuid).join(models.Message, models.Message.message_uuid == models.SubboardMessage.message_uuid).filter(and_(models.Message.board_uuid == board.board_uuid, models.Message.deleted == False))
+    subboards = _read_subboards(database, links.with_entities(models.SubboardMessage.subboard_uuid))
+    for message in messages.values():
+        message["board"] = board_payload
+    for message_uuid, subboard_uuid in links.all():
+        messages[message_uuid]["subboards"].append(subboards[subboard_uuid])
+
+    return list(messages.values())
+
+@traced
+def read_forms(database: Session, board: models.Board) -> List[dict]:
+    forms = {}
+    for form_uuid, title, send_time, scheduled_send_time in database.query(models.Form.form_uuid, models.Form.title, models.Form.send_time, models.Form.scheduled_send_time).filter(and_(models.Form.board_uuid == board.board_uuid, models.Form.deleted == False)).all():
+        forms[form_uuid] = {"form_uuid": form_uuid, "board": None, "subboards": [], "title": title, "send_time": send_time, "scheduled_send_time": scheduled_send_time, "form_questions": [], "form_responses": []}
+    if not forms:
+        return []
+    board_payload = _read_board(database, board)
+    links = database.query(models.SubboardForm.form_uuid, models.SubboardForm.subboard_uuid).join(models.Form, models.Form.form_uuid == models.SubboardForm.form_uuid).filter(and_(models.Form.board_uuid == board.board_uuid, models.Form.deleted == False))
+    subboards = _read_subboards(database, links.with_entities(models.SubboardForm.subboard_uuid))
+    for form in forms.values():
+        form["board"] = board_payload
+    for form_uuid, subboard_uuid in links.all():
+        forms[form_uuid]["subboards"].append(subboards[subboard_uuid])
+
+    for form_uuid, form_question_uuid, title, yes, no in database.query(models.FormYesNoQuestion.form_uuid, models.FormYesNoQuestion.form_question_uuid, models.FormYesNoQuestion.title, models.FormYesNoQuestion.yes, models.FormYesNoQuestion.no).join(models.Form, models.Form.form_uuid == models.FormYesNoQuestion.form_uuid).filter(and_(models.Form.board_uuid == board.board_uuid, models.Form.deleted == False)).all():
+        forms[form_uuid]["form_questions"].append({"form_question_uuid": form_question_uuid, "title": title, "yes": yes, "no": no})
+
+    form_responses = {}
+    for form_response in database.query(models.FormResponse.form_response_uuid, models.FormResponse.form_uuid, *_USER_COLUMNS).join(models.Form, models.Form.form_uuid == models.FormResponse.form_uuid).join(models.User, models.User.user_key == models.FormResponse.respondent_key).outerjoin(models.LINEUser, models.LINEUser.line_user_uuid == models.User.line_user_uuid).filter(and_(models.Form.board_uuid == board.board_uuid, models.Form.deleted == False)).all():
+        form_response_uuid, form_uuid = form_response[:2]
+        form_responses[form_response_uuid] = {"form_response_uuid": form_response_uuid, "respondent": _user(form_response), "form_uuid": form_uuid, "form_question_responses": []}
+        forms[form_uuid]["form_responses"].append(form_responses[form_response_uuid])
+    for form_response_uuid, form_question_response_uuid, form_question_uuid, yes, no in database.query(models.FormYesNoQuestionResponse.form_response_uuid, models.FormYesNoQuestionResponse.form_question_response_uuid, models.FormYesNoQuestionResponse.form_question_uuid, models.FormYesNoQuestionResponse.yes, models.FormYesNoQuestionResponse.no).join(models.FormResponse, models.FormResponse.form_response_uuid == models.FormYesNoQuestionResponse.form_response_uuid).join(models.Form, models.Form.form_uuid == models.FormResponse.form_uuid).filter(and_(models.Form.board_uuid == board.board_uuid, models.Form.deleted == False)).all():
+        form_responses[form_response_uuid]["form_question_responses"].append({"form_question_response_uuid": form_question_response_uuid, "form_question_uuid": form_question_uuid, "yes": yes, "no": no})
+
+    return list(forms.values())
@@ -0,0 +1,43 @@
+import os
+import time
+from typing import Optional
+
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+
+READ_YOUR_WRITES_WINDOW = float(os.getenv("READ_YOUR_WRITES_WINDOW", "30"))
+READ_YOUR_WRITES_HEADER = "X-Read-Your-Writes-Until"
+
+READ_METHODS = ("GET", "HEAD", "OPTIONS")
+
+
+def reads_own_writes(read_your_writes_until: Optional[str]) -> bool:
+    try:
+        until = float(read_your_writes_until or "")
+    except ValueError:
+        return False
+    now = time.time()
+    # The marker is not signed, so it is only honoured within one window from now; a client can at most keep its
+    # own reads on the primary, which it could also do by writing.
+    return now < until <= now + READ_YOUR_WRITES_WINDOW
+
+
+class ReadYourWritesMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] in READ_METHODS:
+            await self.app(scope, receive, send)
+            return
+
+        # The marker travels with the client rather than living in one instance, so the next read stays on the
+        # primary whichever instance of the Function App serves it.
+        async def send_with_marker(message: Message):
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                headers = MutableHeaders(scope=message)
+                headers[READ_YOUR_WRITES_HEADER] = f"{time.time() + READ_YOUR_WRITES_WINDOW:.3f}"
+            await send(message)
+
+        await self.app(scope, receive, send_with_marker)
@@ -0,0 +1,52 @@
+import asyncio
+
+from linebot.models import MessageAction, RichMenu, RichMenuArea, RichMenuBounds, RichMenuSize
+
+from api.v1.line_client import LINEClient, create_line_client
+
+
+async def init_rich_menu(line_client: LINEClient, rich_menu_image: bytes) -> None:
+    rich_menu_id = await line_client.create_rich_menu(
+        RichMenu(
+            size=RichMenuSize(width=2500, height=1686),
+            selected=True,
+            name="リッチメニュー",
+            chat_bar_text="メニュー",
+            areas=[
+                RichMenuArea(
+                    bounds=RichMenuBounds(x=0, y=0, width=1250, height=843),
+                    action=MessageAction(label="サインアップ", text="サインアップ")
+                ),
+                RichMenuArea(
+                    bounds=RichMenuBounds(x=0, y=843, width=1250, height=843),
+                    action=MessageAction(label="ボード設定", text="ボード設定")
+                ),
+                RichMenuArea(
+                    bounds=RichMenuBounds(x=1250, y=843, width=1250, height=843),
+                    action=MessageAction(label="サブボード設定", text="サブボード設定")
+                ),
+                RichMenuArea(
+                    bounds=RichMenuBounds(x=1250, y=0, width=1250, height=843),
+                    action=MessageAction(label="DM", text="DM")
+                )
+            ]
+        )
+    )
+    await line_client.set_rich_menu_image(rich_menu_id, "image/png", rich_menu_image)
+    await line_client.set_default_rich_menu(rich_menu_id)
+
+async def _init_rich_menu_and_close(line_client: LINEClient, rich_menu_image: bytes) -> None:
+    try:
+        await init_rich_menu(line_client, rich_menu_image)
+    finally:
+        await line_client.aclose()
+
+def main() -> None:
+    with open("./api/v1/assets/rich_menu.png", "rb") as f:
+        rich_menu_image = f.read()
+    asyncio.run(_init_rich_menu_and_close(create_line_client(), rich_menu_image))
+
+# The rich menu belongs to the channel rather than to a function instance, so it is set up once per deployment
+# with `python -m api.v1.rich_menu` instead of on every cold start.
+if __name__ == "__main__":
+    main()
@@ -15,6 +15,17 @@ class LINEUser(BaseModel):
         orm_mode = True
 
 
+class LINESession(BaseModel):
+    line_user_id: str
+    line_user_uuid: str
+    user_uuid: Optional[str]
+    user_key: Optional[int]
+    username: Optional[str]
+    display_name: Optional[str]
+    message_context: Optional[str]
+    has_message_context: bool
+
+
 class User(BaseModel):
     user_uuid: str
     user_id: str
@@ -128,6 +139,17 @@ class MySubboardWithBoard(BaseModel):
         orm_mode = True
 
 
+class MySubboardWithBoardChange(MySubboardWithBoard):
+    change_sequence: int
+    deleted: bool
+
+
+class MySubboardChanges(BaseModel):
+    changes: List[MySubboardWithBoardChange]
+    next_since: int
+    reset: bool
+
+
 class NewMyBoards(BaseModel):
     new_my_board_ids: List[str]
 
@@ -148,12 +170,63 @@ class Message(BaseModel):
         orm_mode = True
 
 
+class MessageChange(Message):
+    change_sequence: int
+    deleted: bool
+
+
+class MessageChanges(BaseModel):
+    changes: List[MessageChange]
+    next_since: int
+    reset: bool
+
+
 class NewMessage(BaseModel):
     subboard_uuids: List[str]
     body: str
     scheduled_send_time: Optional[datetime]
 
 
+class NewBoardReadCursor(BaseModel):
+    message_uuid: Optional[str]
+
+
+class BoardUnreadCount(BaseModel):
+    board_uuid: str
+    unread_count: int
+
+
+class ConversationUnreadCount(BaseModel):
+    conversation_uuid: str
+    unread_count: int
+
+
+class UnreadCounts(BaseModel):
+    boards: List[BoardUnreadCount]
+    conversations: List[ConversationUnreadCount]
+    total_unread_count: int
+
+
+class EventsConnection(BaseModel):
+    url: str
+    expires_in: int
+
+
+class MessageDelivery(BaseModel):
+    message_delivery_uuid: str
+    message_uuid: str
+    chunk_index: int
+    recipient_count: int
+    status: str
+    attempts: int
+    last_error: Optional[str]
+    next_attempt_at: Optional[datetime]
+    sent_at: Optional[datetime]
+
+    class Config:
+        orm_mode = True
+
+
 class DirectMessage(BaseModel):
     direct_message_uuid: str
     send_from: User
@@ -166,12 +239,44 @@ class DirectMessage(BaseModel):
         orm_mode = True
 
 
+class DirectMessageChange(DirectMessage):
+    change_sequence: int
+    deleted: bool
+
+
+class DirectMessageChanges(BaseModel):
+    changes: List[DirectMessageChange]
+    next_since: int
+    reset: bool
+
+
 class NewDirectMessage(BaseModel):
     send_to_names: List[str]
     body: str
     scheduled_send_time: Optional[datetime]
 
 
+class ConversationReadCursor(BaseModel):
+    last_read_direct_message_uuid: Optional[str]
+    last_read_at: Optional[datetime]
+
+    class Config:
+        orm_mode = True
+
+
+class Conversation(ConversationReadCursor):
+    conversation_uuid: str
+    with_user: User
+    with_member: Optional[ConversationReadCursor]
+    last_direct_message: Optional[DirectMessage]
+    last_message_at: datetime
+    unread_count: int
+
+
+class NewConversationReadCursor(BaseModel):
+    direct_message_uuid: Optional[str]
+
+
 class FormYesNoQuestionResponse(BaseModel):
     form_question_response_uuid: str
     form_question_uuid: str
@@ -245,6 +350,17 @@ class MyForm(BaseModel):
         orm_mode = True
 
 
+class MyFormChange(MyForm):
+    change_sequence: int
+    deleted: bool
+
+
+class MyFormChanges(BaseModel):
+    changes: List[MyFormChange]
+    next_since: int
+    reset: bool
+
+
 class NewForm(BaseModel):
     subboard_uuids: List[str]
     title: str
@@ -0,0 +1,86 @@
+import functools
+import inspect
+import os
+from typing import Any, Callable, Optional, TypeVar
+
+from opentelemetry import propagate, trace
+from opentelemetry.trace import SpanKind, Status, StatusCode
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+
+TRACING_EXPORTER = os.getenv("TRACING_EXPORTER")
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+tracer = trace.get_tracer("api.v1")
+memory_exporter = None
+
+
+def configure_tracing(exporter: Optional[str]=TRACING_EXPORTER) -> None:
+    global memory_exporter
+
+    # Without an exporter the API's no-op tracer is used, so spans cost next to nothing.
+    if not exporter:
+        return
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import ConsoleSpanExporter, SimpleSpanProcessor
+    from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+
+    tracer_provider = TracerProvider(resource=Resource.create({"service.name": "mosa_cup_backend"}))
+    if exporter == "console":
+        tracer_provider.add_span_processor(SimpleSpanProcessor(ConsoleSpanExporter()))
+    elif exporter == "memory":
+        memory_exporter = InMemorySpanExporter()
+        tracer_provider.add_span_processor(SimpleSpanProcessor(memory_exporter))
+    else:
+        raise ValueError(f"Unknown TRACING_EXPORTER: {exporter}")
+    trace.set_tracer_provider(tracer_provider)
+
+configure_tracing()
+
+def traced(function: F) -> F:
+    name = f"{function.__module__.rsplit('.', 1)[-1]}.{function.__name__}"
+
+    if inspect.iscoroutinefunction(function):
+        @functools.wraps(function)
+        async def async_wrapper(*args, **kwargs):
+            with tracer.start_as_current_span(name):
+                return await function(*args, **kwargs)
+
+        return async_wrapper
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        with tracer.start_as_current_span(name):
+            return function(*args, **kwargs)
+
+    return wrapper
+
+
+class TracingMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        # Continue a trace started by the caller if it sent a W3C traceparent header.
+        context = propagate.extract({key.decode("latin-1"): value.decode("latin-1") for key, value in scope["headers"]})
+        with tracer.start_as_current_span(f"{scope['method']} {scope['path']}", context=context, kind=SpanKind.SERVER, attributes={"http.request.method": scope["method"], "url.path": scope["path"]}) as span:
+
+            async def send_with_status(message):
+                if message["type"] == "http.response.start":
+                    span.set_attribute("http.response.status_code", message["status"])
+                    if message["status"] >= 500:
+                        span.set_status(Status(StatusCode.ERROR))
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_with_status)
+            finally:
+                route = scope.get("route")
+                if route is not None:
+                    span.update_name(f"{scope['method']} {route.path}")
+                    span.set_attribute("http.route", route.path)
@@ -0,0 +1,87 @@
+from datetime import datetime
+from typing import List, Optional
+
+from sqlalchemy import DateTime, Integer, and_, exists, func, insert, literal, or_, select
+from sqlalchemy.orm import Session
+
+from api.v1 import models
+
+
+def _audience(subboard_uuids: List[str]):
+    return select(models.SubboardMember.user_key).join(models.Subboard, models.Subboard.subboard_uuid == models.SubboardMember.subboard_uuid).where(and_(models.SubboardMember.subboard_uuid.in_(subboard_uuids), models.Subboard.deleted == False)).distinct()
+
+def _unread_since(read_at: datetime):
+    return or_(models.BoardReadCursor.last_read_at == None, models.BoardReadCursor.last_read_at < read_at)
+
+def _counted(posted_at: datetime):
+    # A message is in a cursor's count if the cursor existed when it was posted, or was recounted after that.
+    return or_(models.BoardReadCursor.created_at <= posted_at, models.BoardReadCursor.updated_at >= posted_at)
+
+def create_board_read_cursors(database: Session, user_key: int, board_uuids: List[str]) -> None:
+    created_at = datetime.now()
+    boards = select(models.Board.board_uuid, literal(user_key, Integer), literal(created_at, DateTime)).where(and_(models.Board.board_uuid.in_(board_uuids), ~exists().where(and_(models.BoardReadCursor.user_key == user_key, models.BoardReadCursor.board_uuid == models.Board.board_uuid))))
+    database.execute(insert(models.BoardReadCursor).from_select(["board_uuid", "user_key", "created_at"], boards))
+
+def delete_board_read_cursors(database: Session, user_key: int, board_uuids: List[str]) -> None:
+    if not board_uuids:
+        return
+    # Subboard memberships outlive leaving a board, so the cursor has to go or count_message keeps counting for it.
+    database.query(models.BoardReadCursor).filter(and_(models.BoardReadCursor.user_key == user_key, models.BoardReadCursor.board_uuid.in_(board_uuids))).delete(synchronize_session=False)
+
+def count_message(database: Session, board_uuid: str, subboard_uuids: List[str]) -> None:
+    if not subboard_uuids:
+        return
+    # Counters are bumped in place, so a reader never has to count messages to show a badge.
+    database.query(models.BoardReadCursor).filter(and_(models.BoardReadCursor.board_uuid == board_uuid, models.BoardReadCursor.user_key.in_(_audience(subboard_uuids)))).update({models.BoardReadCursor.unread_count: models.BoardReadCursor.unread_count + 1}, synchronize_session=False)
+
+def uncount_message(database: Session, message: models.Message) -> None:
+    subboard_uuids = [subboard.subboard_uuid for subboard in message.subboards]
+    if not subboard_uuids:
+        return
+    database.query(models.BoardReadCursor).filter(and_(models.BoardReadCursor.board_uuid == message.board_uuid, models.BoardReadCursor.user_key.in_(_audience(subboard_uuids)), models.BoardReadCursor.unread_count > 0, _unread_since(message.created_at), _counted(message.created_at))).update({models.BoardReadCursor.unread_count: models.BoardReadCursor.unread_count - 1}, synchronize_session=False)
+
+def _unread_messages(user_key: int, board_uuid: str, read_at):
+    my_subboard_uuids = select(models.SubboardMember.subboard_uuid).where(models.SubboardMember.user_key == user_key)
+
+    return select(func.count()).select_from(models.Message).where(and_(models.Message.board_uuid == board_uuid, models.Message.created_at > read_at, models.Message.deleted == False, models.Message.subboards.any(and_(models.Subboard.subboard_uuid.in_(my_subboard_uuids), models.Subboard.deleted == False)))).scalar_subquery()
+
+def advance_board_read_cursor(database: Session, user_key: int, board_uuid: str, message: Optional[models.Message]) -> None:
+    read_at = message.created_at if message else datetime.now()
+    # Cursors only move forward. The remaining count is taken in the same statement, so a message posted meanwhile is not lost.
+    database.query(models.BoardReadCursor).filter(and_(models.BoardReadCursor.user_key == user_key, models.BoardReadCursor.board_uuid == board_uuid, _unread_since(read_at))).update(
+        {
+            models.BoardReadCursor.last_read_message_uuid: message.message_uuid if message else None,
+            models.BoardReadCursor.last_read_at: read_at,
+            models.BoardReadCursor.unread_count: _unread_messages(user_key, board_uuid, read_at),
+            models.BoardReadCursor.updated_at: datetime.now()
+        },
+        synchronize_session=False
+    )
+
+def recount_board_read_cursor(database: Session, user_key: int, board_uuid: str) -> None:
+    # Messages posted before the cursor existed count as read, so the recount never adds a message count_message skipped.
+    read_at = func.coalesce(models.BoardReadCursor.last_read_at, models.BoardReadCursor.created_at)
+    # After a subboard is joined or left, the count follows the new subboards, and uncount_message then trusts it through updated_at.
+    database.query(models.BoardReadCursor).filter(and_(models.BoardReadCursor.user_key == user_key, models.BoardReadCursor.board_uuid == board_uuid)).update(
+        {
+            models.BoardReadCursor.last_read_at: read_at,
+            models.BoardReadCursor.unread_count: _unread_messages(user_key, board_uuid, read_at),
+            models.BoardReadCursor.updated_at: datetime.now()
+        },
+        synchronize_session=False
+    )
+
+def advance_conversation_read_cursor(database: Session, conversation_member: models.ConversationMember, direct_message: Optional[models.DirectMessage]) -> None:
+    read_at = direct_message.created_at if direct_message else datetime.now()
+    unread_direct_messages = select(func.count()).select_from(models.DirectMessage).where(and_(models.DirectMessage.conversation_uuid == conversation_member.conversation_uuid, models.DirectMessage.created_at > read_at, models.DirectMessage.send_from_key != conversation_member.user_key, models.DirectMessage.deleted == False)).scalar_subquery()
+    database.query(models.ConversationMember).filter(and_(models.ConversationMember.conversation_uuid == conversation_member.conversation_uuid, models.ConversationMember.user_key == conversation_member.user_key, or_(models.ConversationMember.last_read_at == None, models.ConversationMember.last_read_at < read_at))).update(
+        {
+            models.ConversationMember.last_read_direct_message_uuid: direct_message.direct_message_uuid if direct_message else conversation_member.last_direct_message_uuid,
+            models.ConversationMember.last_read_at: read_at,
+            models.ConversationMember.unread_count: unread_direct_messages
+        },
+        synchronize_session=False
+    )
+
+def uncount_direct_message(database: Session, direct_message: models.DirectMessage) -> None:
+    database.query(models.ConversationMember).filter(and_(models.ConversationMember.conversation_uuid == direct_message.conversation_uuid, models.ConversationMember.user_key == direct_message.send_to_key, models.ConversationMember.user_key != direct_message.send_from_key, models.ConversationMember.unread_count > 0, or_(models.ConversationMember.last_read_at == None, models.ConversationMember.last_read_at < direct_message.created_at))).update({models.ConversationMember.unread_count: models.ConversationMember.unread_count - 1}, synchronize_session=False)
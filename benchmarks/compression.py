@@ -0,0 +1,98 @@
+"""Measure bytes on the wire and CPU cost of response compression.
+
+The synthetic dataset is seeded, then the largest list endpoints are fetched
+through the app with each ``Accept-Encoding``. For every response body the
+compressed size, the compression ratio and the time spent compressing are
+reported per encoding and level::
+
+    python -m benchmarks.compression --messages-per-board 500 --forms-per-board 50
+"""
+import argparse
+import asyncio
+from dataclasses import fields
+import os
+import time
+from typing import Callable, Dict, List, Tuple
+import zlib
+
+import httpx
+
+from benchmarks.run import _configure_environment
+
+
+def _compressors() -> List[Tuple[str, Callable[[bytes], bytes]]]:
+    compressors = [(f"gzip-{level}", lambda body, level=level: zlib.compress(body, level, zlib.MAX_WBITS | 16)) for level in [1, 6, 9]]
+    try:
+        import brotli
+    except ImportError:
+        return compressors
+
+    return compressors + [(f"br-{quality}", lambda body, quality=quality: brotli.compress(body, quality=quality)) for quality in [1, 4, 11]]
+
+
+def _time(function: Callable[[], bytes], repeat: int=3) -> Tuple[float, bytes]:
+    best = float("inf")
+    for _ in range(repeat):
+        started_at = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - started_at)
+
+    return best, result
+
+
+async def _fetch(paths: Dict[str, Tuple[str, str]], tokens: Dict[str, str]) -> None:
+    import api
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=api.app), base_url="http://benchmark", timeout=None) as http_client:
+        for name, (path, username) in paths.items():
+            for accept_encoding in ["identity", "gzip", "br"]:
+                started_at = time.perf_counter()
+                # httpx decodes the body, so the wire size is read from the stream before decoding.
+                async with http_client.stream("GET", path, headers={"Authorization": f"Bearer {tokens[username]}", "Accept-Encoding": accept_encoding}) as response:
+                    wire_bytes = sum([len(chunk) async for chunk in response.aiter_raw()])
+                elapsed = time.perf_counter() - started_at
+                print(f"{name:20} Accept-Encoding: {accept_encoding:8} -> {response.headers.get('Content-Encoding', 'identity'):8} {wire_bytes:10d} bytes  {elapsed * 1000:8.1f} ms")
+
+
+def main() -> None:
+    _configure_environment()
+    from jose import jwt
+
+    from api.v1.database import LocalSession
+    from benchmarks.seed import Volumes, seed
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    for volume in fields(Volumes):
+        parser.add_argument(f"--{volume.name.replace('_', '-')}", type=type(volume.default), default=volume.default)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    database = LocalSession()
+    try:
+        dataset = seed(database, Volumes(**{volume.name: getattr(args, volume.name) for volume in fields(Volumes)}), args.seed)
+    finally:
+        database.close()
+    tokens = {username: jwt.encode({"sub": username}, os.environ["SECRET_KEY"], "HS256") for username in dataset.usernames}
+    board_uuid = dataset.board_uuids[0]
+    administrator_name = dataset.administrator_names[0]
+    paths = {
+        "forms": (f"/api/v1/board/{board_uuid}/forms", administrator_name),
+        "messages": (f"/api/v1/board/{board_uuid}/messages", administrator_name),
+        "direct_messages": ("/api/v1/direct_messages", administrator_name)
+    }
+    asyncio.run(_fetch(paths, tokens))
+
+    print()
+    import api
+    from fastapi.testclient import TestClient
+
+    http_client = TestClient(api.app)
+    for name, (path, username) in paths.items():
+        body = http_client.get(path, headers={"Authorization": f"Bearer {tokens[username]}", "Accept-Encoding": "identity"}).content
+        for compressor_name, compress in _compressors():
+            elapsed, compressed = _time(lambda: compress(body))
+            print(f"{name:20} {compressor_name:8} {len(body):10d} -> {len(compressed):10d} bytes  ratio {len(body) / max(len(compressed), 1):6.1f}  {elapsed * 1000:8.2f} ms  {len(body) / elapsed / 1e6:8.1f} MB/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Compare peak memory of exporting form responses through the form list and the export.
+
+For each size a fresh in-memory database holding one form with that many
+responses is seeded. Its responses are then produced several ways, and the
+peak Python memory (``tracemalloc``) and time of each are reported. Times
+include the tracing overhead, so compare them with each other only:
+
+* ``forms``: the ``GET /board/{board_uuid}/forms`` body, built whole by
+  ``api.v1.payloads.read_forms`` and encoded with ``orjson``.
+* ``csv`` and ``ndjson``: ``api.v1.exports.stream_form_responses``, consumed
+  chunk by chunk as ``StreamingResponse`` does. Only the generator is
+  measured: under Azure Functions, ``AsgiMiddleware`` collects the whole body
+  before sending it, so these are not the memory of a deployed export.
+* ``csv page`` and ``ndjson page``: the first page of the endpoint, at most
+  ``EXPORT_MAX_RESPONSES`` responses, joined into one body the way the
+  Functions host holds it. This is what a deployed export costs.
+
+::
+
+    python -m benchmarks.exports --sizes 1000 10000 30000
+"""
+import argparse
+import time
+import tracemalloc
+from typing import Callable, Tuple
+
+from benchmarks.run import _configure_environment
+
+
+def _measure(function: Callable[[], int]) -> Tuple[float, float, int]:
+    tracemalloc.start()
+    started_at = time.perf_counter()
+    size = function()
+    seconds = time.perf_counter() - started_at
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return seconds, peak, size
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 30000])
+    args = parser.parse_args()
+
+    _configure_environment()
+    import orjson
+
+    from api.v1 import crud, exports, payloads
+    from benchmarks.fixtures import database_schema
+    from benchmarks.seed import Volumes, seed
+
+    for size in args.sizes:
+        volumes = Volumes(users=size, boards=1, subboards_per_board=1, members_per_board=size, subboards_per_member=1, messages_per_board=0, forms_per_board=1, questions_per_form=3, responses_per_form=size, direct_messages=0)
+        with database_schema() as LocalSession:
+            database = LocalSession()
+            try:
+                dataset = seed(database, volumes)
+                board_uuid = dataset.board_uuids[0]
+                form_uuid = dataset.form_uuids[board_uuid][0]
+                board = crud.read_board(database, board_uuid=board_uuid)
+                bind = database.get_bind()
+                until = crud.read_form_response_page_end(database, form_uuid, None, exports.EXPORT_MAX_RESPONSES)
+                ways = [
+                    ("forms", lambda: len(orjson.dumps(payloads.read_forms(database, board)))),
+                    ("csv", lambda: sum(len(chunk) for chunk in exports.stream_form_responses(bind, form_uuid, "csv"))),
+                    ("ndjson", lambda: sum(len(chunk) for chunk in exports.stream_form_responses(bind, form_uuid, "ndjson"))),
+                    ("csv page", lambda: len("".join(exports.stream_form_responses(bind, form_uuid, "csv", None, until)))),
+                    ("ndjson page", lambda: len("".join(exports.stream_form_responses(bind, form_uuid, "ndjson", None, until))))
+                ]
+                for name, function in ways:
+                    seconds, peak, length = _measure(function)
+                    print(f"{name:11} {size:6d} responses  peak {peak / 1024 / 1024:8.2f} MiB  {seconds * 1000:9.1f} ms  ({length} bytes)")
+            finally:
+                database.close()
+
+
+if __name__ == "__main__":
+    main()
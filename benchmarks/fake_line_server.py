@@ -0,0 +1,162 @@
+"""A local stand-in for the LINE Messaging API used by load and delivery benchmarks.
+
+Run it with ``uvicorn benchmarks.fake_line_server:app --port 8081`` and point the
+API at it with ``LINE_API_ENDPOINT=http://localhost:8081`` and
+``LINE_API_DATA_ENDPOINT=http://localhost:8081``.
+
+Behaviour is configured with environment variables, or at runtime through
+``PUT /config``:
+
+* ``FAKE_LINE_LATENCY`` / ``FAKE_LINE_LATENCY_JITTER``: seconds added to every call.
+* ``FAKE_LINE_ERROR_RATE``: fraction of calls answered with a 500.
+* ``FAKE_LINE_RATE_LIMIT``: requests per second before answering 429 with Retry-After.
+
+``GET /stats`` reports calls, statuses and delivered messages; ``DELETE /stats`` resets them.
+"""
+import asyncio
+from collections import Counter
+import os
+import random
+import time
+from typing import Optional
+from uuid import uuid4
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+
+class Config(BaseModel):
+    latency: float
+    latency_jitter: float
+    error_rate: float
+    rate_limit: Optional[float]
+
+
+config = Config(
+    latency=float(os.getenv("FAKE_LINE_LATENCY", "0")),
+    latency_jitter=float(os.getenv("FAKE_LINE_LATENCY_JITTER", "0")),
+    error_rate=float(os.getenv("FAKE_LINE_ERROR_RATE", "0")),
+    rate_limit=float(os.getenv("FAKE_LINE_RATE_LIMIT")) if os.getenv("FAKE_LINE_RATE_LIMIT") else None
+)
+stats = Counter()
+retry_keys = set()
+rate_limit_tokens = 0.0
+rate_limit_updated_at = time.monotonic()
+
+app = FastAPI()
+
+def _take_rate_limit_token() -> bool:
+    global rate_limit_tokens, rate_limit_updated_at
+    if not config.rate_limit:
+        return True
+    now = time.monotonic()
+    rate_limit_tokens = min(config.rate_limit, rate_limit_tokens + (now - rate_limit_updated_at) * config.rate_limit)
+    rate_limit_updated_at = now
+    if rate_limit_tokens < 1:
+        return False
+    rate_limit_tokens -= 1
+
+    return True
+
+@app.middleware("http")
+async def simulate_line_platform(request: Request, call_next):
+    if request.url.path in ["/config", "/stats"]:
+        return await call_next(request)
+    # /v2/bot/<resource>/...; shorter paths are counted under their full path.
+    parts = request.url.path.split("/")
+    stats[f"calls {parts[3] if len(parts) > 3 else request.url.path}"] += 1
+    if not request.headers.get("Authorization", "").startswith("Bearer "):
+        stats["status 401"] += 1
+        return JSONResponse({"message": "Authentication failed"}, 401)
+    delay = config.latency + random.uniform(0, config.latency_jitter)
+    if delay > 0:
+        await asyncio.sleep(delay)
+    if not _take_rate_limit_token():
+        stats["status 429"] += 1
+        return JSONResponse({"message": "The API rate limit has been exceeded. Try again later."}, 429, headers={"Retry-After": "1"})
+    if random.random() < config.error_rate:
+        stats["status 500"] += 1
+        return JSONResponse({"message": "Internal server error"}, 500)
+    retry_key = request.headers.get("X-Line-Retry-Key")
+    if retry_key in retry_keys:
+        stats["status 409"] += 1
+        return JSONResponse({"message": "The retry key is already accepted"}, 409)
+    response = await call_next(request)
+    stats[f"status {response.status_code}"] += 1
+    if retry_key and response.status_code == 200:
+        retry_keys.add(retry_key)
+
+    return response
+
+def _validate_messages(data: dict) -> Optional[JSONResponse]:
+    if not 1 <= len(data.get("messages", [])) <= 5:
+        return JSONResponse({"message": "The request body has 1 error(s)"}, 400)
+
+    return None
+
+@app.post("/v2/bot/message/push")
+async def push_message(request: Request):
+    data = await request.json()
+    error = _validate_messages(data)
+    if error:
+        return error
+    stats["messages"] += len(data["messages"])
+
+    return {}
+
+@app.post("/v2/bot/message/multicast")
+async def multicast(request: Request):
+    data = await request.json()
+    error = _validate_messages(data)
+    if error:
+        return error
+    if not 1 <= len(data.get("to", [])) <= 500:
+        return JSONResponse({"message": "The request body has 1 error(s)"}, 400)
+    stats["messages"] += len(data["to"]) * len(data["messages"])
+
+    return {}
+
+@app.post("/v2/bot/message/reply")
+async def reply_message(request: Request):
+    data = await request.json()
+    error = _validate_messages(data)
+    if error:
+        return error
+    stats["messages"] += len(data["messages"])
+
+    return {}
+
+@app.post("/v2/bot/richmenu")
+async def create_rich_menu():
+    return {"richMenuId": f"richmenu-{uuid4().hex}"}
+
+@app.post("/v2/bot/richmenu/{rich_menu_id}/content")
+async def set_rich_menu_image(rich_menu_id: str):
+    return {}
+
+@app.post("/v2/bot/user/all/richmenu/{rich_menu_id}")
+async def set_default_rich_menu(rich_menu_id: str):
+    return {}
+
+@app.get("/config")
+async def get_config():
+    return config
+
+@app.put("/config")
+async def put_config(new_config: Config):
+    global config
+    config = new_config
+
+    return config
+
+@app.get("/stats")
+async def get_stats():
+    return dict(stats)
+
+@app.delete("/stats")
+async def delete_stats():
+    stats.clear()
+    retry_keys.clear()
+
+    return {}
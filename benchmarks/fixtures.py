@@ -0,0 +1,19 @@
+from contextlib import contextmanager
+from typing import Iterator
+
+from sqlalchemy.orm import sessionmaker
+
+from api.v1 import models
+from api.v1.database import create_database_engine
+
+
+@contextmanager
+def database_schema(database_url: str="sqlite://") -> Iterator[sessionmaker]:
+    """Build a fresh schema from ``models.Base`` and yield a session factory bound to it."""
+    engine = create_database_engine(database_url)
+    models.Base.metadata.create_all(engine)
+    try:
+        yield sessionmaker(engine)
+    finally:
+        models.Base.metadata.drop_all(engine)
+        engine.dispose()
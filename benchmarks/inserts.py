@@ -0,0 +1,97 @@
+"""Measure insert throughput with random and time-ordered primary keys.
+
+Rows shaped like ``DirectMessages`` are inserted into a scratch table, once
+keyed with ``str(uuid4())`` and once with ``api.v1.ids.uuid7()``. Each
+transaction inserts ``--batch-size`` rows, so the default of one row matches a
+POST request. Throughput is reported for the whole run and for its last tenth,
+where the primary key index is largest, together with the index size (and the
+fragmentation on SQL Server). Set ``DATABASE_URL`` to benchmark another
+backend; the scratch tables are dropped afterwards::
+
+    python -m benchmarks.inserts --rows 50000 --batch-size 1
+"""
+import argparse
+from datetime import datetime
+import time
+from typing import Callable, Dict, List, Optional
+from uuid import uuid4
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, Unicode, insert, text
+from sqlalchemy.engine import Connection, Engine
+
+from benchmarks.run import _configure_environment
+
+
+def _table(metadata: MetaData, name: str) -> Table:
+    return Table(
+        name,
+        metadata,
+        Column("direct_message_uuid", String(48), primary_key=True),
+        Column("send_from_name", String(48), nullable=False, index=True),
+        Column("send_to_name", String(48), nullable=False, index=True),
+        Column("body", Unicode, nullable=False),
+        Column("created_at", DateTime, nullable=False),
+        Column("change_sequence", Integer, nullable=False)
+    )
+
+
+def _index_stats(connection: Connection, table: Table) -> Optional[Dict[str, float]]:
+    dialect = connection.dialect.name
+    if dialect == "sqlite":
+        size = connection.execute(text("SELECT SUM(dbstat.pgsize) FROM dbstat JOIN sqlite_master ON sqlite_master.name = dbstat.name WHERE sqlite_master.tbl_name = :name"), {"name": table.name}).scalar()
+        return {"bytes": size}
+    if dialect == "mssql":
+        row = connection.execute(text("SELECT page_count, avg_fragmentation_in_percent FROM sys.dm_db_index_physical_stats(DB_ID(), OBJECT_ID(:name), 1, NULL, 'LIMITED')"), {"name": table.name}).first()
+        return {"bytes": row.page_count * 8192, "fragmentation": row.avg_fragmentation_in_percent}
+
+    return None
+
+
+def _insert(engine: Engine, table: Table, new_key: Callable[[], str], rows: int, batch_size: int) -> List[float]:
+    durations = []
+    for i in range(0, rows, batch_size):
+        batch = [
+            {"direct_message_uuid": new_key(), "send_from_name": f"user{n % 100:03d}", "send_to_name": f"user{n % 97:03d}", "body": f"Direct message {n}", "created_at": datetime.now(), "change_sequence": n}
+            for n in range(i, min(i + batch_size, rows))
+        ]
+        started_at = time.perf_counter()
+        with engine.begin() as connection:
+            connection.execute(insert(table), batch)
+        durations.append(time.perf_counter() - started_at)
+
+    return durations
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--batch-size", type=int, default=1, help="rows per transaction")
+    args = parser.parse_args()
+
+    _configure_environment()
+    from api.v1 import ids
+    from api.v1.database import engine
+
+    metadata = MetaData()
+    key_generators = [("uuid4", lambda: str(uuid4())), ("uuid7", ids.uuid7)]
+    tables = {name: _table(metadata, f"BenchmarkInserts_{name}") for name, _ in key_generators}
+    metadata.drop_all(engine)
+    metadata.create_all(engine)
+    try:
+        for name, new_key in key_generators:
+            durations = _insert(engine, tables[name], new_key, args.rows, args.batch_size)
+            tail = durations[-max(len(durations) // 10, 1):]
+            with engine.connect() as connection:
+                stats = _index_stats(connection, tables[name])
+            line = f"{name}  {args.rows / sum(durations):10.1f} rows/s  last 10% {len(tail) * args.batch_size / sum(tail):10.1f} rows/s"
+            if stats:
+                line += f"  {stats['bytes'] / 1024 / 1024:8.2f} MiB"
+            if stats and "fragmentation" in stats:
+                line += f"  {stats['fragmentation']:5.1f}% fragmented"
+            print(line)
+    finally:
+        metadata.drop_all(engine)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""Measure membership join cost with username and integer user keys.
+
+Scratch tables shaped like ``Users``, ``BoardMembers`` and ``Boards`` are
+filled with ``--members`` memberships, once keyed by ``username`` (the
+``String(48)`` column used before) and once by the integer ``user_key``.
+Three queries are timed against each: the membership check behind every board
+route, the "my boards" join and the member list of a board. The size of the
+membership table and its indexes is reported on SQLite and SQL Server. Set
+``DATABASE_URL`` to benchmark another backend; the scratch tables are dropped
+afterwards::
+
+    python -m benchmarks.membership --members 100000 --lookups 2000
+"""
+import argparse
+import random
+import time
+from typing import Callable, Optional
+
+from sqlalchemy import Column, Index, Integer, MetaData, String, Table, and_, exists, insert, select, text
+from sqlalchemy.engine import Connection
+
+from benchmarks.run import _configure_environment
+
+
+def _tables(metadata: MetaData, name: str, key_type) -> dict:
+    users = Table(
+        f"BenchmarkMembership_{name}_Users",
+        metadata,
+        Column("user_uuid", String(48), primary_key=True),
+        Column("username", String(48), unique=True, nullable=False),
+        Column("user_key", Integer, unique=True, nullable=False)
+    )
+    key_column = "user_key" if key_type is Integer else "username"
+    boards = Table(
+        f"BenchmarkMembership_{name}_Boards",
+        metadata,
+        Column("board_uuid", String(48), primary_key=True),
+        Column("administrator", key_type, nullable=False, index=True)
+    )
+    members = Table(
+        f"BenchmarkMembership_{name}_BoardMembers",
+        metadata,
+        Column("member", key_type, primary_key=True),
+        Column("board_uuid", String(48), primary_key=True),
+        Index(f"ix_BenchmarkMembership_{name}_BoardMembers_board_uuid_member", "board_uuid", "member")
+    )
+
+    return {"users": users, "boards": boards, "members": members, "key_column": key_column}
+
+def _fill(connection: Connection, tables: dict, users: int, boards: int, members: int) -> None:
+    key = (lambda i: i + 1) if tables["key_column"] == "user_key" else (lambda i: f"user{i:08d}")
+    connection.execute(insert(tables["users"]), [{"user_uuid": f"{i:08d}-0000-7000-8000-000000000000", "username": f"user{i:08d}", "user_key": i + 1} for i in range(users)])
+    connection.execute(insert(tables["boards"]), [{"board_uuid": f"board{b:06d}", "administrator": key(b % users)} for b in range(boards)])
+    memberships = [{"member": key(i % users), "board_uuid": f"board{(i // users + i) % boards:06d}"} for i in range(members)]
+    for start in range(0, len(memberships), 10000):
+        connection.execute(insert(tables["members"]), memberships[start:start + 10000])
+
+def _table_bytes(connection: Connection, table: Table) -> Optional[int]:
+    dialect = connection.dialect.name
+    if dialect == "sqlite":
+        return connection.execute(text("SELECT SUM(dbstat.pgsize) FROM dbstat JOIN sqlite_master ON sqlite_master.name = dbstat.name WHERE sqlite_master.tbl_name = :name"), {"name": table.name}).scalar()
+    if dialect == "mssql":
+        return connection.execute(text("SELECT SUM(used_page_count) * 8192 FROM sys.dm_db_partition_stats WHERE object_id = OBJECT_ID(:name)"), {"name": table.name}).scalar()
+
+    return None
+
+def _time(lookups: int, query: Callable[[int], None]) -> float:
+    started_at = time.perf_counter()
+    for i in range(lookups):
+        query(i)
+
+    return (time.perf_counter() - started_at) / lookups * 1000
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--members", type=int, default=100000, help="rows in the membership table")
+    parser.add_argument("--users", type=int, default=20000)
+    parser.add_argument("--boards", type=int, default=500)
+    parser.add_argument("--lookups", type=int, default=2000, help="queries timed per measurement")
+    args = parser.parse_args()
+
+    _configure_environment()
+    from api.v1.database import engine
+
+    metadata = MetaData()
+    variants = {"username": _tables(metadata, "username", String(48)), "user_key": _tables(metadata, "user_key", Integer)}
+    metadata.drop_all(engine)
+    metadata.create_all(engine)
+    try:
+        for name, tables in variants.items():
+            users, boards, members = tables["users"], tables["boards"], tables["members"]
+            with engine.begin() as connection:
+                _fill(connection, tables, args.users, args.boards, args.members)
+            rng = random.Random(0)
+            samples = [(rng.randrange(args.users), f"board{rng.randrange(args.boards):06d}") for _ in range(args.lookups)]
+            with engine.connect() as connection:
+                # The API resolves the current user once per request; the lookups below start from the user's key.
+                keys = {row.user_key - 1: getattr(row, tables["key_column"]) for row in connection.execute(select(users.c.user_key, users.c[tables["key_column"]]))}
+                check = _time(args.lookups, lambda i: connection.execute(select(exists().where(and_(members.c.member == keys[samples[i][0]], members.c.board_uuid == samples[i][1])))).scalar())
+                my_boards = _time(args.lookups, lambda i: connection.execute(select(boards.c.board_uuid).join(members, members.c.board_uuid == boards.c.board_uuid).where(members.c.member == keys[samples[i][0]])).all())
+                board_members = _time(args.lookups, lambda i: connection.execute(select(users.c.username).join(members, members.c.member == users.c[tables["key_column"]]).where(members.c.board_uuid == samples[i][1])).all())
+                size = _table_bytes(connection, members)
+            line = f"{name:8}  check {check:7.3f} ms  my boards {my_boards:7.3f} ms  board members {board_members:7.3f} ms"
+            if size:
+                line += f"  BoardMembers {size / 1024 / 1024:7.2f} MiB"
+            print(line)
+    finally:
+        metadata.drop_all(engine)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""Measure the per-request overhead of the metrics middleware.
+
+A bare ASGI app that answers immediately is called directly, with and without
+``MetricsMiddleware`` in front of it, so the difference is the cost of the
+instrumentation alone. The cost of a single histogram observation is measured
+separately, both uncontended and from several threads at once::
+
+    python -m benchmarks.metrics_overhead --requests 100000 --threads 8
+"""
+import argparse
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import time
+
+from benchmarks.run import _configure_environment
+
+
+class _Route:
+    path = "/api/v1/board/{board_uuid}/messages"
+
+
+async def _app(scope, receive, send) -> None:
+    scope["route"] = _Route
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+
+async def _receive() -> dict:
+    return {"type": "http.request", "body": b"", "more_body": False}
+
+
+async def _send(message: dict) -> None:
+    pass
+
+
+async def _time_requests(app, requests: int) -> float:
+    started_at = time.perf_counter()
+    for _ in range(requests):
+        await app({"type": "http", "method": "GET", "path": "/api/v1/board/x/messages"}, _receive, _send)
+
+    return (time.perf_counter() - started_at) / requests
+
+
+def _time_observations(histogram, observations: int, threads: int) -> float:
+    def observe(n: int) -> None:
+        for i in range(n):
+            histogram.observe((i % 1000) / 1000, "GET", "/benchmark", "200")
+
+    started_at = time.perf_counter()
+    with ThreadPoolExecutor(threads) as executor:
+        list(executor.map(observe, [observations // threads] * threads))
+
+    return (time.perf_counter() - started_at) / observations
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=100000)
+    parser.add_argument("--threads", type=int, default=8)
+    args = parser.parse_args()
+
+    _configure_environment()
+    from api.v1 import metrics
+
+    baseline = asyncio.run(_time_requests(_app, args.requests))
+    instrumented = asyncio.run(_time_requests(metrics.MetricsMiddleware(_app), args.requests))
+    print(f"bare app                 {baseline * 1e6:8.2f} us/request")
+    print(f"with MetricsMiddleware   {instrumented * 1e6:8.2f} us/request  (+{(instrumented - baseline) * 1e6:.2f} us)")
+
+    histogram = metrics.Histogram("benchmark_seconds", "Benchmark.", ("method", "route", "status_code"))
+    print(f"observe, 1 thread        {_time_observations(histogram, args.requests, 1) * 1e9:8.1f} ns")
+    print(f"observe, {args.threads} threads       {_time_observations(histogram, args.requests, args.threads) * 1e9:8.1f} ns")
+
+    started_at = time.perf_counter()
+    body = metrics.registry.render()
+    print(f"render /metrics          {(time.perf_counter() - started_at) * 1e3:8.2f} ms ({len(body)} bytes)")
+
+
+if __name__ == "__main__":
+    main()
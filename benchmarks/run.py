@@ -0,0 +1,224 @@
+"""End-to-end benchmark of the API routes against a synthetic dataset.
+
+The FastAPI app is driven in-process through an ASGI client at a fixed
+concurrency. LINE calls go to ``benchmarks.fake_line_server``, started in a
+background thread unless ``LINE_API_ENDPOINT`` is already set. The database
+defaults to a temporary SQLite file; set ``DATABASE_URL`` to benchmark another
+backend::
+
+    python -m benchmarks.run --requests 200 --concurrency 8 --output results.json
+    python -m benchmarks.run --output new.json --compare results.json
+"""
+import argparse
+import asyncio
+from collections import Counter
+import contextvars
+from dataclasses import asdict, fields
+import json
+import os
+import random
+import socket
+import subprocess
+import tempfile
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import httpx
+
+
+statement_count: contextvars.ContextVar = contextvars.ContextVar("statement_count", default=None)
+
+
+def _start_fake_line_server() -> str:
+    import uvicorn
+
+    from benchmarks import fake_line_server
+
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(fake_line_server.app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+
+    return f"http://127.0.0.1:{port}"
+
+
+def _configure_environment() -> None:
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/benchmark.sqlite3")
+    os.environ.setdefault("SECRET_KEY", "benchmark")
+    os.environ.setdefault("CHANNEL_SECRET_KEY", "benchmark")
+    os.environ.setdefault("CHANNEL_ACCESS_TOKEN", "benchmark")
+    if "LINE_API_ENDPOINT" not in os.environ:
+        endpoint = _start_fake_line_server()
+        os.environ["LINE_API_ENDPOINT"] = endpoint
+        os.environ["LINE_API_DATA_ENDPOINT"] = endpoint
+
+
+# (name, role, request builder). The builder returns (method, path, json body).
+RequestBuilder = Callable[[object, str, random.Random], Tuple[str, str, Optional[dict]]]
+
+def _endpoints() -> List[Tuple[str, str, RequestBuilder]]:
+    def first_form(dataset, board_uuid):
+        return dataset.form_uuids[board_uuid][0]
+
+    return [
+        ("GET /me", "member", lambda dataset, board_uuid, rng: ("GET", "/api/v1/me", None)),
+        ("GET /boards", "administrator", lambda dataset, board_uuid, rng: ("GET", "/api/v1/boards", None)),
+        ("GET /my_boards", "member", lambda dataset, board_uuid, rng: ("GET", "/api/v1/my_boards", None)),
+        ("GET /board/{board_uuid}/subboards", "administrator", lambda dataset, board_uuid, rng: ("GET", f"/api/v1/board/{board_uuid}/subboards", None)),
+        ("GET /board/{board_uuid}/available_subboards", "member", lambda dataset, board_uuid, rng: ("GET", f"/api/v1/board/{board_uuid}/available_subboards", None)),
+        ("GET /board/{board_uuid}/my_subboards", "member", lambda dataset, board_uuid, rng: ("GET", f"/api/v1/board/{board_uuid}/my_subboards", None)),
+        ("GET /board/{board_uuid}/messages", "administrator", lambda dataset, board_uuid, rng: ("GET", f"/api/v1/board/{board_uuid}/messages", None)),
+        ("GET /board/{board_uuid}/my_messages", "member", lambda dataset, board_uuid, rng: ("GET", f"/api/v1/board/{board_uuid}/my_messages", None)),
+        ("GET /direct_messages", "member", lambda dataset, board_uuid, rng: ("GET", "/api/v1/direct_messages", None)),
+        ("GET /conversations", "member", lambda dataset, board_uuid, rng: ("GET", "/api/v1/conversations", None)),
+        ("GET /my_unread_counts", "member", lambda dataset, board_uuid, rng: ("GET", "/api/v1/my_unread_counts", None)),
+        ("GET /board/{board_uuid}/forms", "administrator", lambda dataset, board_uuid, rng: ("GET", f"/api/v1/board/{board_uuid}/forms", None)),
+        ("GET /board/{board_uuid}/my_forms", "member", lambda dataset, board_uuid, rng: ("GET", f"/api/v1/board/{board_uuid}/my_forms", None)),
+        ("POST /board/{board_uuid}/message", "administrator", lambda dataset, board_uuid, rng: ("POST", f"/api/v1/board/{board_uuid}/message", {"subboard_uuids": rng.sample(dataset.subboard_uuids[board_uuid], min(2, len(dataset.subboard_uuids[board_uuid]))), "body": "Benchmark message", "scheduled_send_time": None})),
+        ("POST /board/{board_uuid}/form/{form_uuid}/my_form_response", "member", lambda dataset, board_uuid, rng: ("POST", f"/api/v1/board/{board_uuid}/form/{first_form(dataset, board_uuid)}/my_form_response", {"form_question_responses": [{"form_question_uuid": form_question_uuid, "yes": True, "no": False} for form_question_uuid in dataset.form_question_uuids[first_form(dataset, board_uuid)]]}))
+    ]
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+
+async def _run_endpoint(http_client: httpx.AsyncClient, tokens: Dict[str, str], dataset, role: str, build: RequestBuilder, requests: int, concurrency: int, rng: random.Random) -> dict:
+    latencies = []
+    statements = []
+    statuses = Counter()
+    plan = []
+    for _ in range(requests):
+        board_uuid = rng.choice(dataset.board_uuids)
+        username = dataset.administrator_names[dataset.board_uuids.index(board_uuid)] if role == "administrator" else rng.choice(dataset.board_members[board_uuid])
+        plan.append((username, build(dataset, board_uuid, rng)))
+
+    async def worker() -> None:
+        while plan:
+            username, (method, path, body) = plan.pop()
+            counter = [0]
+            token = statement_count.set(counter)
+            started_at = time.perf_counter()
+            try:
+                response = await http_client.request(method, path, json=body, headers={"Authorization": f"Bearer {tokens[username]}"})
+                statuses[response.status_code] += 1
+            except Exception as e:
+                statuses[type(e).__name__] += 1
+            finally:
+                latencies.append(time.perf_counter() - started_at)
+                statement_count.reset(token)
+            statements.append(counter[0])
+
+    started_at = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - started_at
+
+    return {
+        "requests": requests,
+        "errors": sum(count for status, count in statuses.items() if not isinstance(status, int) or status >= 400),
+        "statuses": {str(status): count for status, count in statuses.items()},
+        "throughput": requests / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "statements_per_request": sum(statements) / len(statements) if statements else 0.0
+    }
+
+
+async def run(volumes, requests: int, concurrency: int, endpoint_filter: Optional[str], random_seed: int) -> dict:
+    from jose import jwt
+    from sqlalchemy import event
+
+    import api
+    from api.v1.database import LocalSession, engine
+    from benchmarks.seed import seed
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        counter = statement_count.get()
+        if counter is not None:
+            counter[0] += 1
+
+    database = LocalSession()
+    try:
+        dataset = seed(database, volumes, random_seed)
+    finally:
+        database.close()
+    tokens = {username: jwt.encode({"sub": username}, os.environ["SECRET_KEY"], "HS256") for username in dataset.usernames}
+
+    results = {}
+    rng = random.Random(random_seed)
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=api.app), base_url="http://benchmark", timeout=None) as http_client:
+        for name, role, build in _endpoints():
+            if endpoint_filter and endpoint_filter not in name:
+                continue
+            results[name] = await _run_endpoint(http_client, tokens, dataset, role, build, requests, concurrency, rng)
+            print(f"{name:70} p50 {results[name]['p50_ms']:8.2f} ms  p95 {results[name]['p95_ms']:8.2f} ms  p99 {results[name]['p99_ms']:8.2f} ms  {results[name]['throughput']:8.1f} req/s  {results[name]['statements_per_request']:6.1f} stmt/req")
+
+    return results
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(baseline: dict, current: dict) -> None:
+    print(f"\nCompared with {baseline.get('revision')}:")
+    for name, result in current["endpoints"].items():
+        if name not in baseline["endpoints"]:
+            continue
+        before = baseline["endpoints"][name]
+        deltas = []
+        for key in ["p50_ms", "p95_ms", "throughput", "statements_per_request"]:
+            change = (result[key] - before[key]) / before[key] * 100 if before[key] else 0.0
+            deltas.append(f"{key} {change:+6.1f}%")
+        print(f"{name:70} " + "  ".join(deltas))
+
+
+def main() -> None:
+    # The engine is created when api.v1 is first imported, so configure it before anything imports it.
+    _configure_environment()
+    from benchmarks.seed import Volumes
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    for volume in fields(Volumes):
+        parser.add_argument(f"--{volume.name.replace('_', '-')}", type=type(volume.default), default=volume.default)
+    parser.add_argument("--requests", type=int, default=100, help="requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--endpoint", default=None, help="only run endpoints whose name contains this text")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="write the results as JSON")
+    parser.add_argument("--compare", default=None, help="compare with a previous JSON result")
+    args = parser.parse_args()
+
+    volumes = Volumes(**{volume.name: getattr(args, volume.name) for volume in fields(Volumes)})
+    endpoints = asyncio.run(run(volumes, args.requests, args.concurrency, args.endpoint, args.seed))
+    current = {
+        "revision": _git_revision(),
+        "database": os.environ["DATABASE_URL"].split(":", 1)[0],
+        "volumes": asdict(volumes),
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "endpoints": endpoints
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(current, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), current)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""Seed a database with a synthetic, reproducible dataset for benchmarks."""
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+import random
+from typing import Dict, List
+from uuid import uuid4
+
+from passlib.context import CryptContext
+from sqlalchemy.orm import Session
+
+from api.v1 import models
+
+
+@dataclass
+class Volumes:
+    users: int = 200
+    boards: int = 5
+    subboards_per_board: int = 5
+    members_per_board: int = 100
+    subboards_per_member: int = 2
+    messages_per_board: int = 200
+    forms_per_board: int = 20
+    questions_per_form: int = 3
+    responses_per_form: int = 50
+    direct_messages: int = 500
+    line_user_ratio: float = 0.8
+
+
+@dataclass
+class Dataset:
+    password: str
+    administrator_names: List[str] = field(default_factory=list)
+    board_uuids: List[str] = field(default_factory=list)
+    board_members: Dict[str, List[str]] = field(default_factory=dict)
+    subboard_uuids: Dict[str, List[str]] = field(default_factory=dict)
+    form_uuids: Dict[str, List[str]] = field(default_factory=dict)
+    form_question_uuids: Dict[str, List[str]] = field(default_factory=dict)
+    usernames: List[str] = field(default_factory=list)
+
+
+def _insert(database: Session, model: type, rows: List[dict], batch_size: int=1000) -> None:
+    for i in range(0, len(rows), batch_size):
+        database.execute(model.__table__.insert(), rows[i:i + batch_size])
+
+
+def seed(database: Session, volumes: Volumes, random_seed: int=0, password: str="password") -> Dataset:
+    random.seed(random_seed)
+    now = datetime.now()
+    dataset = Dataset(password=password)
+    hashed_password = CryptContext(["bcrypt"]).hash(password)
+
+    line_users = []
+    users = []
+    user_keys = {}
+    for i in range(volumes.users):
+        line_user_uuid = None
+        if random.random() < volumes.line_user_ratio:
+            line_user_uuid = str(uuid4())
+            line_users.append({"line_user_uuid": line_user_uuid, "user_id": f"U{uuid4().hex}", "created_at": now, "deleted": False})
+        username = f"user{i:06d}"
+        user_keys[username] = i + 1
+        users.append({"user_uuid": str(uuid4()), "user_id": f"id{i:06d}", "username": username, "user_key": user_keys[username], "hashed_password": hashed_password, "display_name": f"User {i}", "line_user_uuid": line_user_uuid, "created_at": now, "deleted": False})
+        dataset.usernames.append(username)
+    _insert(database, models.LINEUser, line_users)
+    _insert(database, models.User, users)
+
+    boards = []
+    board_members = []
+    subboards = []
+    subboard_members = []
+    messages = []
+    subboard_messages = []
+    forms = []
+    subboard_forms = []
+    form_questions = []
+    form_responses = []
+    form_question_responses = []
+    for i in range(volumes.boards):
+        board_uuid = str(uuid4())
+        administrator_name = dataset.usernames[i % len(dataset.usernames)]
+        boards.append({"board_uuid": board_uuid, "board_id": f"board{i:04d}", "board_name": f"Board {i}", "administrator_key": user_keys[administrator_name], "created_at": now, "deleted": False})
+        dataset.administrator_names.append(administrator_name)
+        dataset.board_uuids.append(board_uuid)
+
+        members = random.sample(dataset.usernames, min(volumes.members_per_board, len(dataset.usernames)))
+        dataset.board_members[board_uuid] = members
+        board_members += [{"user_key": user_keys[member], "board_uuid": board_uuid} for member in members]
+
+        board_subboard_uuids = [str(uuid4()) for _ in range(volumes.subboards_per_board)]
+        dataset.subboard_uuids[board_uuid] = board_subboard_uuids
+        subboards += [{"subboard_uuid": subboard_uuid, "subboard_name": f"Subboard {j}", "board_uuid": board_uuid, "created_at": now, "deleted": False} for j, subboard_uuid in enumerate(board_subboard_uuids)]
+        for member in members:
+            for subboard_uuid in random.sample(board_subboard_uuids, min(volumes.subboards_per_member, len(board_subboard_uuids))):
+                subboard_members.append({"user_key": user_keys[member], "subboard_uuid": subboard_uuid})
+
+        for j in range(volumes.messages_per_board):
+            message_uuid = str(uuid4())
+            created_at = now - timedelta(minutes=volumes.messages_per_board - j)
+            messages.append({"message_uuid": message_uuid, "board_uuid": board_uuid, "body": f"Message {j} " + "lorem ipsum " * random.randint(1, 20), "send_time": created_at, "created_at": created_at, "deleted": False})
+            subboard_messages += [{"subboard_uuid": subboard_uuid, "message_uuid": message_uuid} for subboard_uuid in random.sample(board_subboard_uuids, random.randint(1, len(board_subboard_uuids)))]
+
+        dataset.form_uuids[board_uuid] = []
+        for j in range(volumes.forms_per_board):
+            form_uuid = str(uuid4())
+            dataset.form_uuids[board_uuid].append(form_uuid)
+            forms.append({"form_uuid": form_uuid, "board_uuid": board_uuid, "title": f"Form {j}", "send_time": now, "created_at": now, "deleted": False})
+            subboard_forms += [{"subboard_uuid": subboard_uuid, "form_uuid": form_uuid} for subboard_uuid in random.sample(board_subboard_uuids, random.randint(1, len(board_subboard_uuids)))]
+            question_uuids = [str(uuid4()) for _ in range(volumes.questions_per_form)]
+            dataset.form_question_uuids[form_uuid] = question_uuids
+            form_questions += [{"form_question_uuid": question_uuid, "form_uuid": form_uuid, "title": f"Question {k}", "yes": "Yes", "no": "No", "created_at": now, "deleted": False} for k, question_uuid in enumerate(question_uuids)]
+            for respondent_name in random.sample(members, min(volumes.responses_per_form, len(members))):
+                form_response_uuid = str(uuid4())
+                form_responses.append({"form_response_uuid": form_response_uuid, "respondent_key": user_keys[respondent_name], "form_uuid": form_uuid, "created_at": now, "deleted": False})
+                for question_uuid in question_uuids:
+                    yes = random.random() < 0.5
+                    form_question_responses.append({"form_question_response_uuid": str(uuid4()), "form_response_uuid": form_response_uuid, "form_question_uuid": question_uuid, "yes": yes, "no": not yes, "created_at": now, "deleted": False})
+
+    direct_messages = []
+    conversations = {}
+    conversation_members = {}
+    for i in range(volumes.direct_messages):
+        send_from_name, send_to_name = random.sample(dataset.usernames, 2)
+        created_at = now - timedelta(seconds=volumes.direct_messages - i)
+        send_from_key, send_to_key = user_keys[send_from_name], user_keys[send_to_name]
+        pair = (min(send_from_key, send_to_key), max(send_from_key, send_to_key))
+        if pair not in conversations:
+            conversations[pair] = {"conversation_uuid": str(uuid4()), "user_key_low": pair[0], "user_key_high": pair[1], "created_at": created_at}
+            for user_key, with_user_key in (pair, pair[::-1]):
+                conversation_members[(pair, user_key)] = {"conversation_uuid": conversations[pair]["conversation_uuid"], "user_key": user_key, "with_user_key": with_user_key, "unread_count": 0, "created_at": created_at}
+        direct_message_uuid = str(uuid4())
+        direct_messages.append({"direct_message_uuid": direct_message_uuid, "send_from_key": send_from_key, "send_to_key": send_to_key, "conversation_uuid": conversations[pair]["conversation_uuid"], "body": f"Direct message {i}", "send_time": created_at, "created_at": created_at, "deleted": False})
+        for user_key in pair:
+            conversation_members[(pair, user_key)].update(last_direct_message_uuid=direct_message_uuid, last_message_at=created_at)
+        conversation_members[(pair, send_to_key)]["unread_count"] += 1
+
+    _insert(database, models.Board, boards)
+    _insert(database, models.BoardMember, board_members)
+    _insert(database, models.BoardReadCursor, [{**board_member, "last_read_at": now, "unread_count": 0, "created_at": now} for board_member in board_members])
+    _insert(database, models.Subboard, subboards)
+    _insert(database, models.SubboardMember, subboard_members)
+    _insert(database, models.Message, messages)
+    _insert(database, models.SubboardMessage, subboard_messages)
+    _insert(database, models.Form, forms)
+    _insert(database, models.SubboardForm, subboard_forms)
+    _insert(database, models.FormYesNoQuestion, form_questions)
+    _insert(database, models.FormResponse, form_responses)
+    _insert(database, models.FormYesNoQuestionResponse, form_question_responses)
+    _insert(database, models.Conversation, list(conversations.values()))
+    _insert(database, models.DirectMessage, direct_messages)
+    _insert(database, models.ConversationMember, list(conversation_members.values()))
+    database.commit()
+
+    return dataset
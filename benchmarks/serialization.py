@@ -0,0 +1,78 @@
+"""Compare the serialization cost of the message and form list endpoints.
+
+For each size a fresh in-memory database holding one board is seeded, then
+both ways of producing the response body are timed:
+
+* ``orm``: load ORM objects, validate them through the ``response_model``
+  schema item by item and encode them with ``jsonable_encoder`` and ``json``,
+  as FastAPI does for a plain return value.
+* ``rows``: build the payload from column tuples with ``api.v1.payloads`` and
+  encode it with ``orjson``, as the routes do now.
+
+::
+
+    python -m benchmarks.serialization --sizes 1000 10000 --repeat 3
+"""
+import argparse
+import json
+import time
+from typing import Callable, List, Tuple
+
+from benchmarks.run import _configure_environment
+
+
+def _from_orm(schema, obj):
+    # Pydantic 2 only honours orm_mode through model_validate; 1.x only has from_orm.
+    if hasattr(schema, "model_validate"):
+        return schema.model_validate(obj, from_attributes=True)
+
+    return schema.from_orm(obj)
+
+
+def _best_of(repeat: int, function: Callable[[], bytes]) -> Tuple[float, int]:
+    best = float("inf")
+    for _ in range(repeat):
+        started_at = time.perf_counter()
+        body = function()
+        best = min(best, time.perf_counter() - started_at)
+
+    return best, len(body)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    _configure_environment()
+    from fastapi.encoders import jsonable_encoder
+    import orjson
+
+    from api.v1 import crud, payloads, schemas
+    from benchmarks.fixtures import database_schema
+    from benchmarks.seed import Volumes, seed
+
+    for size in args.sizes:
+        volumes = Volumes(users=100, boards=1, subboards_per_board=5, members_per_board=50, messages_per_board=size, forms_per_board=size, questions_per_form=3, responses_per_form=2, direct_messages=0)
+        with database_schema() as LocalSession:
+            database = LocalSession()
+            try:
+                dataset = seed(database, volumes)
+                board_uuid = dataset.board_uuids[0]
+                board = crud.read_board(database, board_uuid=board_uuid)
+                endpoints: List[Tuple[str, Callable[[], bytes], Callable[[], bytes]]] = [
+                    ("messages", lambda: json.dumps(jsonable_encoder([_from_orm(schemas.Message, message) for message in crud.read_messages(database, board_uuid)])).encode("utf-8"), lambda: orjson.dumps(payloads.read_messages(database, board))),
+                    ("forms", lambda: json.dumps(jsonable_encoder([_from_orm(schemas.Form, form) for form in crud.read_forms(database, board_uuid)])).encode("utf-8"), lambda: orjson.dumps(payloads.read_forms(database, board)))
+                ]
+                for name, orm, rows in endpoints:
+                    # Expire between runs so that the ORM path pays for its lazy loads every time.
+                    orm_seconds, orm_bytes = _best_of(args.repeat, lambda: (database.expire_all(), orm())[1])
+                    rows_seconds, rows_bytes = _best_of(args.repeat, rows)
+                    print(f"{name:8} {size:6d} items  orm {orm_seconds * 1000:9.1f} ms ({orm_bytes} bytes)  rows {rows_seconds * 1000:9.1f} ms ({rows_bytes} bytes)  {orm_seconds / rows_seconds:5.1f}x")
+            finally:
+                database.close()
+
+
+if __name__ == "__main__":
+    main()
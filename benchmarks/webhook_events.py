@@ -0,0 +1,118 @@
+"""Generate signed LINE webhook deliveries and replay them against the API.
+
+Payloads are signed with ``CHANNEL_SECRET_KEY`` exactly as the LINE platform
+does, so they pass ``WebhookHandler`` signature validation::
+
+    CHANNEL_SECRET_KEY=... python -m benchmarks.webhook_events \\
+        --url http://localhost:7071/api/v1/callback --users 100 --events 2000 --concurrency 20
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import os
+import random
+import time
+from typing import Dict, List, Optional
+from uuid import uuid4
+
+import httpx
+
+
+TEXTS = ["サインアップ", "ボード設定", "1", "ボード設定", "2", "board", "サブボード設定", "board"]
+
+def _source(user_id: str) -> Dict[str, str]:
+    return {"type": "user", "userId": user_id}
+
+def follow_event(user_id: str) -> dict:
+    return {
+        "type": "follow",
+        "mode": "active",
+        "timestamp": int(time.time() * 1000),
+        "source": _source(user_id),
+        "webhookEventId": uuid4().hex.upper(),
+        "deliveryContext": {"isRedelivery": False},
+        "replyToken": uuid4().hex
+    }
+
+def text_message_event(user_id: str, text: str) -> dict:
+    return {
+        "type": "message",
+        "mode": "active",
+        "timestamp": int(time.time() * 1000),
+        "source": _source(user_id),
+        "webhookEventId": uuid4().hex.upper(),
+        "deliveryContext": {"isRedelivery": False},
+        "replyToken": uuid4().hex,
+        "message": {"id": str(random.randint(10 ** 13, 10 ** 14)), "type": "text", "text": text}
+    }
+
+def build_body(events: List[dict], destination: str="Ufakebot") -> str:
+    return json.dumps({"destination": destination, "events": events}, ensure_ascii=False)
+
+def sign(body: str, channel_secret_key: str) -> str:
+    digest = hmac.new(channel_secret_key.encode("utf-8"), body.encode("utf-8"), hashlib.sha256).digest()
+
+    return base64.b64encode(digest).decode("utf-8")
+
+def generate_deliveries(users: int, events: int, board_id: Optional[str]=None) -> List[str]:
+    user_ids = [f"U{uuid4().hex}" for _ in range(users)]
+    bodies = [build_body([follow_event(user_id)]) for user_id in user_ids]
+    for i in range(max(events - users, 0)):
+        user_id = user_ids[i % users]
+        text = TEXTS[(i // users) % len(TEXTS)]
+        if text == "board" and board_id:
+            text = board_id
+        bodies.append(build_body([text_message_event(user_id, text)]))
+
+    return bodies
+
+async def replay(url: str, bodies: List[str], channel_secret_key: str, concurrency: int) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    statuses = {}
+    latencies = []
+
+    async def deliver(http_client: httpx.AsyncClient, body: str) -> None:
+        async with semaphore:
+            started_at = time.perf_counter()
+            response = await http_client.post(url, content=body.encode("utf-8"), headers={"Content-Type": "application/json", "X-Line-Signature": sign(body, channel_secret_key)})
+            latencies.append(time.perf_counter() - started_at)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    started_at = time.perf_counter()
+    async with httpx.AsyncClient(timeout=60) as http_client:
+        await asyncio.gather(*[deliver(http_client, body) for body in bodies])
+    elapsed = time.perf_counter() - started_at
+    latencies.sort()
+
+    return {
+        "deliveries": len(bodies),
+        "elapsed": elapsed,
+        "throughput": len(bodies) / elapsed if elapsed else 0.0,
+        "p50": latencies[len(latencies) // 2] if latencies else 0.0,
+        "p95": latencies[int(len(latencies) * 0.95)] if latencies else 0.0,
+        "statuses": statuses
+    }
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:7071/api/v1/callback")
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--events", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--board-id", default=None)
+    parser.add_argument("--print", action="store_true", help="print the signed deliveries instead of sending them")
+    args = parser.parse_args()
+    channel_secret_key = os.environ["CHANNEL_SECRET_KEY"]
+
+    bodies = generate_deliveries(args.users, args.events, args.board_id)
+    if args.print:
+        for body in bodies:
+            print(json.dumps({"X-Line-Signature": sign(body, channel_secret_key), "body": json.loads(body)}, ensure_ascii=False))
+        return
+    print(json.dumps(asyncio.run(replay(args.url, bodies, channel_secret_key, args.concurrency)), indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,13 @@
+import azure.functions as func
+
+from api.v1 import idempotency
+from api.v1.database import LocalSession
+
+
+def main(timer: func.TimerRequest) -> None:
+    database = LocalSession()
+    try:
+        idempotency.delete_expired_idempotency_keys(database)
+        database.commit()
+    finally:
+        database.close()
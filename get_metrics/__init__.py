@@ -0,0 +1,8 @@
+import azure.functions as func
+
+from api.v1 import metrics
+
+
+# Served apart from the anonymous API function, so scraping needs a function key.
+def main(req: func.HttpRequest) -> func.HttpResponse:
+    return func.HttpResponse(metrics.registry.render(), headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
@@ -0,0 +1,20 @@
+import os
+
+import azure.functions as func
+
+from api.v1 import crud, feeds
+from api.v1.database import LocalSession
+
+
+FEED_MAINTENANCE_BATCH_SIZE = int(os.getenv("FEED_MAINTENANCE_BATCH_SIZE", "100"))
+
+
+def main(timer: func.TimerRequest) -> None:
+    if not feeds.FEED_ENABLED:
+        return
+    database = LocalSession()
+    try:
+        crud.update_feed_fan_outs(database, FEED_MAINTENANCE_BATCH_SIZE)
+        crud.update_feed_repairs(database, FEED_MAINTENANCE_BATCH_SIZE)
+    finally:
+        database.close()
@@ -0,0 +1,16 @@
+import azure.functions as func
+from fastapi.concurrency import run_in_threadpool
+
+from api.v1 import deliveries
+from api.v1.database import LocalSession
+from api.v1.main import line_client
+
+
+async def main(timer: func.TimerRequest) -> None:
+    database = LocalSession()
+    try:
+        await deliveries.retry_message_deliveries(database, line_client)
+        await deliveries.retry_direct_message_deliveries(database, line_client)
+        await run_in_threadpool(database.commit)
+    finally:
+        database.close()
@@ -0,0 +1,141 @@
+import os
+
+os.environ.setdefault("DATABASE_PROFILE", "memory")
+os.environ.setdefault("SECRET_KEY", "secret")
+os.environ.setdefault("CHANNEL_SECRET_KEY", "channel_secret")
+os.environ.setdefault("CHANNEL_ACCESS_TOKEN", "channel_access_token")
+
+from types import SimpleNamespace
+from typing import List
+
+import pytest
+from fastapi.testclient import TestClient
+
+import api
+from api.v1 import crud, idempotency, main, schemas
+from api.v1.caches import TTLCache
+from api.v1.line_client import LINEAPIError, LINEClient
+from benchmarks.fixtures import database_schema
+
+
+class FakeLINEClient:
+    """Records what would have been sent to LINE, and fails sends to the LINE user IDs in ``failing``."""
+
+    MULTICAST_MAX_RECIPIENTS = LINEClient.MULTICAST_MAX_RECIPIENTS
+
+    def __init__(self):
+        self.multicasts: List[List[str]] = []
+        self.pushes: List[str] = []
+        self.failing = set()
+
+    async def multicast(self, to: List[str], message) -> None:
+        self.multicasts.append(list(to))
+        if self.failing & set(to):
+            raise LINEAPIError(500, "Internal Server Error")
+
+    async def push_message(self, to: str, message) -> None:
+        self.pushes.append(to)
+        if to in self.failing:
+            raise LINEAPIError(500, "Internal Server Error")
+
+
+@pytest.fixture
+def sessions():
+    # Sessions are configured like api.v1.database.LocalSession.
+    with database_schema() as sessions:
+        sessions.configure(expire_on_commit=False)
+        yield sessions
+
+
+@pytest.fixture
+def database(sessions):
+    database = sessions()
+    try:
+        yield database
+    finally:
+        database.close()
+
+
+@pytest.fixture
+def line_client(monkeypatch):
+    line_client = FakeLINEClient()
+    monkeypatch.setattr(main, "line_client", line_client)
+
+    return line_client
+
+
+@pytest.fixture
+def client(sessions, line_client, monkeypatch):
+    def get_database():
+        database = sessions()
+        try:
+            yield database
+        finally:
+            database.close()
+
+    monkeypatch.setattr(idempotency, "idempotent_response_cache", TTLCache(100, idempotency.IDEMPOTENCY_KEY_TTL))
+    api.app.dependency_overrides[main._get_database] = get_database
+    try:
+        yield TestClient(api.app)
+    finally:
+        api.app.dependency_overrides.clear()
+
+
+def location_uuid(response) -> str:
+    return response.json()["Location"].rsplit("/", 1)[1]
+
+
+@pytest.fixture
+def sign_up(client):
+    def sign_up(username: str) -> dict:
+        response = client.post("/api/v1/signup", json={"user_id": username, "username": username, "password": "password", "line_user_uuid": None})
+        assert response.status_code == 200, response.text
+        access_token = client.post("/api/v1/signin", data={"username": username, "password": "password"}).json()["access_token"]
+
+        return {"Authorization": f"Bearer {access_token}"}
+
+    return sign_up
+
+
+@pytest.fixture
+def update_my_boards(sessions):
+    # Boards are joined from the LINE bot, which goes through the same crud call.
+    def update_my_boards(username: str, board_ids: List[str]) -> None:
+        database = sessions()
+        try:
+            crud.update_my_boards(database, crud.read_user(database, username=username), schemas.NewMyBoards(new_my_board_ids=board_ids))
+            database.commit()
+        finally:
+            database.close()
+
+    return update_my_boards
+
+
+@pytest.fixture
+def board(client, sign_up):
+    administrator = sign_up("administrator")
+    board_uuid = location_uuid(client.post("/api/v1/board", json={"board_id": "board", "board_name": "Board"}, headers=administrator))
+    subboard_uuid = location_uuid(client.post(f"/api/v1/board/{board_uuid}/subboard", json={"subboard_name": "Subboard"}, headers=administrator))
+
+    return SimpleNamespace(board_id="board", board_uuid=board_uuid, subboard_uuid=subboard_uuid, administrator=administrator)
+
+
+@pytest.fixture
+def member(client, board, sign_up, update_my_boards):
+    headers = sign_up("member")
+    update_my_boards("member", [board.board_id])
+    response = client.post(f"/api/v1/board/{board.board_uuid}/update_my_subboards", json={"new_my_subboard_uuids": [board.subboard_uuid]}, headers=headers)
+    assert response.status_code == 200, response.text
+
+    return headers
+
+
+@pytest.fixture
+def post_message(client, board):
+    def post_message(body: str, headers: dict=None) -> str:
+        response = client.post(f"/api/v1/board/{board.board_uuid}/message", json={"subboard_uuids": [board.subboard_uuid], "body": body, "scheduled_send_time": None}, headers=headers or board.administrator)
+        assert response.status_code == 201, response.text
+
+        return location_uuid(response)
+
+    return post_message
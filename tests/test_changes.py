@@ -0,0 +1,64 @@
+def _read_changes(client, path, headers, since=None):
+    response = client.get(path, params={} if since is None else {"since": since}, headers=headers)
+    assert response.status_code == 200, response.text
+
+    return response.json()
+
+
+def test_first_read_is_a_reset_and_later_reads_are_incremental(client, board, member, post_message):
+    path = f"/api/v1/board/{board.board_uuid}/my_messages/changes"
+    first_message_uuid = post_message("first")
+
+    full = _read_changes(client, path, member)
+    assert full["reset"]
+    assert [change["message_uuid"] for change in full["changes"]] == [first_message_uuid]
+
+    second_message_uuid = post_message("second")
+    assert client.delete(f"/api/v1/board/{board.board_uuid}/message/{first_message_uuid}", headers=board.administrator).status_code == 200
+
+    incremental = _read_changes(client, path, member, full["next_since"])
+    assert not incremental["reset"]
+    assert [(change["message_uuid"], change["deleted"]) for change in incremental["changes"]] == [(second_message_uuid, False), (first_message_uuid, True)]
+
+    unchanged = _read_changes(client, path, member, incremental["next_since"])
+    assert not unchanged["reset"]
+    assert unchanged["changes"] == []
+
+
+def test_cursor_from_the_future_is_a_reset(client, board, member, post_message):
+    path = f"/api/v1/board/{board.board_uuid}/my_messages/changes"
+    message_uuid = post_message("first")
+    next_since = _read_changes(client, path, member)["next_since"]
+
+    changes = _read_changes(client, path, member, next_since + 1000)
+    assert changes["reset"]
+    assert [change["message_uuid"] for change in changes["changes"]] == [message_uuid]
+
+
+def test_membership_change_resets_older_cursors(client, board, member, post_message):
+    path = f"/api/v1/board/{board.board_uuid}/my_messages/changes"
+    message_uuid = post_message("first")
+    next_since = _read_changes(client, path, member)["next_since"]
+
+    assert client.post(f"/api/v1/board/{board.board_uuid}/update_my_subboards", json={"new_my_subboard_uuids": []}, headers=member).status_code == 200
+    after_leaving = _read_changes(client, path, member, next_since)
+    # Messages of a subboard left are dropped by a reset rather than sent as tombstones.
+    assert after_leaving["reset"]
+    assert after_leaving["changes"] == []
+
+    assert client.post(f"/api/v1/board/{board.board_uuid}/update_my_subboards", json={"new_my_subboard_uuids": [board.subboard_uuid]}, headers=member).status_code == 200
+    after_joining = _read_changes(client, path, member, after_leaving["next_since"])
+    assert after_joining["reset"]
+    assert [change["message_uuid"] for change in after_joining["changes"]] == [message_uuid]
+
+    assert not _read_changes(client, path, member, after_joining["next_since"])["reset"]
+
+
+def test_deleted_rows_are_left_out_of_a_reset(client, board, member, post_message):
+    path = f"/api/v1/board/{board.board_uuid}/my_messages/changes"
+    message_uuid = post_message("first")
+    assert client.delete(f"/api/v1/board/{board.board_uuid}/message/{message_uuid}", headers=board.administrator).status_code == 200
+
+    changes = _read_changes(client, path, member)
+    assert changes["reset"]
+    assert changes["changes"] == []
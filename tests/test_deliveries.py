@@ -0,0 +1,88 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+from api.v1 import crud, deliveries, ids, models
+
+
+@pytest.fixture
+def message(database):
+    created_at = datetime.now()
+    user = models.User(user_uuid=ids.uuid7(), user_key=1, user_id="administrator", username="administrator", hashed_password="", created_at=created_at)
+    database.add(user)
+    database.flush()
+    board = models.Board(board_uuid=ids.uuid7(), board_id="board", board_name="Board", administrator_key=user.user_key, created_at=created_at)
+    database.add(board)
+    database.flush()
+    message = models.Message(message_uuid=ids.uuid7(), board_uuid=board.board_uuid, body="hello", created_at=created_at)
+    database.add(message)
+    database.commit()
+
+    return message
+
+
+def _expire_leases(database):
+    database.query(models.MessageDelivery).update({models.MessageDelivery.next_attempt_at: datetime.now() - timedelta(seconds=1)})
+    database.commit()
+
+
+def test_claimed_deliveries_are_not_claimed_again_until_their_lease_runs_out(database, message):
+    message_deliveries = crud.create_message_deliveries(database, message.message_uuid, [f"U{i}" for i in range(1200)], 500, 300)
+    database.commit()
+
+    assert [message_delivery.recipient_count for message_delivery in message_deliveries] == [500, 500, 200]
+    assert {message_delivery.status for message_delivery in message_deliveries} == {"sending"}
+    assert crud.update_retryable_message_deliveries_sending(database, 100, 300) == []
+
+    _expire_leases(database)
+    claimed = crud.update_retryable_message_deliveries_sending(database, 2, 300)
+    database.commit()
+    claimed += crud.update_retryable_message_deliveries_sending(database, 100, 300)
+    database.commit()
+
+    assert sorted(message_delivery.chunk_index for message_delivery in claimed) == [0, 1, 2]
+    assert all(message_delivery.next_attempt_at > datetime.now() for message_delivery in claimed)
+    assert crud.update_retryable_message_deliveries_sending(database, 100, 300) == []
+
+
+def test_failed_delivery_is_retried_until_sent(database, message, line_client, monkeypatch):
+    monkeypatch.setattr(deliveries, "DELIVERY_RETRY_BACKOFF", 0)
+    line_client.failing = {"U1"}
+
+    message_deliveries = asyncio.run(deliveries.deliver_message(database, line_client, message, ["U1"]))
+    database.commit()
+
+    assert [(message_delivery.status, message_delivery.attempts) for message_delivery in message_deliveries] == [("failed", 1)]
+    assert message_deliveries[0].last_error == "500: Internal Server Error"
+
+    line_client.failing = set()
+    retried = asyncio.run(deliveries.retry_message_deliveries(database, line_client))
+    database.commit()
+
+    assert [(message_delivery.status, message_delivery.attempts, message_delivery.last_error) for message_delivery in retried] == [("sent", 2, None)]
+    assert line_client.multicasts == [["U1"], ["U1"]]
+    assert asyncio.run(deliveries.retry_message_deliveries(database, line_client)) == []
+
+
+def test_delivery_is_dead_lettered_after_max_attempts_and_replayed_on_request(database, message, line_client, monkeypatch):
+    monkeypatch.setattr(deliveries, "DELIVERY_RETRY_BACKOFF", 0)
+    monkeypatch.setattr(deliveries, "DELIVERY_MAX_ATTEMPTS", 2)
+    line_client.failing = {"U1"}
+
+    asyncio.run(deliveries.deliver_message(database, line_client, message, ["U1", "U2"]))
+    database.commit()
+    retried = asyncio.run(deliveries.retry_message_deliveries(database, line_client))
+    database.commit()
+
+    assert [(message_delivery.status, message_delivery.attempts) for message_delivery in retried] == [("dead_letter", 2)]
+    assert retried[0].next_attempt_at is None
+    assert asyncio.run(deliveries.retry_message_deliveries(database, line_client)) == []
+    assert len(line_client.multicasts) == 2
+
+    line_client.failing = set()
+    replayed = asyncio.run(deliveries.replay_message_deliveries(database, line_client, message))
+    database.commit()
+
+    assert [(message_delivery.status, message_delivery.attempts) for message_delivery in replayed] == [("sent", 1)]
+    assert asyncio.run(deliveries.replay_message_deliveries(database, line_client, message)) == []
@@ -0,0 +1,80 @@
+import json
+from datetime import datetime
+
+import pytest
+
+from api.v1 import crud, exports, ids, models
+
+
+@pytest.fixture
+def form(client, board):
+    response = client.post(f"/api/v1/board/{board.board_uuid}/form", json={"subboard_uuids": [board.subboard_uuid], "title": "Form", "scheduled_send_time": None, "new_form_questions": [{"title": "Question", "yes": "Yes", "no": "No"}]}, headers=board.administrator)
+    assert response.status_code == 201, response.text
+
+    return response.json()["Location"].rsplit("/", 1)[1]
+
+
+@pytest.fixture
+def create_form_responses(database, form):
+    def create_form_responses(count: int) -> list:
+        respondent = crud.read_user(database, username="administrator")
+        form_response_uuids = [ids.uuid7() for _ in range(count)]
+        database.add_all([models.FormResponse(form_response_uuid=form_response_uuid, form_uuid=form, respondent_key=respondent.user_key, created_at=datetime.now()) for form_response_uuid in form_response_uuids])
+        database.commit()
+
+        return form_response_uuids
+
+    return create_form_responses
+
+
+def _export_pages(client, board, form, export_format="ndjson"):
+    pages = []
+    after = None
+    while True:
+        response = client.get(f"/api/v1/board/{board.board_uuid}/form/{form}/form_responses/export", params={"export_format": export_format, **({"after": after} if after else {})}, headers=board.administrator)
+        assert response.status_code == 200, response.text
+        after = response.headers.get(exports.EXPORT_NEXT_AFTER_HEADER)
+        pages.append((response.text.splitlines(), after))
+        if not after:
+            return pages
+
+
+def _form_response_uuids(lines):
+    return [json.loads(line)["form_response_uuid"] for line in lines]
+
+
+def test_export_is_paged_at_the_limit(client, board, form, create_form_responses, monkeypatch):
+    monkeypatch.setattr(exports, "EXPORT_MAX_RESPONSES", 2)
+    form_response_uuids = create_form_responses(5)
+
+    pages = _export_pages(client, board, form)
+
+    assert [_form_response_uuids(lines) for lines, _ in pages] == [form_response_uuids[0:2], form_response_uuids[2:4], form_response_uuids[4:5]]
+    assert [after for _, after in pages] == [form_response_uuids[1], form_response_uuids[3], None]
+
+
+def test_export_that_fills_its_last_page_exactly_ends_without_a_next_page(client, board, form, create_form_responses, monkeypatch):
+    monkeypatch.setattr(exports, "EXPORT_MAX_RESPONSES", 2)
+    form_response_uuids = create_form_responses(4)
+
+    pages = _export_pages(client, board, form)
+
+    assert [_form_response_uuids(lines) for lines, _ in pages] == [form_response_uuids[0:2], form_response_uuids[2:4]]
+    assert pages[-1][1] is None
+
+
+def test_export_within_the_limit_is_one_page(client, board, form, create_form_responses, monkeypatch):
+    monkeypatch.setattr(exports, "EXPORT_MAX_RESPONSES", 2)
+    form_response_uuids = create_form_responses(2)
+
+    assert [(_form_response_uuids(lines), after) for lines, after in _export_pages(client, board, form)] == [(form_response_uuids, None)]
+
+
+def test_every_csv_page_has_a_header(client, board, form, create_form_responses, monkeypatch):
+    monkeypatch.setattr(exports, "EXPORT_MAX_RESPONSES", 2)
+    form_response_uuids = create_form_responses(3)
+
+    pages = _export_pages(client, board, form, "csv")
+
+    assert [lines[0] for lines, _ in pages] == ["form_response_uuid,username,display_name,created_at,Question"] * 2
+    assert [line.split(",", 1)[0] for lines, _ in pages for line in lines[1:]] == form_response_uuids
@@ -0,0 +1,47 @@
+from datetime import datetime
+
+from api.v1 import caches, crud, idempotency, models
+
+
+def _post_message(client, board, idempotency_key, body="hello"):
+    return client.post(f"/api/v1/board/{board.board_uuid}/message", json={"subboard_uuids": [board.subboard_uuid], "body": body, "scheduled_send_time": None}, headers={**board.administrator, "Idempotency-Key": idempotency_key})
+
+
+def test_repeated_request_replays_the_first_response(client, board, database, monkeypatch):
+    first = _post_message(client, board, "key")
+    assert first.status_code == 201
+
+    repeated = _post_message(client, board, "key")
+    assert (repeated.status_code, repeated.json()) == (201, first.json())
+
+    # Another instance has nothing cached and answers from the IdempotencyKeys row.
+    monkeypatch.setattr(idempotency, "idempotent_response_cache", caches.TTLCache(100, idempotency.IDEMPOTENCY_KEY_TTL))
+    replayed = _post_message(client, board, "key")
+    assert (replayed.status_code, replayed.json()) == (201, first.json())
+
+    assert database.query(models.Message).count() == 1
+
+
+def test_keys_are_scoped_to_the_user(client, board, member, database):
+    assert _post_message(client, board, "key").status_code == 201
+
+    response = client.post("/api/v1/direct_message", json={"send_to_names": ["administrator"], "body": "hello", "scheduled_send_time": None}, headers={**member, "Idempotency-Key": "key"})
+    assert response.status_code == 201
+    assert database.query(models.DirectMessage).count() == 1
+
+
+def test_key_reused_on_another_path_is_rejected(client, board, database):
+    assert _post_message(client, board, "key").status_code == 201
+
+    response = client.post(f"/api/v1/board/{board.board_uuid}/form", json={"subboard_uuids": [board.subboard_uuid], "title": "Form", "scheduled_send_time": None, "new_form_questions": []}, headers={**board.administrator, "Idempotency-Key": "key"})
+    assert response.status_code == 422
+    assert database.query(models.Form).count() == 0
+
+
+def test_key_of_a_request_in_progress_is_a_conflict(client, board, database):
+    administrator = crud.read_user(database, username="administrator")
+    database.add(models.IdempotencyKey(user_key=administrator.user_key, idempotency_key="key", request_path=f"/api/v1/board/{board.board_uuid}/message", created_at=datetime.now()))
+    database.commit()
+
+    assert _post_message(client, board, "key").status_code == 409
+    assert database.query(models.Message).count() == 0
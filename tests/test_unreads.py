@@ -0,0 +1,90 @@
+def _board_unread_counts(client, headers):
+    # Boards with nothing unread are left out.
+    response = client.get("/api/v1/my_unread_counts", headers=headers)
+    assert response.status_code == 200, response.text
+
+    return {board["board_uuid"]: board["unread_count"] for board in response.json()["boards"]}
+
+
+def _update_my_subboards(client, board, headers, subboard_uuids):
+    response = client.post(f"/api/v1/board/{board.board_uuid}/update_my_subboards", json={"new_my_subboard_uuids": subboard_uuids}, headers=headers)
+    assert response.status_code == 200, response.text
+
+
+def _delete_message(client, board, message_uuid):
+    assert client.delete(f"/api/v1/board/{board.board_uuid}/message/{message_uuid}", headers=board.administrator).status_code == 200
+
+
+def test_mark_read_counts_what_follows_the_cursor(client, board, member, post_message):
+    message_uuids = [post_message(f"message {i}") for i in range(3)]
+    assert _board_unread_counts(client, member) == {board.board_uuid: 3}
+
+    assert client.post(f"/api/v1/board/{board.board_uuid}/mark_read", json={"message_uuid": message_uuids[0]}, headers=member).status_code == 200
+    assert _board_unread_counts(client, member) == {board.board_uuid: 2}
+
+    # Cursors never move back.
+    assert client.post(f"/api/v1/board/{board.board_uuid}/mark_read", json={"message_uuid": message_uuids[0]}, headers=member).status_code == 200
+    assert _board_unread_counts(client, member) == {board.board_uuid: 2}
+
+    _delete_message(client, board, message_uuids[0])
+    assert _board_unread_counts(client, member) == {board.board_uuid: 2}
+    _delete_message(client, board, message_uuids[2])
+    assert _board_unread_counts(client, member) == {board.board_uuid: 1}
+
+    assert client.post(f"/api/v1/board/{board.board_uuid}/mark_read", headers=member).status_code == 200
+    assert _board_unread_counts(client, member) == {}
+
+
+def test_leaving_and_rejoining_a_board_starts_a_new_count(client, board, member, post_message, update_my_boards):
+    post_message("before leaving")
+    update_my_boards("member", [])
+    assert _board_unread_counts(client, member) == {}
+
+    post_message("while away")
+    update_my_boards("member", [board.board_id])
+    assert _board_unread_counts(client, member) == {}
+
+    post_message("after rejoining")
+    assert _board_unread_counts(client, member) == {board.board_uuid: 1}
+
+
+def test_joining_or_leaving_a_subboard_recounts(client, board, member, post_message):
+    message_uuid = post_message("before leaving")
+    _update_my_subboards(client, board, member, [])
+    assert _board_unread_counts(client, member) == {}
+
+    post_message("while away")
+    _update_my_subboards(client, board, member, [board.subboard_uuid])
+    assert _board_unread_counts(client, member) == {board.board_uuid: 2}
+
+    _delete_message(client, board, message_uuid)
+    assert _board_unread_counts(client, member) == {board.board_uuid: 1}
+
+
+def test_deleting_a_message_posted_before_the_cursor_existed_does_not_uncount_it(client, board, sign_up, update_my_boards, post_message):
+    earlier_message_uuid = post_message("before joining")
+    headers = sign_up("late_member")
+    update_my_boards("late_member", [board.board_id])
+    _update_my_subboards(client, board, headers, [board.subboard_uuid])
+    later_message_uuid = post_message("after joining")
+    assert _board_unread_counts(client, headers) == {board.board_uuid: 1}
+
+    _delete_message(client, board, earlier_message_uuid)
+    assert _board_unread_counts(client, headers) == {board.board_uuid: 1}
+    _delete_message(client, board, later_message_uuid)
+    assert _board_unread_counts(client, headers) == {}
+
+
+def test_joining_a_subboard_counts_its_messages_since_joining_the_board(client, board, sign_up, update_my_boards, post_message):
+    post_message("before joining the board")
+    headers = sign_up("late_member")
+    update_my_boards("late_member", [board.board_id])
+    earlier_message_uuid = post_message("before joining the subboard")
+    _update_my_subboards(client, board, headers, [board.subboard_uuid])
+    assert _board_unread_counts(client, headers) == {board.board_uuid: 1}
+
+    post_message("after joining the subboard")
+    assert _board_unread_counts(client, headers) == {board.board_uuid: 2}
+
+    _delete_message(client, board, earlier_message_uuid)
+    assert _board_unread_counts(client, headers) == {board.board_uuid: 1}